@@ -0,0 +1,28 @@
+# 天眼查爬虫默认爬取的公司id
+SPIDER_COMPANY_ID = '14270846'
+
+# 同时请求的分页数
+SPIDER_CONCURRENCY = 8
+
+# 解析页面的子进程数
+SPIDER_PARSE_PROCESSES = 2
+
+# 每页条数
+SPIDER_PAGE_SIZE = 30
+
+# 请求超时，连接超时、读取超时，单位秒
+SPIDER_TIMEOUT = (3, 15)
+
+# 爬取结果按公司id缓存的时间，单位秒
+SPIDER_RESULT_EXPIRES = 60 * 60
+
+# 爬取任务状态保存的时间，单位秒
+SPIDER_JOB_EXPIRES = 24 * 60 * 60
+
+# 公司爬取锁的过期时间，单位秒，任务在队列中等待时锁不会续期，等待超过这个时间同一个公司可以重新创建任务
+SPIDER_LOCK_EXPIRES = 10 * 60
+
+# 任务执行时每隔多少秒给公司爬取锁续期，续期后的过期时间，单位秒
+# worker进程挂掉后最多SPIDER_HEARTBEAT_EXPIRES秒就可以重新爬取这个公司
+SPIDER_HEARTBEAT_INTERVAL = 20
+SPIDER_HEARTBEAT_EXPIRES = 60
@@ -0,0 +1,265 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import tempfile
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger('django')
+
+# 缓存文件放在settings.DOC_CACHE_DIR中，文件名为sha1(file_url)
+# 正在写入的临时文件后缀，写完后rename成正式文件名
+PART_SUFFIX = '.part'
+# 超过这个时间的临时文件是写入中断留下的，清理掉，单位秒
+STALE_PART_SECONDS = 60 * 60
+
+# 统计数据 hits：命中次数 misses：未命中次数 bytes_saved：命中时少从文件服务器取的字节数 bytes_fetched：从文件服务器取的字节数
+STATS_KEY = 'doc:cache:stats'
+# 同一个文档同时只让一个请求写缓存
+FILL_LOCK_KEY = 'doc:cache:lock:{}'
+FILL_LOCK_EXPIRES = 10 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_connection():
+    return get_redis_connection(alias='doc')
+
+
+def cache_dir():
+    return settings.DOC_CACHE_DIR
+
+
+def cache_name(file_url):
+    return hashlib.sha1(file_url.encode('utf8')).hexdigest()
+
+
+def incr_stats(**amounts):
+    """
+    累加统计数据，redis出错不影响下载
+    """
+    try:
+        pi = get_connection().pipeline(transaction=False)
+        for field, amount in amounts.items():
+            pi.hincrby(STATS_KEY, field, amount)
+        pi.execute()
+    except Exception as e:
+        logger.error(f'更新文档缓存统计出错：{e}')
+
+
+def lookup(file_url):
+    """
+    查找缓存文件，找到了更新修改时间，淘汰时按修改时间从旧到新删除
+    :param file_url: 数据库中保存的文档路径
+    :return: (文件路径, 文件大小)，没有缓存返回None
+    """
+    path = os.path.join(cache_dir(), cache_name(file_url))
+    try:
+        os.utime(path)
+        return path, os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+
+
+def acquire_fill(file_url):
+    """
+    抢写缓存的锁，抢不到的请求只转发不写缓存
+    :return: 是否抢到
+    """
+    try:
+        return bool(get_connection().set(FILL_LOCK_KEY.format(cache_name(file_url)), 1, nx=True, ex=FILL_LOCK_EXPIRES))
+    except Exception as e:
+        logger.error(f'获取文档缓存锁出错：{e}')
+        return False
+
+
+def release_fill(file_url):
+    try:
+        get_connection().delete(FILL_LOCK_KEY.format(cache_name(file_url)))
+    except Exception as e:
+        logger.error(f'释放文档缓存锁出错：{e}')
+
+
+class TeeStream(object):
+    """
+    tee()返回的迭代器
+    # 生成器还没开始迭代时close()不会执行里面的finally，响应没有发出去（客户端提前断开、中间件出错）时锁会一直留到过期，
+    # 这里在close()中释放
+    """
+    def __init__(self, chunks, file_url, content_length=None):
+        self.chunks = chunks
+        self.file_url = file_url
+        self.started = False
+        self.iterator = _tee(chunks, file_url, content_length)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.started = True
+        return next(self.iterator)
+
+    def close(self):
+        self.iterator.close()
+        if not self.started:
+            self.started = True
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+            release_fill(self.file_url)
+
+
+def tee(chunks, file_url, content_length=None):
+    """
+    把文件服务器返回的内容原样交给浏览器，同时写到临时文件
+    # 完整读完并且大小和Content-Length一致才rename成缓存文件，rename是原子的，其他进程不会读到写了一半的文件
+    # 浏览器中途断开或者出错就删掉临时文件
+    :param chunks: 文件服务器响应的迭代器
+    :param file_url: 数据库中保存的文档路径
+    :param content_length: 文件服务器返回的Content-Length
+    :return: 迭代器，StreamingHttpResponse关闭时调用它的close()
+    """
+    return TeeStream(chunks, file_url, content_length)
+
+
+def _tee(chunks, file_url, content_length):
+    directory = cache_dir()
+    tmp_path = None
+    complete = False
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=PART_SUFFIX)
+        tmp_file = os.fdopen(fd, 'wb')
+    except Exception as e:
+        logger.error(f'创建文档缓存文件出错：{e}')
+        release_fill(file_url)
+        if tmp_path:
+            os.remove(tmp_path)
+        yield from chunks
+        return
+
+    size = 0
+    try:
+        with tmp_file:
+            for chunk in chunks:
+                tmp_file.write(chunk)
+                size += len(chunk)
+                yield chunk
+        if content_length is None or size == int(content_length):
+            os.replace(tmp_path, os.path.join(directory, cache_name(file_url)))
+            complete = True
+            evict()
+    finally:
+        # 浏览器断开时把文件服务器的连接也关掉
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        if not complete:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+        release_fill(file_url)
+
+
+def evict(max_bytes=None):
+    """
+    缓存总大小超过上限时，按最近访问时间从旧到新删除
+    :param max_bytes: 缓存大小上限，默认settings.DOC_CACHE_MAX_BYTES
+    :return: 删除的文件数
+    """
+    max_bytes = settings.DOC_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    now = time.time()
+    entries = []
+    total = 0
+    try:
+        with os.scandir(cache_dir()) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(PART_SUFFIX):
+                    if now - stat.st_mtime > STALE_PART_SECONDS:
+                        _remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        # 正在被其他请求读取的文件删除后，已经打开的文件句柄还能读完
+        _remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def parse_range(header, size):
+    """
+    解析单个Range请求头，多段的Range不支持，返回整个文件
+    :param header: Range请求头
+    :param size: 文件大小
+    :return: (start, end)，不需要分段返回None，范围不合法返回(None, None)
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-500 最后500个字节
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None, None
+    return start, end
+
+
+def iter_file(file, length, chunk_size):
+    """
+    从文件当前位置读取length个字节，读完关闭文件
+    """
+    try:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def stats():
+    """
+    缓存统计数据
+    :return: 各项累计数据，以及命中率hit_rate、当前缓存文件数files和总大小bytes
+    """
+    result = {key.decode('utf8'): int(value) for key, value in get_connection().hgetall(STATS_KEY).items()}
+    requests = result.get('hits', 0) + result.get('misses', 0)
+    result['hit_rate'] = round(result.get('hits', 0) / requests, 4) if requests else 0
+
+    files = total = 0
+    if os.path.isdir(cache_dir()):
+        with os.scandir(cache_dir()) as it:
+            for entry in it:
+                if not entry.name.endswith(PART_SUFFIX):
+                    files += 1
+                    total += entry.stat().st_size
+    result['files'] = files
+    result['bytes'] = total
+    return result
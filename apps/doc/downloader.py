@@ -0,0 +1,148 @@
+import logging
+
+from django.conf import settings
+from django.utils.encoding import escape_uri_path
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+
+from . import doc_cache
+from utils.http_session import get_session
+
+logger = logging.getLogger('django')
+
+# 文档后缀对应的Content-Type
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'zip': 'application/zip',
+    'doc': 'application/msword',
+    'xls': 'application/vnd.ms-excel',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'ppt': 'application/vnd.ms-powerpoint',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+# 转发给文件服务器的请求头，支持断点续传和协商缓存
+FORWARD_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+# 文件服务器返回后原样带给浏览器的响应头
+PASS_HEADERS = ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+# 文件服务器正常返回的状态码
+PASS_STATUS = (200, 206, 304, 416)
+
+# 每次从文件服务器读取、写给浏览器的字节数
+CHUNK_SIZE = 64 * 1024
+# 连接超时、两次读取之间的超时，单位秒
+TIMEOUT = (3, 30)
+# 每个进程连文件服务器的连接池大小
+POOL_SIZE = 20
+
+
+def origin_url(file_url):
+    """
+    文档在文件服务器上的地址
+    :param file_url: 数据库中保存的文档路径 /media/xxx.pdf
+    :return:
+    """
+    return settings.DOC_FILE_ORIGIN.rstrip('/') + file_url
+
+
+def iter_upstream(upstream):
+    """
+    按固定大小一块一块读取文件服务器的响应，读完或者浏览器断开时把连接还给连接池
+    """
+    try:
+        for chunk in upstream.iter_content(CHUNK_SIZE):
+            yield chunk
+    finally:
+        upstream.close()
+
+
+def cached_response(path, size, request):
+    """
+    从本地缓存文件返回，支持单段的Range请求
+    :param path: 缓存文件路径
+    :param size: 文件大小
+    :param request: 浏览器的请求
+    :return:
+    """
+    byte_range = doc_cache.parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is None:
+        # 整个文件用FileResponse返回，uwsgi有wsgi.file_wrapper时用sendfile
+        res = FileResponse(open(path, 'rb'))
+        res['Content-Length'] = size
+    elif byte_range[0] is None:
+        res = HttpResponse(status=416)
+        res['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = byte_range
+        file = open(path, 'rb')
+        file.seek(start)
+        res = StreamingHttpResponse(doc_cache.iter_file(file, end - start + 1, CHUNK_SIZE), status=206)
+        res['Content-Length'] = end - start + 1
+        res['Content-Range'] = f'bytes {start}-{end}/{size}'
+    res['Accept-Ranges'] = 'bytes'
+    return res
+
+
+def stream_response(file_url, request):
+    """
+    边从文件服务器读取边返回给浏览器，不把整个文件读到内存中
+    # 开启了本地缓存时，缓存中有的直接从本地磁盘返回；没有的在返回给浏览器的同时写入缓存
+    :param file_url: 数据库中保存的文档路径
+    :param request: 浏览器的请求，Range等请求头转发给文件服务器
+    :return: StreamingHttpResponse，文件没有修改时返回304
+    """
+    use_cache = settings.DOC_CACHE_MAX_BYTES > 0
+    if use_cache:
+        cached = doc_cache.lookup(file_url)
+        if cached:
+            path, size = cached
+            doc_cache.incr_stats(hits=1, bytes_saved=size)
+            return cached_response(path, size, request)
+
+    headers = {}
+    for name in FORWARD_HEADERS:
+        value = request.META.get('HTTP_' + name.upper().replace('-', '_'))
+        if value:
+            headers[name] = value
+    try:
+        upstream = get_session('doc', POOL_SIZE).get(origin_url(file_url), headers=headers, stream=True, timeout=TIMEOUT)
+    except Exception as e:
+        logger.info("获取文档内容出现异常：\n{}".format(e))
+        raise Http404("文档下载异常！")
+
+    if upstream.status_code not in PASS_STATUS:
+        upstream.close()
+        logger.info(f"获取文档内容出现异常：{file_url} status={upstream.status_code}")
+        raise Http404("文档下载异常！")
+
+    if use_cache:
+        # 304、416没有传输文件内容，不算在bytes_fetched中
+        fetched = int(upstream.headers.get('Content-Length', 0)) if upstream.status_code in (200, 206) else 0
+        doc_cache.incr_stats(misses=1, bytes_fetched=fetched)
+
+    if upstream.status_code in (304, 416):
+        res = HttpResponse(status=upstream.status_code)
+        upstream.close()
+    elif use_cache and upstream.status_code == 200 and doc_cache.acquire_fill(file_url):
+        # 只有完整的200响应才写缓存，206的部分内容不缓存
+        chunks = doc_cache.tee(iter_upstream(upstream), file_url, upstream.headers.get('Content-Length'))
+        res = StreamingHttpResponse(chunks, status=upstream.status_code)
+    else:
+        res = StreamingHttpResponse(iter_upstream(upstream), status=upstream.status_code)
+    for name in PASS_HEADERS:
+        if name in upstream.headers:
+            res[name] = upstream.headers[name]
+    return res
+
+
+def accel_response(file_url):
+    """
+    只返回X-Accel-Redirect响应头，由nginx读取media目录中的文件返回给浏览器，uwsgi进程马上就可以处理下一个请求
+    # nginx中要配置DOC_ACCEL_PREFIX对应的internal location，见deploy/nginx_conf.conf
+    :param file_url: 数据库中保存的文档路径
+    :return:
+    """
+    res = HttpResponse()
+    # 中文文件名要先做URL编码，否则django会把响应头编码成=?utf-8?b?...?=，nginx找不到location返回404
+    # nginx会先解码X-Accel-Redirect，再按解码后的路径找文件
+    res['X-Accel-Redirect'] = escape_uri_path(settings.DOC_ACCEL_PREFIX.rstrip('/') + file_url)
+    return res
@@ -0,0 +1,74 @@
+import math
+import time
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from doc import constants
+
+COMPANY_HTML = ('<html><body><div id="_container_judicialSale">'
+                '<div class="company_pager pagination-warp"><ul page-total="{total}"></ul></div>'
+                '</div></body></html>')
+ROW_HTML = ('<tr><td>{num}</td><td>2019-07-{day:02d}</td><td>拍卖公告{num}</td>'
+            '<td><a>标的物</a><span>{num}</span></td><td>测试法院</td></tr>')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    模拟天眼查公司详情页和司法拍卖分页接口，数据是固定生成的
+    """
+    protocol_version = 'HTTP/1.1'
+    total = 600
+    delay = 0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        url = urlparse(self.path)
+        if url.path.startswith('/company/'):
+            body = COMPANY_HTML.format(total=self.total)
+        elif url.path == '/pagination/judicialSale.xhtml':
+            query = parse_qs(url.query)
+            page_size = int(query.get('ps', [constants.SPIDER_PAGE_SIZE])[0])
+            pn = int(query.get('pn', ['1'])[0])
+            nums = range((pn - 1) * page_size + 1, min(pn * page_size, self.total) + 1)
+            body = '<table><tbody>' + ''.join(ROW_HTML.format(num=num, day=num % 28 + 1) for num in nums) + '</tbody></table>'
+        else:
+            self.send_error(404)
+            return
+
+        content = body.encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    """
+    启动一个模拟天眼查的http服务器，用来本地测试爬虫
+    # settings中配置 SPIDER_BASE_URL = 'http://127.0.0.1:8010'，或者 crawl_worker --base-url http://127.0.0.1:8010
+    python manage.py crawl_fixture_server --port 8010 --total 600 --delay 0.2
+    """
+    help = '启动一个模拟天眼查的http服务器'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8010, help='监听端口')
+        parser.add_argument('--total', type=int, default=600, help='司法拍卖总条数')
+        parser.add_argument('--delay', type=float, default=0, help='每个请求的延迟，单位秒')
+
+    def handle(self, *args, **options):
+        FixtureHandler.total = options['total']
+        FixtureHandler.delay = options['delay']
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), FixtureHandler)
+        pages = math.ceil(options['total'] / constants.SPIDER_PAGE_SIZE)
+        self.stdout.write(f'天眼查测试服务器启动：http://127.0.0.1:{options["port"]}/ 共{pages}页')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -0,0 +1,38 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+
+from doc import crawler
+from doc import constants
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    常驻运行，执行爬取任务队列中的任务
+    python manage.py crawl_worker --concurrency 8 --parse-processes 2
+    python manage.py crawl_worker --company-id 14270846    # 直接爬取一个公司，输出条数和耗时后退出
+    """
+    help = '执行爬取任务队列中的任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=constants.SPIDER_CONCURRENCY, help='同时请求的分页数')
+        parser.add_argument('--parse-processes', type=int, default=constants.SPIDER_PARSE_PROCESSES, help='解析页面的子进程数')
+        parser.add_argument('--base-url', default=None, help='站点地址，默认settings.SPIDER_BASE_URL')
+        parser.add_argument('--company-id', default=None, help='直接爬取这个公司，不读任务队列')
+
+    def handle(self, *args, **options):
+        spider = crawler.Crawler(options['base_url'], options['concurrency'], options['parse_processes'])
+        try:
+            if options['company_id']:
+                start = time.perf_counter()
+                result = spider.crawl(options['company_id'])
+                self.stdout.write(self.style.SUCCESS(f'爬取完成，共{len(result)}条，耗时{time.perf_counter() - start:.2f}秒'))
+                return
+
+            logger.info(f'爬取任务队列启动，并发数：{options["concurrency"]}')
+            crawler.run_worker(spider)
+        finally:
+            spider.close()
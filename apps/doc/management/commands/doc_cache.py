@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from doc import doc_cache
+
+
+class Command(BaseCommand):
+    """
+    查看文档下载缓存的命中率，或者按大小上限淘汰缓存文件
+    python manage.py doc_cache               # 输出统计数据
+    python manage.py doc_cache --evict       # 按DOC_CACHE_MAX_BYTES淘汰
+    python manage.py doc_cache --evict 0     # 清空缓存
+    """
+    help = '查看文档下载缓存的命中率，或者淘汰缓存文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', type=int, nargs='?', const=-1, default=None, help='淘汰到指定字节数以下，不指定时用DOC_CACHE_MAX_BYTES')
+
+    def handle(self, *args, **options):
+        if options['evict'] is not None:
+            max_bytes = None if options['evict'] < 0 else options['evict']
+            removed = doc_cache.evict(max_bytes)
+            self.stdout.write(self.style.SUCCESS(f'淘汰了{removed}个缓存文件'))
+
+        for key, value in sorted(doc_cache.stats().items()):
+            self.stdout.write(f'{key}: {value}')
@@ -8,5 +8,6 @@ app_name = 'doc'
 urlpatterns = [
     path('doc/', views.doc_index, name='download'),
     path('doc/<int:doc_id>/', views.DocDownload.as_view(), name='download_doc'),
-    path('doc/spider/', views.SpiderDownloadView.as_view(), name='download_spider')
+    path('doc/spider/', views.SpiderDownloadView.as_view(), name='download_spider'),
+    path('doc/spider/<str:job_id>/', views.SpiderJobView.as_view(), name='spider_job'),
 ]
\ No newline at end of file
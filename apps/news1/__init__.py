@@ -0,0 +1 @@
+default_app_config = 'news1.apps.News1Config'
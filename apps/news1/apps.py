@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class News1Config(AppConfig):
     name = 'news1'
+
+    def ready(self):
+        # 注册信号，模型保存、删除时同步更新redis中的数据
+        from . import signals  # noqa
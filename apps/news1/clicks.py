@@ -0,0 +1,86 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from django_redis import get_redis_connection
+
+from . import models
+
+logger = logging.getLogger('django')
+
+# 还没写入数据库的点击量 hash field为新闻id value为增量
+CLICKS_PENDING_KEY = 'news:clicks:pending'
+# 正在写入数据库的点击量，flush时把pending改名成这个key，新的点击继续写到pending中
+CLICKS_FLUSHING_KEY = 'news:clicks:flushing'
+
+# 一条UPDATE语句最多更新的新闻条数
+FLUSH_BATCH_SIZE = 500
+
+
+def get_connection():
+    return get_redis_connection(alias='news')
+
+
+def incr_click(news_id):
+    """
+    点击量加1，只写redis，不写数据库
+    :param news_id:
+    :return:
+    """
+    try:
+        get_connection().hincrby(CLICKS_PENDING_KEY, news_id, 1)
+    except Exception as e:
+        logger.error(f'记录点击量出错：news_id={news_id} {e}')
+
+
+def get_pending_clicks(news_ids):
+    """
+    取出还没写入数据库的点击量
+    # 正在flush的增量也要算上，否则flush期间排名会跳动
+    :param news_ids: 新闻id列表
+    :return: {新闻id: 增量}
+    """
+    news_ids = list(news_ids)
+    if not news_ids:
+        return {}
+    try:
+        con = get_connection()
+        pi = con.pipeline(transaction=False)
+        pi.hmget(CLICKS_PENDING_KEY, news_ids)
+        pi.hmget(CLICKS_FLUSHING_KEY, news_ids)
+        pending, flushing = pi.execute()
+    except Exception as e:
+        logger.error(f'读取点击量出错：{e}')
+        return {}
+    return {news_id: int(a or 0) + int(b or 0) for news_id, a, b in zip(news_ids, pending, flushing)}
+
+
+def flush_clicks():
+    """
+    把redis中的点击量增量批量写入数据库
+    # 先把pending改名成flushing，改名是原子操作，之后的点击会写到新的pending中，不会丢
+    # 用一条UPDATE ... SET clicks = clicks + CASE id WHEN ... END写入一批
+    # 上次flush中断留下的flushing会先写入
+    # 所有批次在一个事务中写入，提交后马上删除flushing：
+    #   中途出错整个事务回滚，flushing留着下次重新写入，不会有一部分批次写了两次
+    #   提交前读到的是旧的点击量加flushing，提交后flushing已经删除，不会重复计算
+    :return: 写入的新闻条数
+    """
+    con = get_connection()
+    if not con.exists(CLICKS_FLUSHING_KEY):
+        # pending不存在，没有新的点击
+        if not con.exists(CLICKS_PENDING_KEY):
+            return 0
+        con.rename(CLICKS_PENDING_KEY, CLICKS_FLUSHING_KEY)
+
+    deltas = {int(news_id): int(delta) for news_id, delta in con.hgetall(CLICKS_FLUSHING_KEY).items() if int(delta)}
+    news_ids = list(deltas)
+    with transaction.atomic():
+        for i in range(0, len(news_ids), FLUSH_BATCH_SIZE):
+            batch = news_ids[i:i + FLUSH_BATCH_SIZE]
+            whens = [When(id=news_id, then=Value(deltas[news_id])) for news_id in batch]
+            # update不会触发save信号，也不会修改update_time，不影响新闻列表排序
+            models.News.objects.filter(id__in=batch).update(
+                clicks=F('clicks') + Case(*whens, default=Value(0), output_field=IntegerField()))
+    con.delete(CLICKS_FLUSHING_KEY)
+    return len(news_ids)
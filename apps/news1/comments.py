@@ -0,0 +1,142 @@
+import logging
+
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from . import models
+from .models import SHANGHAI_TZ, COMMENT_TIME_FORMAT
+
+logger = logging.getLogger('django')
+
+# 评论需要查询的字段，作者名通过join一起查出来
+COMMENT_FIELDS = ('id', 'news_id', 'parent_id', 'content', 'update_time', 'is_delete', 'author__username')
+
+# 每篇新闻未删除的评论数
+COMMENT_COUNT_KEY = 'news:comments:count:{}'
+# 评论数过期时间，过期后重新COUNT一次，增量维护万一有误差也能自动修正
+COMMENT_COUNT_EXPIRES = 24 * 60 * 60
+
+# 计数已经初始化过才加减，没初始化的等第一次读取时用COUNT初始化
+INCR_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+def _load_rows(queryset, rows_by_id):
+    """
+    查出评论的values()数据，补全不在结果中的父评论
+    # 父评论一般是同一篇新闻下的评论，已经在第一次查询中了，只有不在结果中的才会再查一次
+    :param queryset: values(*COMMENT_FIELDS)的评论查询集，可以是切片后的
+    :param rows_by_id: {评论id: 行数据}，查出来的数据会放进去
+    :return: 查询集中的行数据列表
+    """
+    rows = list(queryset)
+    for row in rows:
+        rows_by_id[row['id']] = row
+
+    missing_ids = {row['parent_id'] for row in rows if row['parent_id'] and row['parent_id'] not in rows_by_id}
+    while missing_ids:
+        parents = list(models.Comments.objects.filter(id__in=missing_ids).values(*COMMENT_FIELDS))
+        for row in parents:
+            rows_by_id[row['id']] = row
+        missing_ids = {row['parent_id'] for row in parents if row['parent_id'] and row['parent_id'] not in rows_by_id}
+    return rows
+
+
+def _build_comment_dicts(rows, rows_by_id):
+    """
+    在内存中组装评论和它的父评论链，返回和Comments.to_comment_dict一样结构的数据
+    # 每条评论只格式化一次，父评论链上的dict是共用的
+    """
+    built = {}
+
+    def to_dict(row):
+        # 沿着父评论链往上找到还没组装的评论，再从最上层往下组装，嵌套再深也不会递归溢出
+        chain = []
+        while row is not None and row['id'] not in built:
+            chain.append(row)
+            row = rows_by_id.get(row['parent_id'])
+        for one in reversed(chain):
+            built[one['id']] = {
+                'news_id': one['news_id'],
+                'content_id': one['id'],
+                'content': one['content'],
+                'author': one['author__username'],
+                'update_time': one['update_time'].astimezone(SHANGHAI_TZ).strftime(COMMENT_TIME_FORMAT),
+                'parent': built.get(one['parent_id']),
+            }
+        return built[chain[0]['id']] if chain else built[row['id']]
+
+    return [to_dict(row) for row in rows]
+
+
+def get_comment_dicts(news_id):
+    """
+    一篇新闻下所有未删除的评论
+    # 一次查询取出这篇新闻的全部评论（包括已删除的，父评论链上可能用到），不管评论嵌套多深都是1~2条SQL
+    :param news_id: 新闻id
+    :return: 评论dict列表，按Comments.Meta.ordering排序
+    """
+    rows_by_id = {}
+    rows = _load_rows(models.Comments.objects.filter(news_id=news_id).values(*COMMENT_FIELDS), rows_by_id)
+    return _build_comment_dicts([row for row in rows if not row['is_delete']], rows_by_id)
+
+
+def get_comment_page(news_id, update_time=None, comment_id=None, per_page=10):
+    """
+    游标分页取出一批评论
+    # 按(update_time, id)倒序，和Comments.Meta.ordering一致，多取一条判断有没有下一批
+    :param news_id: 新闻id
+    :param update_time: 游标中上一批最后一条评论的更新时间，为None时从第一条开始
+    :param comment_id: 游标中上一批最后一条评论的id
+    :param per_page: 每批条数
+    :return: (评论dict列表, 最后一条评论的(update_time, id)，没有下一批时为None)
+    """
+    queryset = models.Comments.objects.filter(news_id=news_id, is_delete=False).order_by('-update_time', '-id')
+    if update_time is not None:
+        queryset = queryset.filter(Q(update_time__lt=update_time) | Q(update_time=update_time, id__lt=comment_id))
+
+    rows_by_id = {}
+    rows = _load_rows(queryset.values(*COMMENT_FIELDS)[0:per_page + 1], rows_by_id)
+    has_more = len(rows) > per_page
+    rows = rows[0:per_page]
+    last = (rows[-1]['update_time'], rows[-1]['id']) if has_more else None
+    return _build_comment_dicts(rows, rows_by_id), last
+
+
+def get_comment_count(news_id):
+    """
+    新闻的评论数，从redis中读，没有的时候COUNT一次存进去，之后由信号增量维护
+    :param news_id:
+    :return:
+    """
+    try:
+        con = get_redis_connection(alias='news')
+        key = COMMENT_COUNT_KEY.format(news_id)
+        count = con.get(key)
+        if count is not None:
+            return int(count)
+        count = models.Comments.objects.filter(news_id=news_id, is_delete=False).count()
+        # 并发初始化时只保留第一个写入的值
+        con.set(key, count, ex=COMMENT_COUNT_EXPIRES, nx=True)
+        return count
+    except Exception as e:
+        logger.error(f'读取评论数出错：news_id={news_id} {e}')
+        return models.Comments.objects.filter(news_id=news_id, is_delete=False).count()
+
+
+def incr_comment_count(news_id, amount):
+    """
+    评论数加减，只在已经初始化过的情况下修改
+    :param news_id:
+    :param amount: 增量，新增评论为1，删除评论为-1
+    :return:
+    """
+    try:
+        con = get_redis_connection(alias='news')
+        con.eval(INCR_IF_EXISTS_SCRIPT, 1, COMMENT_COUNT_KEY.format(news_id), amount)
+    except Exception as e:
+        logger.error(f'更新评论数出错：news_id={news_id} {e}')
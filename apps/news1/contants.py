@@ -5,4 +5,21 @@ PER_PAGE_NEWS_NUM = 5
 SHOW_HOTNEWS_COUNT = 3
 
 # 轮播图条数
-SHOW_BANNER_COUNT = 6
\ No newline at end of file
+SHOW_BANNER_COUNT = 6
+
+# 新闻详情页每批加载的评论条数
+PER_PAGE_COMMENTS_NUM = 10
+
+# 首页html片段、轮播图缓存时间，单位秒
+# 数据改变时信号会更新版本号让缓存失效，所以可以缓存很久
+FRAGMENT_CACHE_TIMEOUT = 6 * 60 * 60
+
+# 新闻列表接口缓存时间，单位秒，新闻改变时版本号会变，缓存自动失效
+NEWS_LIST_CACHE_TIMEOUT = 10 * 60
+
+# 搜索结果缓存时间，单位秒，搜索索引更新后版本号会变，缓存自动失效
+SEARCH_CACHE_TIMEOUT = 10 * 60
+
+# 搜索页热门新闻列表最多缓存的条数和序列化后的最大字节数
+SEARCH_HOTNEWS_MAX_COUNT = 100
+SEARCH_HOTNEWS_MAX_BYTES = 128 * 1024
@@ -0,0 +1,190 @@
+import math
+import logging
+
+from django_redis import get_redis_connection
+
+from . import models
+from utils.paginator_script import to_micro_timestamp
+
+logger = logging.getLogger('django')
+
+# 全部新闻的有序集合 member为新闻id score为update_time的微秒时间戳
+FEED_ALL_KEY = 'news:feed:all'
+# 每个标签一个有序集合
+FEED_TAG_KEY = 'news:feed:tag:{}'
+# 记录每条新闻当前在哪个标签下，修改标签或者删除新闻时用来找到旧的有序集合
+FEED_NEWS_TAG_KEY = 'news:feed:news_tag'
+# 索引是否已经建好的标记，没建好的时候视图回退到查数据库
+FEED_READY_KEY = 'news:feed:ready'
+
+# 重建索引时每批写入的条数
+REBUILD_BATCH_SIZE = 1000
+
+
+def get_connection():
+    return get_redis_connection(alias='news')
+
+
+def add_news(news_id, tag_id, update_time):
+    """
+    新闻保存后加入索引，标签修改过的要从旧标签的集合中移除
+    :param news_id: 新闻id
+    :param tag_id: 标签id，可以为None
+    :param update_time: 新闻的更新时间
+    :return:
+    """
+    con = get_connection()
+    score = to_micro_timestamp(update_time)
+    old_tag_id = con.hget(FEED_NEWS_TAG_KEY, news_id)
+    tag_value = tag_id or 0
+
+    pi = con.pipeline()
+    if old_tag_id is not None and int(old_tag_id) != tag_value:
+        pi.zrem(FEED_TAG_KEY.format(int(old_tag_id)), news_id)
+    pi.zadd(FEED_ALL_KEY, {news_id: score})
+    if tag_id:
+        pi.zadd(FEED_TAG_KEY.format(tag_id), {news_id: score})
+    pi.hset(FEED_NEWS_TAG_KEY, news_id, tag_value)
+    pi.execute()
+
+
+def remove_news(news_id):
+    """
+    新闻被删除（包括逻辑删除）后从索引中移除
+    :param news_id:
+    :return:
+    """
+    con = get_connection()
+    old_tag_id = con.hget(FEED_NEWS_TAG_KEY, news_id)
+
+    pi = con.pipeline()
+    pi.zrem(FEED_ALL_KEY, news_id)
+    if old_tag_id is not None:
+        pi.zrem(FEED_TAG_KEY.format(int(old_tag_id)), news_id)
+    pi.hdel(FEED_NEWS_TAG_KEY, news_id)
+    pi.execute()
+
+
+def rebuild():
+    """
+    从tb_news重建全部索引
+    # 先写到临时key中，写完再rename，重建的过程中线上读的还是旧索引
+    :return: 写入的新闻条数
+    """
+    con = get_connection()
+    tmp_prefix = 'tmp:'
+    tag_ids = set()
+    total = 0
+
+    # 清掉上次重建中断留下的临时key
+    for key in con.scan_iter(match=tmp_prefix + 'news:feed:*'):
+        con.delete(key)
+
+    news_rows = models.News.objects.filter(is_delete=False).values_list('id', 'tag_id', 'update_time').order_by().iterator()
+    pi = con.pipeline(transaction=False)
+    for news_id, tag_id, update_time in news_rows:
+        score = to_micro_timestamp(update_time)
+        pi.zadd(tmp_prefix + FEED_ALL_KEY, {news_id: score})
+        if tag_id:
+            tag_ids.add(tag_id)
+            pi.zadd(tmp_prefix + FEED_TAG_KEY.format(tag_id), {news_id: score})
+        pi.hset(tmp_prefix + FEED_NEWS_TAG_KEY, news_id, tag_id or 0)
+        total += 1
+        if total % REBUILD_BATCH_SIZE == 0:
+            pi.execute()
+    pi.execute()
+
+    new_keys = {FEED_ALL_KEY, FEED_NEWS_TAG_KEY} | {FEED_TAG_KEY.format(tag_id) for tag_id in tag_ids}
+    old_keys = {key.decode('utf8') for key in con.scan_iter(match='news:feed:tag:*')}
+
+    pi = con.pipeline()
+    for key in new_keys:
+        if total:
+            pi.rename(tmp_prefix + key, key)
+        else:
+            pi.delete(key)
+    # 已经没有新闻的标签，删掉旧集合
+    for key in old_keys - new_keys:
+        pi.delete(key)
+    pi.set(FEED_READY_KEY, 1)
+    pi.execute()
+    return total
+
+
+def _get_feed_key(con, tag_id):
+    """
+    找到要读的有序集合，标签下没有新闻就返回全部新闻
+    :return: key，索引没建好返回None
+    """
+    if not con.exists(FEED_READY_KEY):
+        return None
+    if tag_id:
+        tag_key = FEED_TAG_KEY.format(tag_id)
+        if con.zcard(tag_key):
+            return tag_key
+    return FEED_ALL_KEY
+
+
+def get_page_ids(tag_id, page, per_page):
+    """
+    按页码取出一页新闻id
+    :param tag_id: 标签id
+    :param page: 页码，超出范围返回最后一页
+    :param per_page: 每页条数
+    :return: (新闻id列表, 总页数, 实际页码)，索引不可用时返回None
+    """
+    try:
+        con = get_connection()
+        key = _get_feed_key(con, tag_id)
+        if key is None:
+            return None
+        total_pages = max(math.ceil(con.zcard(key) / per_page), 1)
+        if page < 1 or page > total_pages:
+            page = total_pages
+        start = (page - 1) * per_page
+        ids = con.zrevrange(key, start, start + per_page - 1)
+    except Exception as e:
+        logger.error(f'读取新闻列表索引出错：{e}')
+        return None
+    return [int(i) for i in ids], total_pages, page
+
+
+def get_cursor_ids(tag_id, update_time, news_id, per_page):
+    """
+    按游标取出一页新闻id
+    # 取分数小于等于游标的数据，把和游标分数相同、id不小于游标id的去掉
+    # 多取一条，用来判断有没有下一页
+    # 分数相同时redis按member字符串倒序返回（"9"在"10"前面），要和游标的比较方式一致，
+    # 最后一个分数的数据全部取出来，按 (分数, id数值) 倒序重新排序
+    :param tag_id: 标签id
+    :param update_time: 游标中的更新时间，为None时从头开始
+    :param news_id: 游标中的新闻id
+    :param per_page: 每页条数
+    :return: (新闻id列表, 是否还有下一页)，索引不可用时返回None
+    """
+    try:
+        con = get_connection()
+        key = _get_feed_key(con, tag_id)
+        if key is None:
+            return None
+        score = None
+        if update_time is None:
+            rows = con.zrevrange(key, 0, per_page, withscores=True)
+        else:
+            score = to_micro_timestamp(update_time)
+            ties = con.zcount(key, score, score)
+            rows = con.zrevrangebyscore(key, score, '-inf', start=0, num=per_page + 1 + ties, withscores=True)
+        if rows:
+            last = rows[-1][1]
+            rows = dict(rows)
+            rows.update(con.zrangebyscore(key, last, last, withscores=True))
+            rows = rows.items()
+    except Exception as e:
+        logger.error(f'读取新闻列表索引出错：{e}')
+        return None
+    rows = [(int(member), s) for member, s in rows]
+    if score is not None:
+        rows = [(member, s) for member, s in rows if not (s == score and member >= news_id)]
+    rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+    ids = [member for member, _ in rows]
+    return ids[0:per_page], len(ids) > per_page
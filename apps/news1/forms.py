@@ -0,0 +1,12 @@
+from haystack.forms import ModelSearchForm
+
+from . import search_cache
+
+
+class NewsSearchForm(ModelSearchForm):
+    """
+    新闻搜索form
+    # 搜索内容先规范化，全角半角、大小写、多余空格不同的搜索结果和缓存都是同一份
+    """
+    def clean_q(self):
+        return search_cache.normalize_query(self.cleaned_data['q'])
@@ -0,0 +1,64 @@
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+
+from news1 import models
+from news1 import comments
+from users.models import Users
+
+
+class Command(BaseCommand):
+    """
+    对比新闻详情页评论加载的SQL条数
+    # 在事务中造一篇新闻和不同嵌套深度的评论，分别用Comments.to_comment_dict和comments.get_comment_dicts加载
+    # 跑完回滚，不会在数据库中留下数据
+    python manage.py bench_comment_queries --depths 1 5 20 50
+    """
+    help = '对比新闻详情页评论加载的SQL条数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depths', type=int, nargs='+', default=[1, 5, 20, 50], help='评论嵌套深度')
+        parser.add_argument('--threads', type=int, default=10, help='每个深度造几条评论链')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"深度":>6}{"评论数":>8}{"旧SQL条数":>12}{"新SQL条数":>12}{"旧耗时ms":>12}{"新耗时ms":>12}')
+        for depth in options['depths']:
+            with transaction.atomic():
+                news_id, total = self.make_threads(depth, options['threads'])
+                old_queries, old_ms = self.measure(lambda: self.load_old(news_id))
+                new_queries, new_ms = self.measure(lambda: comments.get_comment_dicts(news_id))
+                transaction.set_rollback(True)
+            self.stdout.write(f'{depth:>6}{total:>8}{old_queries:>12}{new_queries:>12}{old_ms:>12.1f}{new_ms:>12.1f}')
+
+    @staticmethod
+    def make_threads(depth, threads):
+        """
+        造threads条嵌套depth层的评论链，每层一个不同的作者
+        """
+        authors = [Users.objects.create(username=f'bench_user_{depth}_{i}', mobile=f'1990000{depth:02d}{i:02d}') for i in range(min(depth, 50))]
+        news = models.News.objects.create(title='bench', digest='bench', content='bench', author=authors[0])
+        total = 0
+        for _ in range(threads):
+            parent = None
+            for level in range(depth):
+                parent = models.Comments.objects.create(news=news, content=f'level {level}', author=authors[level % len(authors)], parent=parent)
+                total += 1
+        return news.id, total
+
+    @staticmethod
+    def load_old(news_id):
+        """
+        改造前NewsDetailView中的写法
+        """
+        queryset = models.Comments.objects.select_related('author', 'parent').only('author__username', 'parent__author__username', 'update_time', 'content', 'parent__content', 'parent__update_time').filter(is_delete=False, news_id=news_id)
+        return [comment.to_comment_dict() for comment in queryset]
+
+    @staticmethod
+    def measure(func):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+        return len(ctx.captured_queries), elapsed
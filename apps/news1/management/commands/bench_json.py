@@ -0,0 +1,59 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.http import JsonResponse
+from django.core.management.base import BaseCommand
+
+from utils import json_func
+from utils.json_func import to_json_data
+
+
+class Command(BaseCommand):
+    """
+    对比JsonResponse和to_json_data序列化新闻列表的耗时
+    python manage.py bench_json --sizes 5 500 --number 2000
+    """
+    help = '对比JsonResponse和to_json_data序列化新闻列表的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[5, 500], help='新闻列表条数')
+        parser.add_argument('--number', type=int, default=2000, help='每种情况重复次数')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        backend = 'orjson' if json_func.orjson is not None else 'json'
+        self.stdout.write(f'to_json_data序列化后端：{backend}')
+        self.stdout.write(f'{"条数":>6}{"JsonResponse us":>18}{"to_json_data us":>18}{"bytes透传 us":>16}')
+        for size in options['sizes']:
+            data = {'news': self.make_news(size)}
+            # 模拟快照：data已经序列化好
+            raw = json_func.dumps(data)
+            old = self.measure(lambda: JsonResponse({'errno': '0', 'errmsg': '', 'data': data}), number)
+            new = self.measure(lambda: to_json_data(data=data), number)
+            passthrough = self.measure(lambda: to_json_data(data=raw), number)
+            self.stdout.write(f'{size:>6}{old:>18.1f}{new:>18.1f}{passthrough:>16.1f}')
+
+    @staticmethod
+    def make_news(size):
+        now = datetime.now(timezone.utc)
+        return [{
+            'news_id': i,
+            'uuid': uuid.uuid4(),
+            'title': f'新闻标题{i}',
+            'digest': '新闻摘要' * 10,
+            'image_url': f'http://192.168.35.133:8888/group1/M00/00/00/{i}.jpg',
+            'update_time': now,
+            'tag_name': 'Python基础',
+            'author_username': 'admin',
+        } for i in range(size)]
+
+    @staticmethod
+    def measure(func, number):
+        """
+        :return: 平均每次耗时，单位微秒
+        """
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - start) / number * 1000000
@@ -0,0 +1,130 @@
+import os
+import time
+import random
+import shutil
+import tempfile
+import itertools
+
+from django.core.management.base import BaseCommand
+
+from utils.local_search.index import LocalIndex
+
+# 生成测试数据用的英文词
+ENGLISH_WORDS = ['python', 'django', 'redis', 'mysql', 'linux', 'docker', 'nginx', 'http', 'api', 'web',
+                 'flask', 'java', 'golang', 'git', 'vue', 'json', 'orm', 'celery', 'uwsgi', 'elasticsearch']
+
+
+def make_vocabulary(size, seed):
+    """
+    随机生成中文词表，词频按齐夫分布，越靠前的词出现越多
+    :return: (词列表, 累计权重)
+    """
+    rnd = random.Random(seed)
+    # 常用汉字区间中取3000个字
+    chars = [chr(code) for code in rnd.sample(range(0x4e00, 0x9fa5), 3000)]
+    words = [''.join(rnd.choice(chars) for _ in range(rnd.choice((2, 2, 2, 3, 4)))) for _ in range(size)]
+    words.extend(ENGLISH_WORDS)
+    rnd.shuffle(words)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+
+def make_docs(count, length, words, cum_weights, seed):
+    """
+    :return: 生成器 (文档id, 文本, 返回字段)
+    """
+    rnd = random.Random(seed)
+    for pk in range(1, count + 1):
+        title = ''.join(rnd.choices(words, cum_weights=cum_weights, k=6))
+        content = ' '.join(rnd.choices(words, cum_weights=cum_weights, k=length // 3))
+        yield f'news1.news.{pk}', f'{title}\n{content}', {'id': pk, 'title': title}
+
+
+class Command(BaseCommand):
+    """
+    本地搜索引擎的性能测试
+    # 默认生成10万篇随机文章建立索引，再用随机的热门词、长尾词、中英文混合词查询，统计延迟
+    # --path指定已有的索引目录时只测查询
+    python manage.py bench_local_search --docs 100000 --queries 1000
+    """
+    help = '本地搜索引擎的性能测试'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=100000, help='生成的文章数')
+        parser.add_argument('--length', type=int, default=600, help='每篇文章的字数')
+        parser.add_argument('--vocabulary', type=int, default=50000, help='词表大小')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每次写入索引的文章数')
+        parser.add_argument('--queries', type=int, default=1000, help='查询次数')
+        parser.add_argument('--page-size', type=int, default=5, help='每次查询返回的条数')
+        parser.add_argument('--path', default=None, help='已有的索引目录，不写时在临时目录生成')
+        parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+
+    def handle(self, *args, **options):
+        words, cum_weights = make_vocabulary(options['vocabulary'], options['seed'])
+        path = options['path']
+        tmp_dir = None
+        if path is None:
+            tmp_dir = tempfile.mkdtemp(prefix='local_search_')
+            path = os.path.join(tmp_dir, 'index')
+            self.build(path, words, cum_weights, options)
+
+        try:
+            index = LocalIndex(path)
+            snapshot = index.snapshot()
+            self.stdout.write(f'文档数{snapshot.live_count}，段数{len(snapshot.segments)}，'
+                              f'索引大小{self.dir_size(path) / 1024 / 1024:.1f}MB')
+
+            rnd = random.Random(options['seed'])
+            queries = [' '.join(rnd.choices(words, cum_weights=cum_weights, k=rnd.choice((1, 2, 3))))
+                       for _ in range(options['queries'])]
+            self.stdout.write(f'{"查询":<12}{"平均命中":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+            for name, part in (('单个词', [q for q in queries if ' ' not in q]),
+                               ('多个词', [q for q in queries if ' ' in q]),
+                               ('全部', queries)):
+                if part:
+                    self.report(name, self.run(index, part, options['page_size']))
+        finally:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def build(self, path, words, cum_weights, options):
+        start = time.perf_counter()
+        docs = make_docs(options['docs'], options['length'], words, cum_weights, options['seed'])
+        index = LocalIndex(path)
+        while True:
+            batch = list(itertools.islice(docs, options['batch_size']))
+            if not batch:
+                break
+            index.add(batch)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'建立索引{options["docs"]}篇，耗时{elapsed:.1f}秒，{options["docs"] / elapsed:.1f} 篇/秒')
+
+    @staticmethod
+    def run(index, queries, page_size):
+        """
+        :return: (平均命中数, 排好序的延迟毫秒列表)
+        """
+        # 先查一次，加载段
+        index.search(queries[0], end=page_size)
+        latencies = []
+        hits_total = 0
+        for query in queries:
+            start = time.perf_counter()
+            hits, results = index.search(query, end=page_size)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits_total += hits
+        latencies.sort()
+        return hits_total / len(queries), latencies
+
+    def report(self, name, result):
+        hits, latencies = result
+
+        def percentile(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+
+        self.stdout.write(f'{name:<12}{hits:>10.0f}{percentile(0.5):>10.2f}{percentile(0.95):>10.2f}'
+                          f'{percentile(0.99):>10.2f}{latencies[-1]:>10.2f}')
+
+    @staticmethod
+    def dir_size(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
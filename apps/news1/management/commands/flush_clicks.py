@@ -0,0 +1,50 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+
+from news1 import clicks
+from news1 import snapshots
+from utils.fragment_cache import bump_version
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    把redis中的新闻点击量批量写入数据库
+    python manage.py flush_clicks            # 写入一次
+    python manage.py flush_clicks --loop     # 常驻，每隔interval秒写入一次
+    """
+    help = '把redis中的新闻点击量批量写入数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='常驻运行，定时写入')
+        parser.add_argument('--interval', type=int, default=30, help='常驻运行时的写入间隔，单位秒')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            count = self.flush()
+            self.stdout.write(self.style.SUCCESS(f'点击量写入完成，共{count}条新闻'))
+            return
+
+        while True:
+            try:
+                count = self.flush()
+                if count:
+                    logger.info(f'点击量写入完成，共{count}条新闻')
+            except Exception as e:
+                logger.error(f'点击量写入出错：{e}')
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def flush():
+        """
+        写入点击量，点击量变了热门新闻的排序可能变了，重新生成热门新闻快照，再让首页片段缓存失效
+        """
+        count = clicks.flush_clicks()
+        if count:
+            snapshots.build_snapshot(snapshots.HOTNEWS_SNAPSHOT_KEY)
+            snapshots.build_snapshot(snapshots.HOTNEWS_LIST_SNAPSHOT_KEY)
+            bump_version('clicks')
+        return count
@@ -0,0 +1,47 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+
+from news1 import search_queue
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    把redis中记录的改变过的数据批量更新到搜索引擎
+    python manage.py process_search_queue            # 处理完当前积压的就退出
+    python manage.py process_search_queue --loop     # 常驻，每隔interval秒处理一次
+    """
+    help = '把改变过的数据批量更新到搜索引擎'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='常驻运行，定时处理')
+        parser.add_argument('--interval', type=float, default=2, help='常驻运行时的处理间隔，单位秒，间隔内的修改会合并成一批')
+        parser.add_argument('--batch-size', type=int, default=search_queue.BATCH_SIZE, help='每批最多处理的条数')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not options['loop']:
+            total = batches = 0
+            while True:
+                count = search_queue.flush(batch_size)
+                if not count:
+                    break
+                total += count
+                batches += 1
+            self.stdout.write(self.style.SUCCESS(f'索引更新完成，共{total}条，{batches}批'))
+            return
+
+        while True:
+            try:
+                count = search_queue.flush(batch_size)
+                if count:
+                    logger.info(f'索引更新{count}条')
+                # 积压的超过一批就马上处理下一批
+                if count >= batch_size:
+                    continue
+            except Exception as e:
+                logger.error(f'更新索引出错：{e}')
+            time.sleep(options['interval'])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from news1 import feed_index
+
+
+class Command(BaseCommand):
+    """
+    从tb_news重建redis中的新闻列表索引
+    python manage.py rebuild_feed_index
+    """
+    help = '从tb_news重建redis中的新闻列表索引'
+
+    def handle(self, *args, **options):
+        total = feed_index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'新闻列表索引重建完成，共{total}条新闻'))
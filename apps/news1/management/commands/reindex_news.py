@@ -0,0 +1,130 @@
+import time
+import resource
+import multiprocessing
+from datetime import datetime, time as dt_time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db.models import Min, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.core.management.base import BaseCommand, CommandError
+
+from news1 import search_cache
+
+# 每个子进程一次从数据库流式读取、提交给搜索引擎的条数
+BATCH_SIZE = 500
+# 每个任务负责的主键范围大小
+CHUNK_SIZE = 5000
+
+
+def _init_worker():
+    """
+    子进程用spawn方式启动，需要自己初始化django
+    """
+    import django
+    django.setup()
+
+
+def _get_index(using):
+    from haystack import connections
+    from news1.models import News
+    return connections[using].get_unified_index().get_index(News)
+
+
+def _get_queryset(index, using, since):
+    queryset = index.index_queryset(using=using)
+    if since is not None:
+        queryset = queryset.filter(update_time__gte=since)
+    return queryset
+
+
+def _index_range(using, start, end, since, batch_size):
+    """
+    在子进程中执行，给主键在[start, end)范围内的新闻建立索引
+    # 用iterator()流式读取，不把整个范围的数据都加载到内存中，每batch_size条提交一次
+    # 中间的批次不刷新索引，最后一批再刷新
+    :return: (条数, 子进程的峰值内存KB)
+    """
+    from haystack import connections
+    index = _get_index(using)
+    backend = connections[using].get_backend()
+    queryset = _get_queryset(index, using, since).filter(pk__gte=start, pk__lt=end).order_by('pk')
+
+    count = 0
+    batch = []
+    for news in queryset.iterator(chunk_size=batch_size):
+        # 一批满了等读到下一条时再提交，最后剩下的一批一定不为空，用commit=True提交
+        if len(batch) >= batch_size:
+            backend.update(index, batch, commit=False)
+            count += len(batch)
+            batch = []
+        batch.append(news)
+    if batch:
+        backend.update(index, batch)
+        count += len(batch)
+    return count, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    """
+    多进程重建新闻搜索索引
+    # 按主键范围切分成多个任务，子进程各自查询、渲染text模板、提交给搜索引擎
+    python manage.py reindex_news --workers 4
+    python manage.py reindex_news --since 2019-07-01     # 只更新这个时间以后修改过的新闻
+    """
+    help = '多进程重建新闻搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='子进程数')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='每次提交给搜索引擎的条数')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每个任务负责的主键范围大小')
+        parser.add_argument('--since', default=None, help='只更新update_time在这个时间以后的新闻，格式 2019-07-01 或 2019-07-01 12:00:00')
+        parser.add_argument('--using', default='default', help='haystack连接名')
+
+    def handle(self, *args, **options):
+        since = self.parse_since(options['since'])
+        using = options['using']
+        index = _get_index(using)
+        bounds = _get_queryset(index, using, since).aggregate(start=Min('pk'), end=Max('pk'))
+        if bounds['start'] is None:
+            self.stdout.write('没有需要更新索引的新闻')
+            return
+
+        chunk_size = options['chunk_size']
+        ranges = [(start, min(start + chunk_size, bounds['end'] + 1))
+                  for start in range(bounds['start'], bounds['end'] + 1, chunk_size)]
+        self.stdout.write(f'主键范围{bounds["start"]}-{bounds["end"]}，共{len(ranges)}个任务，{options["workers"]}个子进程')
+
+        begin = time.perf_counter()
+        total = 0
+        peak_rss = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker) as executor:
+            futures = [executor.submit(_index_range, using, start, end, since, options['batch_size']) for start, end in ranges]
+            for future in as_completed(futures):
+                count, rss = future.result()
+                total += count
+                peak_rss = max(peak_rss, rss)
+
+        # 索引变了，缓存的搜索结果失效
+        search_cache.invalidate()
+        elapsed = time.perf_counter() - begin
+        parent_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(self.style.SUCCESS(
+            f'索引更新完成，共{total}条，耗时{elapsed:.1f}秒，{total / elapsed:.1f} 条/秒，'
+            f'子进程峰值内存{peak_rss / 1024:.1f}MB，主进程峰值内存{parent_rss / 1024:.1f}MB'
+        ))
+
+    @staticmethod
+    def parse_since(value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f'--since格式不正确：{value}')
+            since = datetime.combine(date, dt_time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
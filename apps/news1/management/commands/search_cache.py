@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from news1 import search_cache
+from news1 import snapshots
+
+
+class Command(BaseCommand):
+    """
+    查看搜索结果缓存的命中率，以及没有搜索内容时显示的热门新闻列表占用的内存
+    python manage.py search_cache               # 输出统计数据
+    python manage.py search_cache --reset       # 清空统计数据
+    python manage.py search_cache --invalidate  # 让所有缓存的搜索结果失效
+    """
+    help = '查看搜索结果缓存的命中率'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='清空统计数据')
+        parser.add_argument('--invalidate', action='store_true', help='让所有缓存的搜索结果失效')
+
+    def handle(self, *args, **options):
+        if options['invalidate']:
+            search_cache.invalidate()
+            self.stdout.write(self.style.SUCCESS('缓存的搜索结果已失效'))
+
+        for key, value in sorted(search_cache.stats().items()):
+            self.stdout.write(f'{key}: {value}')
+        for key, value in sorted(snapshots.hot_news_summaries_stats().items()):
+            self.stdout.write(f'hot_news_{key}: {value}')
+
+        if options['reset']:
+            search_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('统计数据已清空'))
@@ -5,6 +5,11 @@ from django.db import models
 from utils.models import ModelBase
 # Create your models here.
 
+# 评论时间显示用的时区，只创建一次
+SHANGHAI_TZ = pytz.timezone('Asia/Shanghai')
+# 评论时间的显示格式
+COMMENT_TIME_FORMAT = '%Y年%m月%d日 %H:%M'
+
 
 class Tag(ModelBase):
     """
@@ -44,6 +49,11 @@ class News(ModelBase):
 
     class Meta:
         ordering = ['-update_time', '-id']
+        # 游标分页按(update_time, id)定位，加上联合索引
+        indexes = [
+            models.Index(fields=['update_time', 'id']),
+            models.Index(fields=['tag', 'update_time', 'id']),
+        ]
         db_table = "tb_news"  # 指明数据库表名
         verbose_name = "新闻"  # 在admin站点中显示的名称
         verbose_name_plural = verbose_name  # 显示的复数名称
@@ -73,8 +83,7 @@ class Comments(ModelBase):
         """
         :return:
         """
-        shanghai_tz = pytz.timezone('Asia/Shanghai')
-        update_time_local = shanghai_tz.normalize(self.update_time)
+        update_time_local = SHANGHAI_TZ.normalize(self.update_time)
         # 模型返回数据，常用方法之一
         return {
             'news_id': self.news.id,
@@ -82,7 +91,7 @@ class Comments(ModelBase):
             'content': self.content,
             'author': self.author.username,
             # 'update_time': self.update_time.strftime('%Y年%m月%d日 %H:%M'),
-            'update_time': update_time_local.strftime('%Y年%m月%d日 %H:%M'),
+            'update_time': update_time_local.strftime(COMMENT_TIME_FORMAT),
             # 这个意思是，如果parent存在，就有父评论，则调用父评论的的to_comment_dict
             # 父评论的to_comment_dict返回父标题的字段，父标题没有parent，则parent=None
             'parent': self.parent.to_comment_dict() if self.parent else None,
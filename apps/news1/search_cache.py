@@ -0,0 +1,110 @@
+import re
+import hashlib
+import logging
+import unicodedata
+
+from django_redis import get_redis_connection
+
+from . import contants
+from utils.fragment_cache import CACHE_ALIAS, cached_fragment, bump_version
+
+logger = logging.getLogger('django')
+
+# 搜索结果缓存依赖的数据名称，索引更新后版本号加1，旧的搜索结果自然失效
+VERSION_NAME = 'search'
+# 统计数据 hits：命中缓存的次数 misses：查询搜索引擎的次数
+STATS_KEY = 'search:cache:stats'
+
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(query):
+    """
+    规范化搜索内容，写法不同、意思相同的搜索共用一份结果
+    # 全角转半角（ｐｙｔｈｏｎ、全角空格），英文转小写，多个空白合成一个空格
+    """
+    return SPACE_RE.sub(' ', unicodedata.normalize('NFKC', query or '')).strip().lower()
+
+
+def _record(name):
+    try:
+        get_redis_connection(alias=CACHE_ALIAS).hincrby(STATS_KEY, name, 1)
+    except Exception as e:
+        logger.error(f'记录搜索缓存统计出错：{e}')
+
+
+class SearchHit(object):
+    """
+    一条搜索结果，属性和haystack的SearchResult一样，模板不用改
+    """
+    def __init__(self, news):
+        self.object = news
+        self.id = news.id
+        self.title = news.title
+        self.digest = news.digest
+
+
+class PageList(object):
+    """
+    给Paginator用的列表，长度是搜索结果总条数，切片时返回已经取出的这一页
+    """
+    def __init__(self, hits, start, results):
+        self.hits = hits
+        self.start = start
+        self.results = results
+
+    def __len__(self):
+        return self.hits
+
+    def __getitem__(self, index):
+        return self.results[index.start - self.start:index.stop - self.start]
+
+
+def get_page(query, page, per_page, search):
+    """
+    取一页搜索结果，只缓存这一页的新闻id和总条数
+    # key由规范化后的搜索内容、每页条数、页码和索引版本号组成
+    :param query: 规范化后的搜索内容
+    :param page: 页码，从1开始
+    :param per_page: 每页条数
+    :param search: 没有缓存时调用 search(start, end)，返回 (总条数, [新闻id, ...])
+    :return: (总条数, [新闻id, ...])
+    """
+    start = (page - 1) * per_page
+    built = []
+
+    def build():
+        built.append(True)
+        return search(start, start + per_page)
+
+    digest = hashlib.md5(query.encode('utf8')).hexdigest()
+    result = cached_fragment(f'search:{digest}:{per_page}:{page}', [VERSION_NAME], build,
+                             contants.SEARCH_CACHE_TIMEOUT)
+    _record('misses' if built else 'hits')
+    return result
+
+
+def invalidate():
+    """
+    搜索索引更新后调用，让所有缓存的搜索结果失效
+    """
+    try:
+        bump_version(VERSION_NAME)
+    except Exception as e:
+        logger.error(f'更新搜索缓存版本号出错：{e}')
+
+
+def stats():
+    """
+    :return: hits：命中缓存次数 misses：查询搜索引擎次数 hit_rate：命中率
+    """
+    values = get_redis_connection(alias=CACHE_ALIAS).hgetall(STATS_KEY)
+    result = {'hits': 0, 'misses': 0}
+    result.update({key.decode('utf8'): int(value) for key, value in values.items()})
+    total = result['hits'] + result['misses']
+    result['hit_rate'] = round(result['hits'] / total, 4) if total else 0
+    return result
+
+
+def reset_stats():
+    get_redis_connection(alias=CACHE_ALIAS).delete(STATS_KEY)
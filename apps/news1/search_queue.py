@@ -0,0 +1,112 @@
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import models, transaction
+from django_redis import get_redis_connection
+from haystack import connections
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+from haystack.utils import get_identifier
+
+from . import search_cache
+
+logger = logging.getLogger('django')
+
+# 等待更新索引的数据，member为 "连接名:app_label.model_name.pk"，集合自动去重，同一条数据改多次只更新一次
+PENDING_KEY = 'news:search:pending'
+
+# 每次最多处理的条数
+BATCH_SIZE = 500
+
+
+def get_connection():
+    return get_redis_connection(alias='news')
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    模型保存、删除时不直接更新搜索引擎，只把数据id记到redis中
+    # 由process_search_queue命令批量更新，后台保存新闻时不用等搜索引擎返回
+    # settings中 HAYSTACK_SIGNAL_PROCESSOR = 'news1.search_queue.QueuedSignalProcessor'
+    """
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def enqueue(self, sender, instance):
+        """
+        有索引的模型才记录，等事务提交以后再写redis，redis出错记录日志，之后可以用update_index命令重建
+        """
+        members = []
+        for using in self.connection_router.for_write(instance=instance):
+            try:
+                self.connections[using].get_unified_index().get_index(sender)
+            except NotHandled:
+                continue
+            members.append(f'{using}:{get_identifier(instance)}')
+        if not members:
+            return
+
+        def push():
+            try:
+                get_connection().sadd(PENDING_KEY, *members)
+            except Exception as e:
+                logger.error(f'记录待更新索引的数据出错：{members} {e}')
+
+        transaction.on_commit(push)
+
+    def handle_save(self, sender, instance, **kwargs):
+        self.enqueue(sender, instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        self.enqueue(sender, instance)
+
+
+def flush(batch_size=BATCH_SIZE):
+    """
+    取出一批待更新的数据，按模型分组，每组查一次数据库、调一次搜索引擎的批量更新
+    # index_queryset中查不到的（被删除、逻辑删除或者不需要建索引的）从索引中删除
+    # 搜索引擎出错时把这一批放回集合，下次再试
+    # 更新完让缓存的搜索结果失效
+    :param batch_size: 最多处理的条数
+    :return: 处理的条数
+    """
+    con = get_connection()
+    members = con.spop(PENDING_KEY, batch_size)
+    if not members:
+        return 0
+
+    groups = defaultdict(list)
+    for member in members:
+        using, identifier = member.decode('utf8').split(':', 1)
+        app_label, model_name, pk = identifier.split('.', 2)
+        groups[(using, app_label, model_name)].append(pk)
+
+    try:
+        for (using, app_label, model_name), pks in groups.items():
+            model = apps.get_model(app_label, model_name)
+            index = connections[using].get_unified_index().get_index(model)
+            backend = connections[using].get_backend()
+
+            objs = list(index.index_queryset(using=using).filter(pk__in=pks))
+            if objs:
+                backend.update(index, objs)
+            found = {str(obj.pk) for obj in objs}
+            for pk in pks:
+                if pk not in found:
+                    backend.remove(f'{app_label}.{model_name}.{pk}')
+    except Exception:
+        con.sadd(PENDING_KEY, *members)
+        raise
+    # 索引变了，缓存的搜索结果失效
+    search_cache.invalidate()
+    return len(members)
+
+
+def pending_count():
+    return get_connection().scard(PENDING_KEY)
@@ -0,0 +1,128 @@
+import logging
+
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from . import models
+from . import comments
+from . import feed_index
+from . import snapshots
+from utils.fragment_cache import bump_version
+
+logger = logging.getLogger('django')
+
+# 模型改变后需要重新生成的快照
+SNAPSHOT_KEYS = {
+    models.Banner: [snapshots.BANNER_SNAPSHOT_KEY],
+    models.HotNews: [snapshots.HOTNEWS_SNAPSHOT_KEY, snapshots.HOTNEWS_LIST_SNAPSHOT_KEY],
+    models.News: [snapshots.BANNER_SNAPSHOT_KEY, snapshots.HOTNEWS_SNAPSHOT_KEY, snapshots.HOTNEWS_LIST_SNAPSHOT_KEY],
+    models.Tag: [snapshots.HOTNEWS_LIST_SNAPSHOT_KEY],
+}
+
+# 模型对应的缓存版本名称，数据改变时版本号加1，依赖它的缓存就会失效
+CACHE_VERSION_NAMES = {
+    models.Tag: 'tag',
+    models.HotNews: 'hotnews',
+    models.Banner: 'banner',
+    models.News: 'news',
+}
+
+
+def _sync_feed_index(news_id, tag_id, update_time, is_delete):
+    """
+    同步新闻列表索引，redis出错不能影响保存，记录日志，之后可以用rebuild_feed_index命令重建
+    """
+    try:
+        if is_delete:
+            feed_index.remove_news(news_id)
+        else:
+            feed_index.add_news(news_id, tag_id, update_time)
+    except Exception as e:
+        logger.error(f'更新新闻列表索引出错：news_id={news_id} {e}')
+
+
+@receiver(post_save, sender=models.News)
+def news_saved(sender, instance, **kwargs):
+    """
+    新闻保存（包括逻辑删除）后更新新闻列表索引
+    # 等事务提交以后再更新，避免索引里出现回滚掉的数据
+    """
+    # 逻辑删除的时候只查了id，不需要再去取tag_id
+    tag_id = None if instance.is_delete else instance.tag_id
+    transaction.on_commit(lambda: _sync_feed_index(instance.id, tag_id, instance.update_time, instance.is_delete))
+
+
+@receiver(post_delete, sender=models.News)
+def news_deleted(sender, instance, **kwargs):
+    """
+    新闻物理删除后从新闻列表索引中移除
+    """
+    transaction.on_commit(lambda: _sync_feed_index(instance.id, None, None, True))
+
+
+@receiver(post_save, sender=models.Comments)
+def comment_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    新增评论评论数加1，逻辑删除评论数减1
+    # 逻辑删除和其他地方一样用save(update_fields=['is_delete', 'update_time'])
+    """
+    if created and not instance.is_delete:
+        amount = 1
+    elif not created and instance.is_delete and update_fields and 'is_delete' in update_fields:
+        amount = -1
+    else:
+        return
+    news_id = instance.news_id
+    transaction.on_commit(lambda: comments.incr_comment_count(news_id, amount))
+
+
+@receiver(post_delete, sender=models.Comments)
+def comment_deleted(sender, instance, **kwargs):
+    """
+    物理删除未删除的评论，评论数减1
+    """
+    if not instance.is_delete:
+        news_id = instance.news_id
+        transaction.on_commit(lambda: comments.incr_comment_count(news_id, -1))
+
+
+def _build_snapshots(keys):
+    for key in keys:
+        try:
+            snapshots.build_snapshot(key)
+        except Exception as e:
+            logger.error(f'生成快照{key}出错：{e}')
+
+
+def rebuild_snapshots(sender, **kwargs):
+    """
+    轮播图、热门新闻、新闻、标签改变后重新生成对应的快照
+    """
+    keys = SNAPSHOT_KEYS[sender]
+    transaction.on_commit(lambda: _build_snapshots(keys))
+
+
+def _bump_version(name):
+    try:
+        bump_version(name)
+    except Exception as e:
+        logger.error(f'更新缓存版本{name}出错：{e}')
+
+
+def bump_cache_version(sender, **kwargs):
+    """
+    标签、热门新闻、轮播图、新闻保存（包括逻辑删除）或删除后，对应的缓存版本号加1
+    """
+    name = CACHE_VERSION_NAMES[sender]
+    transaction.on_commit(lambda: _bump_version(name))
+
+
+# 先重新生成快照再更新版本号，on_commit按注册顺序执行，版本号变了以后读到的一定是新快照
+for model in SNAPSHOT_KEYS:
+    post_save.connect(rebuild_snapshots, sender=model)
+    post_delete.connect(rebuild_snapshots, sender=model)
+
+for model in CACHE_VERSION_NAMES:
+    post_save.connect(bump_cache_version, sender=model)
+    post_delete.connect(bump_cache_version, sender=model)
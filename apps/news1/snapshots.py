@@ -0,0 +1,211 @@
+import sys
+import json
+import logging
+from collections import namedtuple
+
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from . import models
+from . import clicks
+from . import contants
+from utils.json_func import dumps, to_json_data
+from utils.fragment_cache import get_versions
+
+logger = logging.getLogger('django')
+
+# 轮播图、热门新闻接口中data部分序列化好的json bytes
+BANNER_SNAPSHOT_KEY = 'news:snapshot:banners'
+HOTNEWS_SNAPSHOT_KEY = 'news:snapshot:hotnews'
+# 搜索页没有搜索内容时显示的热门新闻列表
+HOTNEWS_LIST_SNAPSHOT_KEY = 'news:snapshot:hotnews_list'
+
+# 搜索页热门新闻列表中的一条，只有列表中显示的字段，不包含content
+HotNewsSummary = namedtuple('HotNewsSummary', ['news_id', 'title', 'digest', 'image_url', 'tag_name', 'author', 'update_time'])
+# 搜索页热门新闻列表依赖的数据，版本号变了进程内缓存的列表重新从快照中读取
+HOTNEWS_LIST_DEPENDS = ['hotnews', 'news', 'clicks', 'tag']
+# 进程内缓存的搜索页热门新闻列表 (依赖数据的版本号, 列表, 统计数据)
+_hot_news_summaries = None
+
+
+def get_connection():
+    return get_redis_connection(alias='news')
+
+
+def get_banner_list():
+    """
+    轮播图数据，用values()查询，不实例化模型
+    :return:
+    """
+    banner_rows = models.Banner.objects.filter(is_delete=False).order_by('priority').values('image_url', 'news_id', 'news__title')[0:contants.SHOW_BANNER_COUNT]
+    return [{
+        'image_url': row['image_url'],
+        'news_id': row['news_id'],
+        'news_title': row['news__title'],
+    } for row in banner_rows]
+
+
+def get_hot_news_list():
+    """
+    热门新闻数据，按优先级、最新点击量排序
+    :return:
+    """
+    hot_rows = rank_hot_rows(models.HotNews.objects.filter(is_delete=False).values('priority', 'news_id', 'news__title', 'news__image_url', 'news__clicks'))
+    return [{
+        'news_id': row['news_id'],
+        'title': row['news__title'],
+        'image_url': row['news__image_url'],
+    } for row in hot_rows[0:contants.SHOW_HOTNEWS_COUNT]]
+
+
+def rank_hot_rows(hot_rows):
+    """
+    热门新闻按优先级、最新点击量排序
+    :param hot_rows: values()查询集，需要查出priority、news_id、news__clicks
+    :return: 排好序的列表
+    """
+    hot_rows = list(hot_rows)
+    pending = clicks.get_pending_clicks(row['news_id'] for row in hot_rows)
+    hot_rows.sort(key=lambda row: (row['priority'], -(row['news__clicks'] + pending.get(row['news_id'], 0))))
+    return hot_rows
+
+
+def get_hot_news_summary_list():
+    """
+    搜索页热门新闻列表数据，用values()关联查出标签名、作者名，不查content
+    # 每条是 [news_id, title, digest, image_url, tag_name, author, update_time]，用列表不用字典，快照更小
+    # 最多SEARCH_HOTNEWS_MAX_COUNT条，各字段的长度受模型max_length限制
+    :return:
+    """
+    hot_rows = rank_hot_rows(models.HotNews.objects.filter(is_delete=False).values(
+        'priority', 'update_time', 'news_id', 'news__title', 'news__digest', 'news__image_url', 'news__clicks',
+        'news__tag__name', 'news__author__username'))
+    return [[
+        row['news_id'],
+        row['news__title'],
+        row['news__digest'],
+        row['news__image_url'],
+        row['news__tag__name'],
+        row['news__author__username'],
+        row['update_time'],
+    ] for row in hot_rows[0:contants.SEARCH_HOTNEWS_MAX_COUNT]]
+
+
+def render_banner_snapshot():
+    return dumps({'banners': get_banner_list()})
+
+
+def render_hotnews_snapshot():
+    return dumps({'hot_news': get_hot_news_list()})
+
+
+def render_hotnews_list_snapshot():
+    """
+    序列化后超过SEARCH_HOTNEWS_MAX_BYTES时去掉排在后面的新闻，快照和进程内缓存的大小都有上限
+    """
+    items = get_hot_news_summary_list()
+    content = dumps(items)
+    while len(content) > contants.SEARCH_HOTNEWS_MAX_BYTES:
+        # 按平均每条的大小估算能保留的条数，至少去掉一条
+        keep = min(len(items) - 1, len(items) * contants.SEARCH_HOTNEWS_MAX_BYTES // len(content))
+        items = items[0:keep]
+        content = dumps(items)
+    return content
+
+
+# 快照key和生成快照内容的函数
+SNAPSHOT_RENDERERS = {
+    BANNER_SNAPSHOT_KEY: render_banner_snapshot,
+    HOTNEWS_SNAPSHOT_KEY: render_hotnews_snapshot,
+    HOTNEWS_LIST_SNAPSHOT_KEY: render_hotnews_list_snapshot,
+}
+
+
+def build_snapshot(key):
+    """
+    生成快照存到redis，数据改变时由信号调用
+    :param key: 快照key
+    :return: 快照内容
+    """
+    content = SNAPSHOT_RENDERERS[key]()
+    get_connection().set(key, content)
+    return content
+
+
+def get_snapshot(key):
+    """
+    读取快照，没有的时候生成一次，redis出错时直接生成不保存
+    :param key: 快照key
+    :return: json bytes
+    """
+    try:
+        content = get_connection().get(key)
+        return content if content is not None else build_snapshot(key)
+    except Exception as e:
+        logger.error(f'读取快照{key}出错：{e}')
+        return SNAPSHOT_RENDERERS[key]()
+
+
+def get_hot_news():
+    """
+    热门新闻列表，从快照中解析出来
+    :return:
+    """
+    return json.loads(get_snapshot(HOTNEWS_SNAPSHOT_KEY).decode('utf8'))['hot_news']
+
+
+def measure_size(items):
+    """
+    列表占用的内存字节数，包括列表本身、每条namedtuple和其中的字段
+    """
+    return sys.getsizeof(items) + sum(sys.getsizeof(item) + sum(sys.getsizeof(value) for value in item) for item in items)
+
+
+def get_hot_news_summaries():
+    """
+    搜索页热门新闻列表，解析好的列表缓存在进程内存中，每次请求只查一次版本号
+    # 热门新闻、新闻、标签改变或者点击量写入数据库后，先重新生成快照再更新版本号，版本号变了才重新读取快照
+    # redis出错时直接生成，不缓存
+    :return: [HotNewsSummary, ...]
+    """
+    global _hot_news_summaries
+    try:
+        versions = get_versions(*HOTNEWS_LIST_DEPENDS)
+    except Exception as e:
+        logger.error(f'读取热门新闻列表版本号出错：{e}')
+        versions = None
+    cached = _hot_news_summaries
+    if versions is not None and cached is not None and cached[0] == versions:
+        return cached[1]
+
+    content = get_snapshot(HOTNEWS_LIST_SNAPSHOT_KEY)
+    items = [HotNewsSummary(*item[0:6], update_time=parse_datetime(item[6]) if item[6] else None)
+             for item in json.loads(content.decode('utf8'))]
+    if versions is not None:
+        memory_bytes = measure_size(items)
+        _hot_news_summaries = (versions, items, {
+            'count': len(items),
+            'snapshot_bytes': len(content),
+            'memory_bytes': memory_bytes,
+            'bytes_per_item': memory_bytes // len(items) if items else 0,
+        })
+    return items
+
+
+def hot_news_summaries_stats():
+    """
+    当前进程缓存的搜索页热门新闻列表的大小
+    :return: count：条数 snapshot_bytes：快照字节数 memory_bytes：进程内占用的内存字节数 bytes_per_item：平均每条占用的内存
+    """
+    get_hot_news_summaries()
+    cached = _hot_news_summaries
+    return dict(cached[2]) if cached is not None else {}
+
+
+def snapshot_response(key):
+    """
+    直接把快照内容作为data返回，不查询数据库，也不重新序列化
+    :param key: 快照key
+    :return:
+    """
+    return to_json_data(data=get_snapshot(key))
@@ -2,45 +2,60 @@ import json
 import logging
 
 from django.views import View
+from django.db.models import Q
 from django.http import Http404
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from haystack.views import SearchView as _SearchView
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import Paginator, EmptyPage, InvalidPage
 
 from mysite import settings
 from . import models
 from . import contants
-from .models import HotNews
+from . import clicks
+from . import comments
+from . import feed_index
+from . import snapshots
+from . import search_cache
+from .forms import NewsSearchForm
 from utils.json_func import to_json_data
+from utils.fragment_cache import cached_fragment, single_flight_cache_page
 from utils.res_code import Code, error_map
+from utils.paginator_script import encode_cursor, decode_cursor
 # Create your views here.
 
 logger = logging.getLogger('django')
 
 
-@method_decorator(cache_page(timeout=200, cache='page_cache'), name='dispatch')
 class IndexView(View):
     """
     新闻首页面动态显示标签和hot_news视图
     # 查询所有未删除的tags
     # 查询前三条热门新闻
     # 渲染到浏览器
+    # 标签和热门新闻渲染成html片段缓存起来，所有用户共用，页面外壳（登录状态、csrf）每次请求单独渲染
     """
 
     def get(self, request):
+        # 标签和热门新闻的html片段，数据变了版本号会变，就会重新生成
+        tags_html = cached_fragment('news_tags', ['tag'], self.render_tags, contants.FRAGMENT_CACHE_TIMEOUT)
+        hot_news_html = cached_fragment('news_hot_news', ['hotnews', 'news', 'clicks'], self.render_hot_news, contants.FRAGMENT_CACHE_TIMEOUT)
+        return render(request, 'news/index.html', locals())
+
+    @staticmethod
+    def render_tags():
         # 查询标签信息，渲染到前端
         tags = models.Tag.objects.only('name', 'id').filter(is_delete=False)
-        # 获取热门新闻的数据，渲染到前端，一个queryset，在前端遍历渲染
-        hot_news = models.HotNews.objects.select_related('news').only('news__title', 'news__image_url', 'news_id').filter(is_delete=False).order_by('priority', '-news__clicks')[0:contants.SHOW_HOTNEWS_COUNT]
-        # context = {
-        #     'tags': tags
-        # }
-        # locals()方法是python内置方法，将所有作用域内的属性传递到对应地方
-        return render(request, 'news/index.html', locals())
+        return render_to_string('news/fragments/tags.html', {'tags': tags})
 
+    @staticmethod
+    def render_hot_news():
+        # 获取热门新闻的数据，渲染到前端，数据来自热门新闻快照，不查询数据库
+        return render_to_string('news/fragments/hot_news.html', {'hot_news': snapshots.get_hot_news()})
 
+
+@method_decorator(single_flight_cache_page(timeout=contants.NEWS_LIST_CACHE_TIMEOUT, depends=['news', 'tag']), name='dispatch')
 class NewsListView(View):
     """
     返回数据列表 前端ajax请求
@@ -50,6 +65,7 @@ class NewsListView(View):
     # 查出所有新闻后，用django内置分页，生成每页数据
     # 获取传来的当前页page，如果没传则默认为第一页，如果超出索引则为最后一页。（有关url传参的按需求用try捕获一下，因为有可能不穿数据或者传递的格式错误）
     # 序列化要返回的数据（要把最后一页返回给前端，这样前端才会知道什么时候后台没数据了，前端js可以提示用户）
+    # 如果传了cursor参数（第一页传空字符串），就走游标分页，不统计总数，也不用OFFSET，翻多少页都一样快
     """
     def get(self, request):
         # 1、获取参数
@@ -64,6 +80,10 @@ class NewsListView(View):
             logger.error(f'接收tag_id错误：{e}')
             tag_id = 0
 
+        # 新版前端用游标分页，老版前端继续用页码分页
+        if 'cursor' in request.GET:
+            return self.get_by_cursor(request, tag_id)
+
         try:
             # page和tag_id一样
             page = int(request.GET.get('page', 1))
@@ -72,14 +92,20 @@ class NewsListView(View):
             logger.error(f'接收的页码page出错:{e}')
             page = 1
 
-        # 3、从数据库拿数据
+        # 3、先从redis的新闻列表索引中取出这一页的新闻id，总页数用ZCARD算，不需要COUNT(*)
+        page_ids = feed_index.get_page_ids(tag_id, page, contants.PER_PAGE_NEWS_NUM)
+        if page_ids is not None:
+            ids, total_pages, page = page_ids
+            data = {
+                'total_pages': total_pages,
+                'news': self.to_news_list(self.hydrate(ids))
+            }
+            return to_json_data(data=data)
+
+        # 4、索引不可用时从数据库拿数据
         # 字段 title, digest, image_url, update_time, id
         # 外键字段 tag__name, author__username # 有关联的字段才能取，用 表名小写__字段名
-        # select_related优化方法 提前将模型字段关联
-        news_queryset = models.News.objects.select_related('tag', 'author').only('title', 'digest', 'image_url', 'update_time', 'tag__name', 'author__username')
-        # 如果没传tag_id则代表是最新资讯，代表所有的资讯
-        news = news_queryset.filter(tag_id=tag_id, is_delete=False) or news_queryset.filter(is_delete=False)
-        # 4、分页
+        news = self.get_news_queryset(tag_id)
         # 用django内置分页方法，第一个参数传对象集合，第二个参数传一页多少条数据
         paginate = Paginator(news, contants.PER_PAGE_NEWS_NUM)
         try:
@@ -91,9 +117,90 @@ class NewsListView(View):
             new_info = paginate.page(paginate.num_pages)
 
         # 5、序列化要返回数据
+        # 将列表数据和总页数构建成字典
+        data = {
+            'total_pages': paginate.num_pages,
+            'news': self.to_news_list(new_info)
+        }
+
+        # 将json数据返回给ajax
+        return to_json_data(data=data)
+
+    def get_by_cursor(self, request, tag_id):
+        """
+        游标分页
+        # 游标里存的是上一页最后一条新闻的(update_time, id)，和News.Meta.ordering的排序一致
+        # 下一页就是排在它后面的数据，用索引直接定位，不需要COUNT(*)，也不需要OFFSET
+        # 多查一条，用来判断还有没有下一页
+        :param request:
+        :param tag_id: 标签id，为0或者标签下没有新闻时返回全部新闻
+        :return:
+        """
+        update_time, news_id = None, None
+        cursor = request.GET.get('cursor', '')
+        if cursor:
+            try:
+                update_time, news_id = decode_cursor(cursor)
+            except ValueError as e:
+                logger.error(f'接收的游标cursor出错:{e}')
+                return to_json_data(errno=Code.PARAMERR, errmsg=error_map[Code.PARAMERR])
+
+        # 先走redis的新闻列表索引，索引不可用再查数据库
+        cursor_ids = feed_index.get_cursor_ids(tag_id, update_time, news_id, contants.PER_PAGE_NEWS_NUM)
+        if cursor_ids is not None:
+            ids, has_more = cursor_ids
+            news_list = self.hydrate(ids)
+        else:
+            news_queryset = self.get_news_queryset(tag_id)
+            if update_time is not None:
+                # 排在游标后面的数据：更新时间更早，或者更新时间相同但id更小
+                news_queryset = news_queryset.filter(Q(update_time__lt=update_time) | Q(update_time=update_time, id__lt=news_id))
+            news_list = list(news_queryset[0:contants.PER_PAGE_NEWS_NUM + 1])
+            has_more = len(news_list) > contants.PER_PAGE_NEWS_NUM
+            news_list = news_list[0:contants.PER_PAGE_NEWS_NUM]
+
+        last_news = news_list[-1] if news_list else None
+        data = {
+            'next_cursor': encode_cursor(last_news.update_time, last_news.id) if has_more and last_news else None,
+            'news': self.to_news_list(news_list)
+        }
+        return to_json_data(data=data)
+
+    @staticmethod
+    def get_news_queryset(tag_id):
+        """
+        数据库中的新闻查询集，标签下没有新闻就返回全部新闻
+        # select_related优化方法 提前将模型字段关联
+        # 用exists判断标签下有没有新闻，只查一条，不会把整个查询集加载到内存
+        :param tag_id:
+        :return:
+        """
+        news_queryset = models.News.objects.select_related('tag', 'author').only('title', 'digest', 'image_url', 'update_time', 'tag__name', 'author__username').filter(is_delete=False).order_by('-update_time', '-id')
+        if tag_id and news_queryset.filter(tag_id=tag_id).exists():
+            news_queryset = news_queryset.filter(tag_id=tag_id)
+        return news_queryset
+
+    @staticmethod
+    def hydrate(ids):
+        """
+        用一条id__in查询取出这一页的新闻，按索引中的顺序返回
+        # 刚被删除、索引还没同步的新闻会被跳过
+        :param ids: 新闻id列表
+        :return:
+        """
+        news_dict = models.News.objects.select_related('tag', 'author').only('title', 'digest', 'image_url', 'update_time', 'tag__name', 'author__username').filter(is_delete=False).in_bulk(ids)
+        return [news_dict[i] for i in ids if i in news_dict]
+
+    @staticmethod
+    def to_news_list(news):
+        """
+        序列化新闻列表
+        :param news: 可迭代的新闻对象
+        :return:
+        """
         news_info_list = []
         # 循环每一个对象
-        for new in new_info:
+        for new in news:
             # 将每个对象的字段值构建成一个dict，将dict数据再添加到列表中生成列表字典数据，用于生成json数据
             news_info_list.append({
                 'news_id': new.id,
@@ -104,14 +211,7 @@ class NewsListView(View):
                 'tag_name': new.tag.name,
                 'author_username': new.author.username
             })
-        # 将列表数据和总页数构建成字典
-        data = {
-            'total_pages': paginate.num_pages,
-            'news': news_info_list
-        }
-
-        # 将json数据返回给ajax
-        return to_json_data(data=data)
+        return news_info_list
 
 
 class NewsBannerView(View):
@@ -123,25 +223,18 @@ class NewsBannerView(View):
     # 返回给ajax
     """
     def get(self, request):
-        # 查轮播图表，关联新闻表，取出新闻的id和title，注意轮播图有几条
-        # 并且用优先级进行排序，取出前六条
-        banner_list = models.Banner.objects.select_related('news').only('image_url', 'news_id', 'news__title').filter(is_delete=False).order_by('priority')[0:contants.SHOW_BANNER_COUNT]
-
-        # 序列化数据
-        news_info_list = []
-        for new in banner_list:
-            news_info_list.append({
-                "image_url": new.image_url,
-                "news_id": new.news.id,
-                "news_title": new.news.title
-            })
+        # 轮播图的json在数据改变时生成好存在redis中，直接返回，不查询数据库
+        return snapshots.snapshot_response(snapshots.BANNER_SNAPSHOT_KEY)
 
-        # 将构造好的数据发送给ajax
-        data = {
-            'banners': news_info_list
-        }
 
-        return to_json_data(data=data)
+class HotNewsView(View):
+    """
+    热门新闻视图，返回json数据
+    /news/hotnews/
+    # 和轮播图一样直接返回redis中的快照
+    """
+    def get(self, request):
+        return snapshots.snapshot_response(snapshots.HOTNEWS_SNAPSHOT_KEY)
 
 
 class NewsDetailView(View):
@@ -165,13 +258,13 @@ class NewsDetailView(View):
         detail = models.News.objects.select_related('author', 'tag').only('title', 'content', 'update_time', 'author__username', 'tag__name').filter(id=news_id, is_delete=False).first()
         # 如果查到就返回
         if detail:
-            # 查询出queryset对象集合
-            comments = models.Comments.objects.select_related('author', 'parent').only('author__username', 'parent__author__username', 'update_time', 'content', 'parent__content', 'parent__update_time').filter(is_delete=False, news_id=news_id)
-            comment_info_list = []
-            # 对queryset遍历
-            for comm in comments:
-                # 取出每一个对象，调用模型中的返回字段函数，序列化一个列表传给前端。（一种方法）
-                comment_info_list.append(comm.to_comment_dict())
+            # 点击量先记在redis中，由flush_clicks命令批量写入数据库
+            clicks.incr_click(detail.id)
+            # 页面中只放第一批评论，后面的由前端调用/news/<news_id>/comments/分批加载
+            comment_info_list, last = comments.get_comment_page(news_id, per_page=contants.PER_PAGE_COMMENTS_NUM)
+            next_cursor = encode_cursor(*last) if last else ''
+            # 评论数由信号增量维护，不用每次COUNT
+            comment_count = comments.get_comment_count(news_id)
             return render(request, 'news/news_detail.html', locals())
         # 查不到就抛出404
         else:
@@ -191,7 +284,32 @@ class NewsCommentView(View):
     # 查看有没有这条评论，并且news_id是当前新闻的news_id，parent_id是评论id
     # 如果查不出来就抛出异常
     # 如果查出来或者没有parent_id，就保存到数据库，save，ruturn保存成功
+    # get方法按游标分批返回评论，详情页滚动加载
     """
+    def get(self, request, news_id):
+        """
+        分批获取评论
+        # cursor为上一批返回的next_cursor，不传就是第一批
+        :param request:
+        :param news_id:
+        :return:
+        """
+        update_time, comment_id = None, None
+        cursor = request.GET.get('cursor', '')
+        if cursor:
+            try:
+                update_time, comment_id = decode_cursor(cursor)
+            except ValueError as e:
+                logger.error(f'接收的游标cursor出错:{e}')
+                return to_json_data(errno=Code.PARAMERR, errmsg=error_map[Code.PARAMERR])
+
+        comment_list, last = comments.get_comment_page(news_id, update_time, comment_id, contants.PER_PAGE_COMMENTS_NUM)
+        data = {
+            'next_cursor': encode_cursor(*last) if last else None,
+            'comments': comment_list
+        }
+        return to_json_data(data=data)
+
     # 需要验证新闻存不存在，评论是否为空，是否有父评论，
     def post(self, request, news_id):
 
@@ -251,9 +369,46 @@ class NewsSearchView(_SearchView):
     # 如果没传就返回热门新闻，进行分页
     # 获取page当前页，返回对应数据
     # 如果传了，就用haystack内置的方法create_response，里面返回了对应的数据，很全
+    # 搜索结果按 规范化后的搜索内容+页码 缓存这一页的新闻id和总条数，索引更新后版本号变化，缓存失效
     """
     template = 'news/search.html'
-    
+
+    def __init__(self, *args, **kwargs):
+        # 这一页的新闻在build_page中用一次查询取出，不需要haystack逐条加载
+        kwargs.setdefault('load_all', False)
+        kwargs.setdefault('form_class', NewsSearchForm)
+        super(NewsSearchView, self).__init__(*args, **kwargs)
+
+    def search_ids(self, start, end):
+        """
+        没有缓存时查询搜索引擎
+        :return: (总条数, [新闻id, ...])
+        """
+        results = self.results[start:end]
+        return self.results.count(), [int(result.pk) for result in results]
+
+    def build_page(self):
+        """
+        重写SearchView的build_page，先从缓存中取这一页的新闻id，再用一次数据库查询取出新闻
+        :return: (paginator, page)
+        """
+        try:
+            page_no = int(self.request.GET.get('page', 1))
+        except (TypeError, ValueError):
+            raise Http404('页码不正确')
+        if page_no < 1:
+            raise Http404('页码不正确')
+
+        hits, ids = search_cache.get_page(self.query, page_no, self.results_per_page, self.search_ids)
+        results = [search_cache.SearchHit(news) for news in NewsListView.hydrate(ids)]
+        start = (page_no - 1) * self.results_per_page
+        paginator = Paginator(search_cache.PageList(hits, start, results), self.results_per_page)
+        try:
+            page = paginator.page(page_no)
+        except InvalidPage:
+            raise Http404('页码不正确')
+        return paginator, page
+
     def create_response(self):
         """
         重写SearchView的create_response方法，如果没传参 就用自己写的逻辑
@@ -265,21 +420,12 @@ class NewsSearchView(_SearchView):
         if not kw:
             show_all = True
             # 如果没有就返回热门新闻
-            hot_news = HotNews.objects.select_related('news').only('news__title', 'news__image_url', 'news__content',  'news__digest', 'news__author').filter(is_delete=False).order_by('priority', '-news__clicks')
-            # 对查询到的queryset进行分页
+            # 热门新闻列表（已按优先级、点击量排好序，不含content）缓存在进程内存中，在内存中切片分页，不查数据库
+            hot_news = snapshots.get_hot_news_summaries()
             pagate = Paginator(hot_news, settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE)
-            try:
-                # 获取当前页  如果没传参就返回第一页
-                pg = self.request.GET.get('page', 1)
-                # 一定要异常捕获一下 因为有可能传来的不是数字str
-                page = pagate.page(int(pg))
-            except PageNotAnInteger:
-                # 如果不是字符型数字
-                # 就返回第一页
-                page = pagate.page(1)
-            except EmptyPage:
-                # 如果超出索引  就返回最后一页
-                page = pagate.page(pagate.num_pages)
+            # 获取当前页  如果没传参就返回第一页
+            # 不是数字就返回第一页，超出范围就返回最后一页
+            page = pagate.get_page(self.request.GET.get('page', 1))
             return render(self.request, self.template, locals())
         
         else:
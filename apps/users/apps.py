@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # 注册信号，用户保存、删除时同步更新redis中的用户名、手机号索引
+        from . import signals  # noqa
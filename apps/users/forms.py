@@ -6,6 +6,7 @@ from django.contrib.auth import login
 from django_redis import get_redis_connection
 
 from .models import Users
+from . import user_index
 from veriftions import constants
 from users import constants as const
 from utils.res_code import Code, error_map
@@ -41,7 +42,7 @@ class RegisterForm(forms.Form):
         :return:
         """
         username = self.cleaned_data.get('username')
-        if Users.objects.filter(username=username).exists():
+        if user_index.username_exists(username):
             raise forms.ValidationError('用户名已经存在')
 
         return username
@@ -57,7 +58,7 @@ class RegisterForm(forms.Form):
             raise forms.ValidationError('手机号码格式错误')
 
         # 验证手机号是否已注册
-        if Users.objects.filter(mobile=mobile).exists():
+        if user_index.mobile_exists(mobile):
             raise forms.ValidationError('手机号码已存在')
 
         return mobile
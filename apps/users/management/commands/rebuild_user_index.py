@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users import user_index
+
+
+class Command(BaseCommand):
+    """
+    从tb_users重建redis中的用户名、手机号索引
+    python manage.py rebuild_user_index
+    """
+    help = '从tb_users重建redis中的用户名、手机号索引'
+
+    def handle(self, *args, **options):
+        total = user_index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'用户索引重建完成，共{total}个用户'))
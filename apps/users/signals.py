@@ -0,0 +1,46 @@
+import logging
+
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from . import user_index
+from .models import Users
+
+logger = logging.getLogger('django')
+
+
+def _sync_user_index(username, mobile, is_delete):
+    """
+    同步用户名、手机号索引，redis出错不能影响保存，记录日志，之后可以用rebuild_user_index命令重建
+    # 加入索引失败时停用索引，重建前都查数据库
+    """
+    try:
+        if is_delete:
+            user_index.remove_user(username, mobile)
+        else:
+            user_index.add_user(username, mobile)
+    except Exception as e:
+        logger.error(f'更新用户索引出错：username={username} {e}')
+        if not is_delete:
+            # 没加进索引的用户会被判断成没有注册，去掉索引建好的标记，改为查数据库
+            try:
+                user_index.disable()
+            except Exception as e:
+                logger.error(f'停用用户索引出错，请执行rebuild_user_index：{e}')
+
+
+@receiver(post_save, sender=Users)
+def user_saved(sender, instance, **kwargs):
+    """
+    用户保存后加入索引，等事务提交以后再更新
+    """
+    transaction.on_commit(lambda: _sync_user_index(instance.username, instance.mobile, False))
+
+
+@receiver(post_delete, sender=Users)
+def user_deleted(sender, instance, **kwargs):
+    """
+    用户删除后从索引中移除
+    """
+    transaction.on_commit(lambda: _sync_user_index(instance.username, instance.mobile, True))
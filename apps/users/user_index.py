@@ -0,0 +1,157 @@
+import logging
+import unicodedata
+
+from django_redis import get_redis_connection
+
+from .models import Users
+
+logger = logging.getLogger('django')
+
+# 已注册的用户名、手机号集合
+USERNAMES_KEY = 'users:index:usernames'
+MOBILES_KEY = 'users:index:mobiles'
+# 索引是否已经建好的标记，没建好的时候直接查数据库
+INDEX_READY_KEY = 'users:index:ready'
+# 正在重建索引的标记，重建期间注册、删除的用户同时写入临时集合，rename后不会丢
+REBUILDING_KEY = 'users:index:rebuilding'
+# 重建中断时标记自动过期
+REBUILDING_EXPIRES = 60 * 60
+TMP_PREFIX = 'tmp:'
+
+# 字段对应的集合
+FIELD_KEYS = {
+    'username': USERNAMES_KEY,
+    'mobile': MOBILES_KEY,
+}
+
+# 重建索引时每批写入的条数
+REBUILD_BATCH_SIZE = 1000
+
+
+def get_connection():
+    return get_redis_connection(alias='users')
+
+
+# 同时写入正式集合，正在重建时再写入临时集合，判断和写入在一个脚本中完成
+# KEYS: 正式用户名集合 正式手机号集合 临时用户名集合 临时手机号集合 重建标记  ARGV: SADD或SREM 用户名 手机号
+SYNC_SCRIPT = """
+redis.call(ARGV[1], KEYS[1], ARGV[2])
+redis.call(ARGV[1], KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[5]) == 1 then
+    redis.call(ARGV[1], KEYS[3], ARGV[2])
+    redis.call(ARGV[1], KEYS[4], ARGV[3])
+end
+return 1
+"""
+
+
+# 重建完成，临时集合替换正式集合，去掉重建标记，和SYNC_SCRIPT不会交错执行
+# KEYS: 正式用户名集合 正式手机号集合 临时用户名集合 临时手机号集合 重建标记 建好的标记
+SWAP_SCRIPT = """
+for i = 1, 2 do
+    if redis.call('EXISTS', KEYS[i + 2]) == 1 then
+        redis.call('RENAME', KEYS[i + 2], KEYS[i])
+    else
+        redis.call('DEL', KEYS[i])
+    end
+end
+redis.call('DEL', KEYS[5])
+redis.call('SET', KEYS[6], 1)
+return 1
+"""
+
+
+def normalize(field, value):
+    """
+    集合中保存、查询用的值
+    # 用户名在MySQL中按默认排序规则比较，不区分大小写、忽略末尾空格和重音，这里按同样的规则转换，
+    # 否则集合中有alice时查Alice会判断为没有注册，注册时才在唯一索引上报错
+    """
+    value = str(value)
+    if field == 'username':
+        value = unicodedata.normalize('NFKD', value)
+        value = ''.join(char for char in value if not unicodedata.combining(char)).lower().rstrip(' ')
+    return value
+
+
+def _sync(command, username, mobile):
+    keys = [USERNAMES_KEY, MOBILES_KEY, TMP_PREFIX + USERNAMES_KEY, TMP_PREFIX + MOBILES_KEY, REBUILDING_KEY]
+    get_connection().eval(SYNC_SCRIPT, len(keys), *keys, command,
+                          normalize('username', username), normalize('mobile', mobile))
+
+
+def add_user(username, mobile):
+    """
+    用户保存后加入索引
+    # 改过用户名或手机号的，旧值还留在集合中，查询时会再查一次数据库，不会判断错
+    """
+    _sync('SADD', username, mobile)
+
+
+def remove_user(username, mobile):
+    """
+    用户删除后从索引中移除
+    """
+    _sync('SREM', username, mobile)
+
+
+def disable():
+    """
+    加入索引失败时调用，去掉建好的标记，之后都查数据库，直到用rebuild_user_index重建
+    # 集合中少了一个用户会把已注册的判断成没有注册，宁可多查数据库
+    """
+    get_connection().delete(INDEX_READY_KEY)
+
+
+def rebuild():
+    """
+    从tb_users重建索引，先写到临时key中，写完再rename
+    # 先设置重建标记再查询数据库，查询开始前提交的用户在查询结果中，之后提交的由add_user同时写入临时集合
+    :return: 写入的用户数
+    """
+    con = get_connection()
+    con.delete(TMP_PREFIX + USERNAMES_KEY, TMP_PREFIX + MOBILES_KEY)
+    con.set(REBUILDING_KEY, 1, ex=REBUILDING_EXPIRES)
+
+    total = 0
+    pi = con.pipeline(transaction=False)
+    for username, mobile in Users.objects.values_list('username', 'mobile').order_by().iterator():
+        pi.sadd(TMP_PREFIX + USERNAMES_KEY, normalize('username', username))
+        pi.sadd(TMP_PREFIX + MOBILES_KEY, normalize('mobile', mobile))
+        total += 1
+        if total % REBUILD_BATCH_SIZE == 0:
+            pi.execute()
+    pi.execute()
+
+    keys = [USERNAMES_KEY, MOBILES_KEY, TMP_PREFIX + USERNAMES_KEY, TMP_PREFIX + MOBILES_KEY, REBUILDING_KEY,
+            INDEX_READY_KEY]
+    con.eval(SWAP_SCRIPT, len(keys), *keys)
+    return total
+
+
+def exists(field, value):
+    """
+    判断用户名或手机号是否已经注册
+    # 索引中没有就一定没有注册，不查数据库；索引中有或者索引不可用时再查数据库确认
+    :param field: username 或 mobile
+    :param value:
+    :return: bool
+    """
+    try:
+        pi = get_connection().pipeline(transaction=False)
+        pi.exists(INDEX_READY_KEY)
+        pi.sismember(FIELD_KEYS[field], normalize(field, value))
+        ready, is_member = pi.execute()
+        if ready and not is_member:
+            return False
+    except Exception as e:
+        logger.error(f'读取用户索引出错：{e}')
+    return Users.objects.filter(**{field: value}).exists()
+
+
+def username_exists(username):
+    return exists('username', username)
+
+
+def mobile_exists(mobile):
+    return exists('mobile', mobile)
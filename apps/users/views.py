@@ -1,6 +1,8 @@
 import json
+import logging
 
 from django.views import View
+from django.db import IntegrityError
 from django.shortcuts import render, redirect, reverse
 from django.contrib.auth import login, logout
 
@@ -14,6 +16,8 @@ from .models import Users
 
 # Create your views here.
 
+logger = logging.getLogger('django')
+
 class LoginView(View):
     """
     用户登录
@@ -88,7 +92,12 @@ class RegisterView(View):
             password = forms.cleaned_data.get('password')
             mobile = forms.cleaned_data.get('mobile')
             # 存入数据库
-            user = Users.objects.create_user(username=username, password=password, mobile=mobile)
+            try:
+                user = Users.objects.create_user(username=username, password=password, mobile=mobile)
+            except IntegrityError as e:
+                # 用户名索引判断没有注册，但同时有人注册了同一个用户名或手机号，由数据库唯一索引兜底
+                logger.warning(f'注册时用户名或手机号重复：username={username} {e}')
+                return to_json_data(errno=Code.DATAEXIST, errmsg='用户名或手机号已经存在')
             # 使用django内置登录，会自动设置session 信息为用户名
             login(request, user)
             return to_json_data(errmsg='注册成功')
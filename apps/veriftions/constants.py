@@ -14,4 +14,25 @@ SEND_SMS_CODE_INTERVAL = 60
 SMS_CODE_TEMP_ID = 1
 
 # 短信验证码位数
-SMS_CODE_NUMS = 6
\ No newline at end of file
+SMS_CODE_NUMS = 6
+
+# 预先生成的图片验证码池容量
+CAPTCHA_POOL_SIZE = 500
+
+# 验证码池检查补充的间隔，单位秒
+CAPTCHA_POOL_INTERVAL = 1
+
+# 补充验证码池时生成验证码的子进程数，为0时在当前进程生成
+CAPTCHA_RENDER_PROCESSES = 4
+
+# 短信发送队列的发送线程数
+SMS_SEND_WORKERS = 4
+
+# 短信发送失败最多尝试的次数
+SMS_SEND_MAX_ATTEMPTS = 5
+
+# 短信发送失败重试的初始等待时间，每次失败翻倍，单位秒
+SMS_RETRY_BASE_DELAY = 2
+
+# 短信发送失败重试的最长等待时间，单位秒
+SMS_RETRY_MAX_DELAY = 60
@@ -1,13 +1,45 @@
+import random
+import string
+import logging
+
 from django import forms
 from django.core.validators import RegexValidator # 导入校验器
 from django_redis import get_redis_connection # 导入redis连接工具
 
 
-from users.models import Users
+from . import constants
+from users import user_index
+from utils.res_code import Code, error_map
+
+logger = logging.getLogger('django')
 
 # 正则表达式验证 手机号
 mobile_validator = RegexValidator(r"^1[3-9]\d{9}$", "手机号码格式不正确")
 
+# 发送短信验证码脚本的返回值
+SMS_CODE_SAVED = 0
+IMAGE_CODE_ERROR = 1
+SMS_FLAG_EXISTS = 2
+
+# KEYS: 图片验证码key 60秒发送标记key 短信验证码key
+# ARGV: 用户输入的图片验证码 短信验证码 发送间隔 短信验证码有效期
+# 图片验证码取出后就删除，只能用一次
+SEND_SMS_CODE_SCRIPT = """
+local real_image_code = redis.call('GET', KEYS[1])
+if real_image_code then
+    redis.call('DEL', KEYS[1])
+end
+if (not real_image_code) or real_image_code ~= ARGV[1] then
+    return 1
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 2
+end
+redis.call('SETEX', KEYS[2], ARGV[3], 1)
+redis.call('SETEX', KEYS[3], ARGV[4], ARGV[2])
+return 0
+"""
+
 
 class SmsCodeForm(forms.Form):
     """
@@ -34,6 +66,8 @@ class SmsCodeForm(forms.Form):
     def clean(self):
         """
         自定义多个验证  可以单个验证 def clean_字段名():
+        # 图片验证码校验、60秒发送标记校验、保存短信验证码在一个lua脚本中完成，只访问一次redis
+        # 脚本在redis中原子执行，并发的两个请求不会同时通过60秒的校验
         :return:
         """
         clean_data = super().clean()
@@ -41,34 +75,34 @@ class SmsCodeForm(forms.Form):
         mobile = clean_data.get('mobile')
         image_code_id = clean_data.get('image_code_id')
         text = clean_data.get('text')
+        # 字段本身没有通过验证，错误信息已经有了
+        if not (mobile and image_code_id and text):
+            return clean_data
 
         # 判断手机号存不存在
-        if Users.objects.filter(mobile=mobile).exists():
+        if user_index.mobile_exists(mobile):
             raise forms.ValidationError('手机号码已经存在')
 
-        # 连接到指定redis数据库
-        con = get_redis_connection(alias='verify_codes')
-        # 拼接uuid
-        img_key = f'img_{image_code_id}'
-
-        # 获取对应uuid的图片验证码文本信息
-        real_image_code_origin = con.get(img_key)
-        # # 从redis中取出来的数据是二进制数据，将二进制解码成字符串
-        # real_image_code = real_image_code_origin.decode('utf8')
+        # 生成六位数短信验证码 string.digits 字符型数字  random.choice 随机选择
+        sms_text = ''.join([random.choice(string.digits) for _ in range(constants.SMS_CODE_NUMS)])
 
-        # 用一个三目运算解决验证问题
-        real_image_code = real_image_code_origin.decode('utf8') if real_image_code_origin else None
-        # 将图片验证码取出来后存放在内存中 所以redis中就不需要了，释放内存，删除验证码
-        # con.delete(img_key)
+        try:
+            # 连接到指定redis数据库
+            con = get_redis_connection(alias='verify_codes')
+            result = con.register_script(SEND_SMS_CODE_SCRIPT)(
+                keys=[f'img_{image_code_id}', f'sms_flag_{mobile}', f'sms_{mobile}'],
+                args=[text, sms_text, constants.SEND_SMS_CODE_INTERVAL, constants.SMS_CODE_REDIS_EXPIRES],
+            )
+        except Exception as e:
+            logger.error(f'redis校验短信验证码出错：{e}')
+            raise forms.ValidationError(error_map[Code.UNKOWNERR])
 
-        if (not real_image_code) or (text != real_image_code):
+        if result == IMAGE_CODE_ERROR:
             raise forms.ValidationError('图片验证失败')
-
-        # 验证60秒 如果60s之内 不能发送
-        sms_flag_key = f'sms_flag_{mobile}'
-        # 获取验证码状态标签
-        sms_fmt = con.get(sms_flag_key)
-        # 如果有这个标签，则代表在60s之内，就把异常返回给后端
-        if sms_fmt:
+        # 如果有60秒的标签，就把异常返回给后端
+        if result == SMS_FLAG_EXISTS:
             raise forms.ValidationError('操作过于频繁，请60秒后发送')
 
+        # 短信验证码已经保存到redis，交给视图发送
+        clean_data['sms_text'] = sms_text
+        return clean_data
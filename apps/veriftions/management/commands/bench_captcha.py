@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils.captcha import renderer
+from utils.captcha.captcha import Captcha
+
+
+class Command(BaseCommand):
+    """
+    生成图片验证码的速度，对比缓存字体字形前后，以及多进程生成
+    python manage.py bench_captcha --number 200 --processes 1 2 4
+    """
+    help = '生成图片验证码的速度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=200, help='每种情况生成的个数')
+        parser.add_argument('--processes', type=int, nargs='*', default=[], help='多进程生成时的子进程数')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        for cache_glyphs in (False, True):
+            captcha = Captcha()
+            captcha.cache_glyphs = cache_glyphs
+            # 预热一次，缓存的情况下第一次要加载字体
+            captcha.generate_captcha()
+            start = time.perf_counter()
+            for _ in range(number):
+                captcha.generate_captcha()
+            rate = number / (time.perf_counter() - start)
+            label = '缓存字体字形' if cache_glyphs else '不缓存'
+            self.stdout.write(f'单核{label}：{rate:.1f} 个/秒')
+
+        for workers in options['processes']:
+            # 预热，启动子进程、加载字体
+            renderer.render(workers * renderer.CHUNK_SIZE, workers)
+            start = time.perf_counter()
+            renderer.render(number, workers)
+            rate = number / (time.perf_counter() - start)
+            self.stdout.write(f'{workers}个子进程：{rate:.1f} 个/秒')
@@ -0,0 +1,77 @@
+import time
+import threading
+from urllib import request as urllib2
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from utils.yuntongxun.CCPRestSDK import REST
+from utils.yuntongxun.xml_to_json import xmltojson
+from veriftions.management.commands.ccp_stub_server import StubHandler
+
+SOFT_VERSION = '2013-12-26'
+
+
+class Command(BaseCommand):
+    """
+    在本地测试桩服务器上对比发送模板短信的速度
+    # urllib：每次请求新建连接、xml包体（原来的实现）；session：进程共用连接池、json包体
+    python manage.py bench_ccp --number 1000 --threads 1 8
+    """
+    help = '在本地测试桩服务器上对比发送模板短信的速度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=1000, help='每种情况发送的条数')
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 8], help='并发发送的线程数')
+        parser.add_argument('--port', type=int, default=18883, help='测试桩服务器端口')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        rest = REST('127.0.0.1', str(options['port']), SOFT_VERSION, 'http')
+        rest.setAccount('bench', 'bench')
+        rest.setAppId('bench')
+        url = f'http://127.0.0.1:{options["port"]}/{SOFT_VERSION}/Accounts/bench/SMS/TemplateSMS'
+
+        def send_urllib():
+            req = urllib2.Request(url, data=b'<?xml version="1.0" encoding="utf-8"?><SubAccount></SubAccount>')
+            req.add_header('Accept', 'application/xml')
+            req.add_header('Content-Type', 'application/xml;charset=utf-8')
+            res = urllib2.urlopen(req)
+            data = res.read()
+            res.close()
+            return xmltojson().main(data)
+
+        def send_session():
+            return rest.sendTemplateSMS('18866668888', ['123456', 5], 1)
+
+        self.stdout.write(f'{"方式":<10}{"线程":>6}{"条/秒":>10}{"p50 ms":>10}{"p99 ms":>10}{"失败":>6}')
+        try:
+            for threads in options['threads']:
+                for name, func in (('urllib', send_urllib), ('session', send_session)):
+                    rate, p50, p99, failed = self.run(func, options['number'], threads)
+                    self.stdout.write(f'{name:<10}{threads:>6}{rate:>10.1f}{p50:>10.2f}{p99:>10.2f}{failed:>6}')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def run(func, number, threads):
+        """
+        :return: (每秒条数, p50延迟毫秒, p99延迟毫秒, 失败条数)
+        """
+        def timed(_):
+            start = time.perf_counter()
+            result = func()
+            return (time.perf_counter() - start) * 1000, result.get('statusCode') == '000000'
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(timed, range(number)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _ in results)
+        failed = sum(1 for _, ok in results if not ok)
+        return number / elapsed, latencies[len(latencies) // 2], latencies[min(int(number * 0.99), number - 1)], failed
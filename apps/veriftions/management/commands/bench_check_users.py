@@ -0,0 +1,81 @@
+import time
+import uuid
+import random
+import threading
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+
+from users.models import Users
+
+
+class Command(BaseCommand):
+    """
+    压测用户名、手机号是否存在的接口，统计每秒请求数、延迟和每个请求的数据库查询数
+    # 注册时大部分请求查的都是没注册过的用户名、手机号，用--hit-ratio控制已注册的比例
+    python manage.py bench_check_users --threads 8 --requests 2000 --hit-ratio 0.1
+    """
+    help = '压测用户名、手机号是否存在的接口'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+        parser.add_argument('--requests', type=int, default=2000, help='每个接口的总请求数')
+        parser.add_argument('--hit-ratio', type=float, default=0.1, help='请求中已注册用户名、手机号的比例')
+
+    def handle(self, *args, **options):
+        users = list(Users.objects.values_list('username', 'mobile')[0:1000])
+        self.stdout.write(f'{"接口":<10}{"请求/秒":>10}{"p50 ms":>10}{"p99 ms":>10}{"查询/请求":>12}')
+        for name, make_url in (('usernames', self.username_url), ('mobiles', self.mobile_url)):
+            urls = [make_url(users, options['hit_ratio']) for _ in range(options['requests'])]
+            rate, p50, p99, queries = self.run(urls, options['threads'])
+            self.stdout.write(f'{name:<10}{rate:>10.1f}{p50:>10.2f}{p99:>10.2f}{queries:>12.2f}')
+
+    @staticmethod
+    def username_url(users, hit_ratio):
+        if users and random.random() < hit_ratio:
+            return f'/usernames/{random.choice(users)[0]}/'
+        return f'/usernames/u{uuid.uuid4().hex[0:12]}/'
+
+    @staticmethod
+    def mobile_url(users, hit_ratio):
+        if users and random.random() < hit_ratio:
+            return f'/mobiles/{random.choice(users)[1]}/'
+        return f'/mobiles/1{random.randint(3, 9)}{random.randint(0, 999999999):09d}/'
+
+    @staticmethod
+    def run(urls, threads):
+        """
+        多个线程平分请求
+        :return: (每秒请求数, p50延迟毫秒, p99延迟毫秒, 平均每个请求的数据库查询数)
+        """
+        latencies = []
+        query_counts = []
+        lock = threading.Lock()
+
+        def worker(part):
+            client = Client()
+            local_latencies = []
+            with CaptureQueriesContext(connection) as queries:
+                for url in part:
+                    start = time.perf_counter()
+                    client.get(url)
+                    local_latencies.append((time.perf_counter() - start) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                query_counts.append(len(queries))
+
+        workers = [threading.Thread(target=worker, args=(urls[i::threads],)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+        return len(urls) / elapsed, p50, p99, sum(query_counts) / len(urls)
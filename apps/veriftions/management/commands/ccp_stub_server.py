@@ -0,0 +1,68 @@
+import json
+import time
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+SUCCESS_XML = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Response><statusCode>000000</statusCode>'
+               b'<TemplateSMS><dateCreated>%s</dateCreated><smsMessageSid>%s</smsMessageSid></TemplateSMS></Response>')
+FAIL_XML = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Response><statusCode>160038</statusCode></Response>'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    模拟云通讯发送模板短信接口，按请求的Accept返回json或xml
+    """
+    protocol_version = 'HTTP/1.1'
+    fail_rate = 0
+    delay = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.delay:
+            time.sleep(self.delay)
+        success = random.random() >= self.fail_rate
+        now = time.strftime('%Y%m%d%H%M%S')
+        sid = '%032x' % random.getrandbits(128)
+
+        if 'json' in self.headers.get('Accept', ''):
+            data = {'statusCode': '000000', 'templateSMS': {'dateCreated': now, 'smsMessageSid': sid}} if success else {'statusCode': '160038'}
+            body = json.dumps(data).encode('utf8')
+            content_type = 'application/json;charset=utf-8'
+        else:
+            body = SUCCESS_XML % (now.encode(), sid.encode()) if success else FAIL_XML
+            content_type = 'application/xml;charset=utf-8'
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    """
+    启动一个模拟云通讯短信接口的http服务器，用来本地测试短信发送队列
+    # settings中配置 CCP_SERVER_PROTOCOL = 'http' CCP_SERVER_IP = '127.0.0.1' CCP_SERVER_PORT = 8883
+    python manage.py ccp_stub_server --port 8883 --fail-rate 0.2 --delay 0.1
+    """
+    help = '启动一个模拟云通讯短信接口的http服务器'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8883, help='监听端口')
+        parser.add_argument('--fail-rate', type=float, default=0, help='返回发送失败的比例')
+        parser.add_argument('--delay', type=float, default=0, help='每个请求的延迟，单位秒')
+
+    def handle(self, *args, **options):
+        StubHandler.fail_rate = options['fail_rate']
+        StubHandler.delay = options['delay']
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), StubHandler)
+        self.stdout.write(f'云通讯测试桩服务器启动：http://127.0.0.1:{options["port"]}/')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -0,0 +1,46 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+
+from veriftions import constants
+from utils.captcha import pool
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    预先生成图片验证码放到redis中，ImageCode视图直接取用
+    python manage.py fill_captcha_pool           # 常驻运行，池中不够就补充
+    python manage.py fill_captcha_pool --once    # 补满一次就退出
+    python manage.py fill_captcha_pool --stats   # 查看池中个数和补充速度
+    """
+    help = '预先生成图片验证码放到redis中'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=constants.CAPTCHA_POOL_SIZE, help='池的容量')
+        parser.add_argument('--processes', type=int, default=constants.CAPTCHA_RENDER_PROCESSES, help='生成验证码的子进程数，为0时在当前进程生成')
+        parser.add_argument('--interval', type=float, default=constants.CAPTCHA_POOL_INTERVAL, help='检查补充的间隔，单位秒')
+        parser.add_argument('--once', action='store_true', help='补满一次就退出')
+        parser.add_argument('--stats', action='store_true', help='输出统计数据后退出')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for key, value in sorted(pool.pool_stats().items()):
+                self.stdout.write(f'{key}: {value}')
+            return
+
+        if options['once']:
+            produced = pool.fill(options['size'], workers=options['processes'])
+            self.stdout.write(self.style.SUCCESS(f'验证码池补充完成，生成{produced}个'))
+            return
+
+        while True:
+            try:
+                produced = pool.fill(options['size'], workers=options['processes'])
+                if produced:
+                    logger.info(f'验证码池补充{produced}个')
+            except Exception as e:
+                logger.error(f'补充验证码池出错：{e}')
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from veriftions import constants
+from veriftions import sms_outbox
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    """
+    常驻运行，发送短信发送队列中的短信
+    python manage.py send_sms --workers 4
+    python manage.py send_sms --stats    # 查看队列中个数和发送统计
+    """
+    help = '发送短信发送队列中的短信'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=constants.SMS_SEND_WORKERS, help='同时发送的线程数')
+        parser.add_argument('--stats', action='store_true', help='输出统计数据后退出')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for key, value in sorted(sms_outbox.outbox_stats().items()):
+                self.stdout.write(f'{key}: {value}')
+            return
+
+        logger.info(f'短信发送队列启动，发送线程数：{options["workers"]}')
+        sms_outbox.run_worker(workers=options['workers'])
@@ -0,0 +1,181 @@
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django_redis import get_redis_connection
+
+from . import constants
+from utils.yuntongxun.sms import CCP
+
+logger = logging.getLogger('django')
+
+# 待发送的手机号队列
+QUEUE_KEY = 'sms:outbox:queue'
+# 每个手机号待发送的短信 {手机号: 短信json}，同一个手机号只保留最新的一条
+JOBS_KEY = 'sms:outbox:jobs'
+# 等待重试的短信，score为可以重试的时间戳
+RETRY_KEY = 'sms:outbox:retry'
+# 统计数据 enqueued：入队次数 merged：和未发送的短信合并的次数 sent：发送成功 retried：重试次数 dropped：多次失败放弃
+STATS_KEY = 'sms:outbox:stats'
+
+# KEYS: JOBS_KEY QUEUE_KEY
+# ARGV: 手机号 短信json 是否覆盖已有的短信
+# 手机号已经在队列中就只更新短信内容，不重复入队，同一个手机号不会同时发两条
+ENQUEUE_SCRIPT = """
+if ARGV[3] == '0' and redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+local is_new = redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if is_new == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+end
+return is_new
+"""
+
+# KEYS: JOBS_KEY
+# ARGV: 手机号
+# 取出短信并删除，之后同一个手机号再入队会重新进入队列
+TAKE_SCRIPT = """
+local job = redis.call('HGET', KEYS[1], ARGV[1])
+if job then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return job
+"""
+
+
+def get_connection():
+    return get_redis_connection(alias='sms_codes')
+
+
+def _enqueue(con, job, replace):
+    is_new = con.register_script(ENQUEUE_SCRIPT)(
+        keys=[JOBS_KEY, QUEUE_KEY],
+        args=[job['mobile'], json.dumps(job), 1 if replace else 0],
+    )
+    return bool(is_new)
+
+
+def enqueue(mobile, datas, temp_id):
+    """
+    把短信放入发送队列，由send_sms命令发送
+    :param mobile: 手机号
+    :param datas: 模板数据 ['短信验证码', 有效分钟数]
+    :param temp_id: 模板id
+    :return: 是否是新入队的，False表示和这个手机号还没发送的短信合并了
+    """
+    con = get_connection()
+    job = {'mobile': mobile, 'datas': datas, 'temp_id': temp_id, 'attempts': 0}
+    is_new = _enqueue(con, job, True)
+    con.hincrby(STATS_KEY, 'enqueued' if is_new else 'merged', 1)
+    return is_new
+
+
+def retry_delay(attempts):
+    """
+    第attempts次失败后等待多久重试，指数退避
+    :return: 秒
+    """
+    return min(constants.SMS_RETRY_BASE_DELAY * 2 ** (attempts - 1), constants.SMS_RETRY_MAX_DELAY)
+
+
+def requeue_due(con):
+    """
+    把到了重试时间的短信放回队列
+    # 这个手机号已经有新的短信在排队时，旧的就不用再发了
+    :return: 放回队列的个数
+    """
+    count = 0
+    for item in con.zrangebyscore(RETRY_KEY, '-inf', time.time()):
+        # 多个发送进程同时运行时，只有删除成功的那个放回队列
+        if con.zrem(RETRY_KEY, item):
+            _enqueue(con, json.loads(item.decode('utf8')), False)
+            count += 1
+    return count
+
+
+def send(job):
+    """
+    发送一条短信，失败的按指数退避放入重试集合，超过次数就放弃
+    :param job: 短信数据
+    :return: 是否发送成功
+    """
+    con = get_connection()
+    job['attempts'] += 1
+    try:
+        result = CCP().send_template_sms(job['mobile'], job['datas'], job['temp_id'])
+    except Exception as e:
+        logger.error(f'发送短信出错：mobile={job["mobile"]} {e}')
+        result = -1
+
+    if result == 0:
+        con.hincrby(STATS_KEY, 'sent', 1)
+        logger.info(f'发送短信成功：mobile={job["mobile"]} attempts={job["attempts"]}')
+        return True
+
+    if job['attempts'] >= constants.SMS_SEND_MAX_ATTEMPTS:
+        con.hincrby(STATS_KEY, 'dropped', 1)
+        logger.warning(f'发送短信失败，不再重试：mobile={job["mobile"]} attempts={job["attempts"]}')
+        return False
+
+    con.zadd(RETRY_KEY, {json.dumps(job): time.time() + retry_delay(job['attempts'])})
+    con.hincrby(STATS_KEY, 'retried', 1)
+    logger.warning(f'发送短信失败，稍后重试：mobile={job["mobile"]} attempts={job["attempts"]}')
+    return False
+
+
+def run_worker(workers=constants.SMS_SEND_WORKERS, poll_timeout=1, stop_event=None):
+    """
+    从队列中取出短信交给线程池发送，同时发送的短信不超过workers条
+    :param workers: 发送线程数
+    :param poll_timeout: 队列为空时阻塞等待的秒数，到时间检查一次重试集合
+    :param stop_event: threading.Event，设置后发完手上的短信就退出
+    :return:
+    """
+    con = get_connection()
+    slots = threading.BoundedSemaphore(workers)
+
+    def send_job(job):
+        try:
+            send(job)
+        except Exception as e:
+            logger.error(f'发送短信出错：{e}')
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while stop_event is None or not stop_event.is_set():
+            # 线程都在忙时先等待，不从队列中多取
+            slots.acquire()
+            job = None
+            try:
+                requeue_due(con)
+                item = con.brpop(QUEUE_KEY, timeout=poll_timeout)
+                if item is not None:
+                    job = con.register_script(TAKE_SCRIPT)(keys=[JOBS_KEY], args=[item[1]])
+            except Exception as e:
+                logger.error(f'读取短信发送队列出错：{e}')
+                time.sleep(poll_timeout)
+            if job is None:
+                slots.release()
+                continue
+            executor.submit(send_job, json.loads(job.decode('utf8')))
+
+
+def outbox_stats():
+    """
+    短信发送队列的统计数据
+    :return: queued：排队个数 retrying：等待重试个数，以及各项累计次数
+    """
+    pi = get_connection().pipeline(transaction=False)
+    pi.llen(QUEUE_KEY)
+    pi.zcard(RETRY_KEY)
+    pi.hgetall(STATS_KEY)
+    queued, retrying, stats = pi.execute()
+
+    result = {key.decode('utf8'): int(value) for key, value in stats.items()}
+    result['queued'] = queued
+    result['retrying'] = retrying
+    return result
@@ -1,18 +1,16 @@
 import json
-import random
-import string
 import logging
 
 from django.views import View
 from django.shortcuts import render
-from utils.captcha.captcha import captcha
+from utils.captcha import pool
 from django_redis import get_redis_connection
 from django.http import HttpResponse, JsonResponse
 
 from . import constants
-from users import models
+from users import user_index
+from . import sms_outbox
 from .forms import SmsCodeForm
-from utils.yuntongxun import sms
 from utils.json_func import to_json_data
 from utils.res_code import Code, error_map
 # Create your views here.
@@ -28,8 +26,8 @@ class CheckUsernameView(View):
     # 前端发送ajax请求，携带username参数，后台判断数据库中username存不存在
     """
     def get(self, request, username):
-        # 统计一下数据库中用户名个数验证是否唯一
-        count = models.Users.objects.filter(username=username).count()
+        # 先查redis中的用户名索引，索引中没有就一定没注册，不用查数据库
+        count = int(user_index.username_exists(username))
         data = {
             'count': count,
             'username': username
@@ -50,7 +48,7 @@ class CheckMobileView(View):
         :param mobile:
         :return:
         """
-        count = models.Users.objects.filter(mobile=mobile).count()
+        count = int(user_index.mobile_exists(mobile))
         data = {
             'count': count,
             'mobile': mobile
@@ -75,7 +73,8 @@ class ImageCode(View):
         :return:
         """
         # 用拆包的方式将验证码和验证图片拆分（‘SUMY’， b‘图片二进制数据’）
-        text, image = captcha.generate_captcha()
+        # 从预先生成好的验证码池中取，池空了才同步生成
+        text, image = pool.pop_captcha()
 
         # 连接redis数据库， 指定settings中用哪个redis库
         con_redis = get_redis_connection(alias='verify_codes')
@@ -94,11 +93,10 @@ class SmsCodeView(View):
     """
     验证发送短信验证码
     /sms_codes/
-    # 前端ajax传来数据，是json格式，转化为dict，用form内置表单验证，如果验证成功，自己生成六位数验证码
-    # 将验证码生成一个key，验证码当做value存放到redis中，生成一个验证码状态标记
-    # 连接redis，初始化管道pipeline，作用可以保存多个
+    # 前端ajax传来数据，是json格式，转化为dict，用form内置表单验证
+    # 表单验证时生成六位数验证码，和验证码状态标记一起用一个redis脚本保存
     # 保存验证码（验证码过期时间为五分钟）和状态标签（状态标签过期时间为60s）
-    # 然后就可以发送短息（这里成本原因，如果保存成功就代表验证成功，return成功）
+    # 然后放入短信发送队列就返回，由send_sms命令在后台发送，失败了会自动重试
     """
     def post(self, request):
         """
@@ -116,54 +114,18 @@ class SmsCodeView(View):
         # 填充form 用于验证
         forms = SmsCodeForm(data=dict_data)
         if forms.is_valid():
+            # 图片验证码、60秒标记的校验和短信验证码的保存已经在表单验证中用一个redis脚本完成
             mobile = forms.cleaned_data.get('mobile', '')
-            # 创建短信验证码内容
-            # 生成六位数短信验证码 string.digits() 生成字符型数字列表  random.choice 随机选择
-            sms_text = ''.join([random.choice(string.digits) for _ in range(constants.SMS_CODE_NUMS)])
-            logger.info(sms_text)
-
-            # 将短信信息保存到redis数据库
-            # 生成短信验证码的key
-            sms_key = f'sms_{mobile}'
-            # 生成短信状态的key 创建一个在60s以内是否有发送短信记录的标记
-            sms_flag_key = f'sms_flag_{mobile}'
-            # 连接redis
-            con = get_redis_connection(alias='verify_codes')
-            # 初始化管道，可以保存多个键值对
-            pi = con.pipeline()
-
-            # 有时候会保存失败 使用管道pipeline有时会发生异常
-            try:
-                # 储存key的时候可以encode().binascii.b2a_hex() 隐藏原始key
-                # 保存短信验证码和状态
-                pi.setex(sms_flag_key, constants.SEND_SMS_CODE_INTERVAL, 1)
-                pi.setex(sms_key, constants.SMS_CODE_REDIS_EXPIRES, sms_text)
-                # 执行保存命令
-                pi.execute()
-
-                # 保存成功默认发送成功 费用问题
-                logger.info(f"短信验证码：{sms_text}")
-                return to_json_data(errno=Code.OK, errmsg="短信验证码发送成功")
+            sms_text = forms.cleaned_data.get('sms_text')
 
+            logger.info(f"短信验证码：{sms_text}")
+            # 放入短信发送队列，由send_sms命令发送，不在请求中等待云通讯接口
+            try:
+                sms_outbox.enqueue(mobile, [sms_text, constants.SMS_CODE_REDIS_EXPIRES // 60], constants.SMS_CODE_TEMP_ID)
             except Exception as e:
-                logger.debug(f'redis_保存文件失败_{e}')
-                return to_json_data(errno=Code.UNKOWNERR, errmsg=error_map[Code.UNKOWNERR])
-
-
-            # 发送短信验证码
-            # try:
-            #     result = sms.ccp.send_template_sms(mobile, [sms_text, 5], constants.SMS_CODE_TEMP_ID)
-            #     logger.info(f'发送成功_{mobile}')
-            # except Exception as e:
-            #     logger.error(f'发送验证码错误_error_msg_{e}')
-            #     return to_json_data(errno=Code.SMSERROR, errmsg=error_map[Code.SMSERROR])
-            # else:
-            #     if result == 0:
-            #         logger.info("发送验证码短信[正常][ mobile: %s sms_code: %s]" % (mobile, sms_text))
-            #         return to_json_data(errno=Code.OK, errmsg="短信验证码发送成功")
-            #     else:
-            #         logger.warning("发送验证码短信[失败][ mobile: %s ]" % mobile)
-            #         return to_json_data(errno=Code.SMSFAIL, errmsg=error_map[Code.SMSFAIL])
+                logger.error(f'短信放入发送队列失败_{mobile}_{e}')
+                return to_json_data(errno=Code.SMSERROR, errmsg=error_map[Code.SMSERROR])
+            return to_json_data(errno=Code.OK, errmsg="短信验证码发送成功")
 
         else:
             error_msg = []
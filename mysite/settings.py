@@ -147,6 +147,30 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
     },
+    # 存放新闻列表索引
+    "news": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/4",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
+    # 存放用户名、手机号索引
+    "users": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/5",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
+    # 存放文档下载缓存的统计数据
+    "doc": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/7",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
     "page_cache": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": "redis://127.0.0.1:6379/6",
@@ -277,12 +301,19 @@ HAYSTACK_CONNECTIONS = {
         'URL': 'http://127.0.0.1:8002/',  # 此处为elasticsearch运行的服务器ip地址，端口号默认为9200
         'INDEX_NAME': 'mysite',  # 指定elasticsearch建立的索引库的名称
     },
+    # 不依赖elasticsearch的本地搜索引擎，小规模部署或者测试时可以把它改成default
+    # 建立索引：python manage.py reindex_news --using local
+    'local': {
+        'ENGINE': 'utils.local_search.backend.LocalSearchEngine',
+        'PATH': os.path.join(BASE_DIR, 'search_index'),  # 索引文件保存的目录
+        'STORED_FIELDS': ['id', 'title', 'digest', 'image_url'],  # 搜索结果页用到的字段，content不保存
+    },
 }
 
 # 设置每页显示的数据量
 HAYSTACK_SEARCH_RESULTS_PER_PAGE = 5
-# 当数据库改变时，会自动更新索引
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+# 当数据库改变时，把改变的数据记到redis中，由process_search_queue命令批量更新索引
+HAYSTACK_SIGNAL_PROCESSOR = 'news1.search_queue.QueuedSignalProcessor'
 
 # 根路由
 SITE_DOMAIN_PORT = "http://192.168.35.133:9000/"
@@ -290,3 +321,23 @@ SITE_DOMAIN_PORT = "http://192.168.35.133:9000/"
 # fastdfs服务的站点
 FASTDFS_SERVER_DOMAIN = "http://192.168.35.133:8888/"
 
+# 文档下载的文件服务器地址（HTTP），文档路径（/media/xxx.pdf）拼在后面，stream方式下载时使用
+# 文档在nginx的/media中，填nginx的地址；不能填uwsgi的socket地址，socket不是HTTP协议
+DOC_FILE_ORIGIN = "http://192.168.35.133"
+# 文档下载方式 stream：uwsgi边读边返回  accel：返回X-Accel-Redirect，由nginx返回文件
+DOC_DOWNLOAD_MODE = 'stream'
+# X-Accel-Redirect的路径前缀，要和nginx中的internal location一致
+DOC_ACCEL_PREFIX = '/protected_doc/'
+# stream方式下载时，缓存文档的目录，不能放在nginx直接对外提供的目录（static、media）中，否则不经过下载视图就能访问
+DOC_CACHE_DIR = os.path.join(BASE_DIR, 'doc_cache')
+# 缓存的文档总大小上限，为0时不缓存
+DOC_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 天眼查爬虫的站点地址，本地测试时可以改成 crawl_fixture_server 命令启动的服务器
+SPIDER_BASE_URL = 'https://www.tianyancha.com'
+
+# 云通讯短信接口地址，本地测试时可以改成 ccp_stub_server 命令启动的测试桩服务器
+CCP_SERVER_PROTOCOL = 'https'
+CCP_SERVER_IP = 'sandboxapp.cloopen.com'
+CCP_SERVER_PORT = 8883
+
@@ -46,21 +46,21 @@ $(function () {
           <li class="comment-item">
             <div class="comment-info clearfix">
               <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
-              <span class="comment-user">${one_comment.author}</span>
+              <span class="comment-user">${escapeHtml(one_comment.author)}</span>
             </div>
-            <div class="comment-content">${one_comment.content}</div>
+            <div class="comment-content">${escapeHtml(one_comment.content)}</div>
 
                 <div class="parent_comment_text">
-                  <div class="parent_username">${one_comment.parent.author}</div>
+                  <div class="parent_username">${escapeHtml(one_comment.parent.author)}</div>
                   <br/>
                   <div class="parent_content_text">
-                    ${one_comment.parent.content}
+                    ${escapeHtml(one_comment.parent.content)}
                   </div>
                 </div>
 
-              <div class="comment_time left_float">${one_comment.update_time}</div>
+              <div class="comment_time left_float">${escapeHtml(one_comment.update_time)}</div>
               <a href="javascript:;" class="reply_a_tag right_float">回复</a>
-              <form class="reply_form left_float" comment-id="${one_comment.content_id}" news-id="${one_comment.news_id}">
+              <form class="reply_form left_float" comment-id="${escapeHtml(one_comment.content_id)}" news-id="${escapeHtml(one_comment.news_id)}">
                 <textarea class="reply_input"></textarea>
                 <input type="button" value="回复" class="reply_btn right_float">
                 <input type="reset" name="" value="取消" class="reply_cancel right_float">
@@ -151,13 +151,13 @@ $(function () {
           <li class="comment-item">
             <div class="comment-info clearfix">
               <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
-              <span class="comment-user">${one_comment.author}</span>
+              <span class="comment-user">${escapeHtml(one_comment.author)}</span>
             </div>
-            <div class="comment-content">${one_comment.content}</div>
+            <div class="comment-content">${escapeHtml(one_comment.content)}</div>
 
-              <div class="comment_time left_float">${one_comment.update_time}</div>
+              <div class="comment_time left_float">${escapeHtml(one_comment.update_time)}</div>
               <a href="javascript:;" class="reply_a_tag right_float">回复</a>
-              <form class="reply_form left_float" comment-id="${one_comment.content_id}" news-id="${one_comment.news_id}">
+              <form class="reply_form left_float" comment-id="${escapeHtml(one_comment.content_id)}" news-id="${escapeHtml(one_comment.news_id)}">
                 <textarea class="reply_input"></textarea>
                 <input type="button" value="回复" class="reply_btn right_float">
                 <input type="reset" name="" value="取消" class="reply_cancel right_float">
@@ -168,6 +168,7 @@ $(function () {
           $(".comment-list").prepend(html_comment);
           $this.prev().val('');   // 请空输入框
           // $this.parent().hide();  // 关闭评论框
+          $(".comment-count").text(parseInt($(".comment-count").text()) + 1);
 
         } else if (res.errno === "4101") {
           // 用户未登录
@@ -187,6 +188,73 @@ $(function () {
       });
   });
 
+  // 加载更多评论，页面中只渲染了第一批
+  $('.comment-contain').delegate('.comment-more', 'click', function () {
+    let $more = $(this);
+    let news_id = $more.attr('news-id');
+    $.ajax({
+      url: "/news/" + news_id + "/comments/",
+      type: "GET",
+      data: {"cursor": $more.attr('data-cursor')},
+      dataType: "json",
+    })
+      .done(function (res) {
+        if (res.errno === "0") {
+          res.data.comments.forEach(function (one_comment) {
+            let parent_html = ``;
+            if (one_comment.parent) {
+              parent_html = `
+              <div class="parent_comment_text">
+                <div class="parent_username">${escapeHtml(one_comment.parent.author)}</div>
+                <br/>
+                <div class="parent_content_text">
+                  ${escapeHtml(one_comment.parent.content)}
+                </div>
+              </div>`;
+            }
+            let html_comment = `
+          <li class="comment-item">
+            <div class="comment-info clearfix">
+              <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
+              <span class="comment-user">${escapeHtml(one_comment.author)}</span>
+            </div>
+            <div class="comment-content">${escapeHtml(one_comment.content)}</div>
+            ${parent_html}
+            <div class="comment_time left_float">${escapeHtml(one_comment.update_time)}</div>
+            <a href="javascript:;" class="reply_a_tag right_float">回复</a>
+            <form class="reply_form left_float" comment-id="${escapeHtml(one_comment.content_id)}" news-id="${escapeHtml(one_comment.news_id)}">
+              <textarea class="reply_input"></textarea>
+              <input type="button" value="回复" class="reply_btn right_float">
+              <input type="reset" name="" value="取消" class="reply_cancel right_float">
+            </form>
+          </li>`;
+            $(".comment-list").append(html_comment);
+          });
+          // 没有下一批就把按钮去掉
+          if (res.data.next_cursor) {
+            $more.attr('data-cursor', res.data.next_cursor);
+          } else {
+            $more.remove();
+          }
+        } else {
+          message.showError(res.errmsg);
+        }
+      })
+      .fail(function () {
+        message.showError('服务器超时，请重试！');
+      });
+  });
+
+  // 评论内容、用户名是用户输入的，拼进html之前先转义，防止XSS
+  function escapeHtml(value) {
+    return String(value === null || value === undefined ? '' : value)
+      .replace(/&/g, '&amp;')
+      .replace(/</g, '&lt;')
+      .replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;')
+      .replace(/'/g, '&#39;');
+  }
+
   // get cookie using jQuery
   function getCookie(name) {
     let cookieValue = null;
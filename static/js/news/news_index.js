@@ -1,8 +1,8 @@
 $(function () {
   // 新闻列表功能
   let $newsLi = $(".news-nav ul li");
-  let iPage = 1;  //默认第1页
-  let iTotalPage = 1; //默认总页数为1
+  let sCursor = '';  // 游标，空字符串表示第一页
+  let bHasMore = true; // 后台是否还有更多数据
   let sCurrentTagId = 0; //默认分类标签为0
   let bIsLoadData = true;   // 是否正在向后台加载数据
 
@@ -19,8 +19,8 @@ $(function () {
     if (sClickTagId !== sCurrentTagId) {
             sCurrentTagId = sClickTagId;  // 记录当前分类id
             // 重置分页参数
-            iPage = 1;
-            iTotalPage = 1;
+            sCursor = '';
+            bHasMore = true;
             fn_load_content()
         }
   });
@@ -43,9 +43,8 @@ $(function () {
       // 判断页数，去更新新闻数据
       if (!bIsLoadData) {
         bIsLoadData = true;
-        // 如果当前页数据如果小于总页数，那么才去加载数据
-        if (iPage < iTotalPage) {
-          iPage += 1;
+        // 如果后台还有数据，那么才去加载数据
+        if (bHasMore) {
           $(".btn-more").remove();  // 删除标签
           // 去加载数据
           fn_load_content()
@@ -118,7 +117,7 @@ $(function () {
     // 创建请求参数
     let sDataParams = {
       "tag_id": sCurrentTagId,
-      "page": iPage
+      "cursor": sCursor
     };
 
     // 创建ajax请求
@@ -133,10 +132,12 @@ $(function () {
     })
       .done(function (res) {
         if (res.errno === "0") {
-          iTotalPage = res.data.total_pages;  // 后端传过来的总页数
-          if (iPage === 1) {
+          if (!sCursor) {
             $(".news-list").html("")
           }
+          // 后端传过来的下一页游标，为null表示没有更多数据了
+          sCursor = res.data.next_cursor || '';
+          bHasMore = !!res.data.next_cursor;
 
           res.data.news.forEach(function (one_news) {
             let content = `
@@ -53,10 +53,18 @@ class Bezier:
 
 
 class Captcha(object):
+    # 是否缓存字体和字形，关掉后每次都重新加载字体、渲染字符（用于性能对比）
+    cache_glyphs = True
+
     def __init__(self):
         self._bezier = Bezier()
         self._dir = os.path.dirname(__file__)
         # self._captcha_path = os.path.join(self._dir, '..', 'static', 'captcha')
+        # 已加载的字体 (字体文件, 字号) -> FreeTypeFont
+        self._fonts = {}
+        # 渲染好并裁剪过的字形灰度图 (字符, 字体文件, 字号) -> Image('L')
+        # 颜色在使用时用灰度图当蒙版填充，所以不需要按颜色分别缓存
+        self._glyphs = {}
 
     @staticmethod
     def instance():
@@ -118,20 +126,45 @@ class Captcha(object):
             draw.line(((x, y), (x + level, y)), fill=color if color else self._color, width=level)
         return image
 
+    def truetype(self, name, size):
+        """
+        加载字体，加载过的直接返回
+        """
+        key = (name, size)
+        if not self.cache_glyphs:
+            return truetype(name, size)
+        if key not in self._fonts:
+            self._fonts[key] = truetype(name, size)
+        return self._fonts[key]
+
+    def glyph(self, c, name, size):
+        """
+        渲染单个字符，返回裁剪好的灰度图，渲染过的直接返回
+        """
+        key = (c, name, size)
+        if self.cache_glyphs and key in self._glyphs:
+            return self._glyphs[key]
+        font = self.truetype(name, size)
+        c_width, c_height = Draw(Image.new('L', (1, 1))).textsize(c, font=font)
+        glyph = Image.new('L', (c_width, c_height), 0)
+        Draw(glyph).text((0, 0), c, font=font, fill=255)
+        glyph = glyph.crop(glyph.getbbox())
+        if self.cache_glyphs:
+            self._glyphs[key] = glyph
+        return glyph
+
     def text(self, image, fonts, font_sizes=None, drawings=None, squeeze_factor=0.75, color=None):
         color = color if color else self._color
-        fonts = tuple([truetype(name, size)
+        fonts = tuple([(name, size)
                        for name in fonts
                        for size in font_sizes or (65, 70, 75)])
-        draw = Draw(image)
         char_images = []
         for c in self._text:
-            font = random.choice(fonts)
-            c_width, c_height = draw.textsize(c, font=font)
-            char_image = Image.new('RGB', (c_width, c_height), (0, 0, 0))
-            char_draw = Draw(char_image)
-            char_draw.text((0, 0), c, font=font, fill=color)
-            char_image = char_image.crop(char_image.getbbox())
+            name, size = random.choice(fonts)
+            glyph = self.glyph(c, name, size)
+            # 用字形灰度图当蒙版，在黑色背景上填充颜色，和直接用颜色画字的效果一样
+            char_image = Image.new('RGB', glyph.size, (0, 0, 0))
+            char_image.paste(color[:3], (0, 0) + glyph.size, glyph)
             for drawing in drawings:
                 d = getattr(self, drawing)
                 char_image = d(char_image)
@@ -212,6 +245,14 @@ class Captcha(object):
         self.initialize()
         return self.captcha("")
 
+    def generate_batch(self, n):
+        """
+        一次生成n个验证码
+        :param n: 个数
+        :return: [(文本, 图片二进制), ...]
+        """
+        return [self.generate_captcha() for _ in range(n)]
+
 
 captcha = Captcha.instance()
 
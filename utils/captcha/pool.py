@@ -0,0 +1,97 @@
+import time
+import logging
+
+from django_redis import get_redis_connection
+
+from . import renderer
+from .captcha import captcha
+
+logger = logging.getLogger('django')
+
+# 预先生成好的验证码，每一项为 b'文本:jpeg二进制'
+POOL_KEY = 'captcha:pool'
+# 统计数据 served_pool：从池中取出的次数 served_sync：池空了同步生成的次数 produced：生成放入池中的个数
+STATS_KEY = 'captcha:pool:stats'
+# 每分钟放入池中的个数，用来计算补充速度
+PRODUCED_MINUTE_KEY = 'captcha:pool:produced:{}'
+# 统计补充速度的分钟数
+RATE_MINUTES = 5
+
+
+def get_connection():
+    return get_redis_connection(alias='verify_codes')
+
+
+def pop_captcha():
+    """
+    从池中取出一个验证码，池空了或redis出错就在当前进程生成一个
+    # 不在请求中启动子进程：uwsgi下每个worker都会建一个进程池，sys.executable也不是python，第一次还要等解释器启动
+    # 子进程只给fill_captcha_pool命令批量生成用
+    :return: (文本, jpeg二进制)
+    """
+    try:
+        con = get_connection()
+        item = con.lpop(POOL_KEY)
+        if item is not None:
+            con.hincrby(STATS_KEY, 'served_pool', 1)
+            text, image = item.split(b':', 1)
+            return text.decode('utf8'), image
+        con.hincrby(STATS_KEY, 'served_sync', 1)
+    except Exception as e:
+        logger.error(f'从验证码池中取验证码出错：{e}')
+    return captcha.generate_captcha()
+
+
+def push_captchas(items):
+    """
+    把生成好的验证码放入池中
+    :param items: [(文本, jpeg二进制), ...]
+    :return: 放入后池中的个数
+    """
+    if not items:
+        return get_connection().llen(POOL_KEY)
+    minute_key = PRODUCED_MINUTE_KEY.format(int(time.time() // 60))
+    pi = get_connection().pipeline()
+    pi.rpush(POOL_KEY, *[text.encode('utf8') + b':' + image for text, image in items])
+    pi.hincrby(STATS_KEY, 'produced', len(items))
+    pi.incrby(minute_key, len(items))
+    pi.expire(minute_key, (RATE_MINUTES + 1) * 60)
+    return pi.execute()[0]
+
+
+def fill(size, batch_size=20, workers=0):
+    """
+    把池补充到size个
+    :param size: 池的容量
+    :param batch_size: 每批生成的个数
+    :param workers: 生成验证码的子进程数，为0时在当前进程生成
+    :return: 这次生成的个数
+    """
+    con = get_connection()
+    produced = 0
+    depth = con.llen(POOL_KEY)
+    while depth < size:
+        count = min(batch_size * max(workers, 1), size - depth)
+        items = renderer.render(count, workers) if workers else captcha.generate_batch(count)
+        depth = push_captchas(items)
+        produced += count
+    return produced
+
+
+def pool_stats():
+    """
+    验证码池的统计数据
+    :return: depth：池中个数 refill_per_minute：最近几分钟平均每分钟补充的个数，以及各项累计次数
+    """
+    con = get_connection()
+    current_minute = int(time.time() // 60)
+    pi = con.pipeline(transaction=False)
+    pi.llen(POOL_KEY)
+    pi.hgetall(STATS_KEY)
+    pi.mget([PRODUCED_MINUTE_KEY.format(current_minute - i) for i in range(1, RATE_MINUTES + 1)])
+    depth, stats, minutes = pi.execute()
+
+    result = {key.decode('utf8'): int(value) for key, value in stats.items()}
+    result['depth'] = depth
+    result['refill_per_minute'] = sum(int(value or 0) for value in minutes) / RATE_MINUTES
+    return result
@@ -0,0 +1,56 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 验证码生成是占用CPU的PIL操作，会一直持有GIL，放到子进程中生成，不阻塞当前进程的其他线程
+# 子进程用spawn方式启动，不会复制父进程的线程和连接
+# 只在fill_captcha_pool等管理命令中使用，不要在uwsgi worker处理请求时调用
+_executor = None
+_executor_workers = None
+_lock = threading.Lock()
+
+# 每个子进程任务生成的个数，太小了进程间通信开销大，太大了不能均匀分配
+CHUNK_SIZE = 20
+
+
+def _render_batch(n):
+    """
+    在子进程中执行，每个子进程有自己的Captcha实例和字体字形缓存
+    """
+    from utils.captcha.captcha import captcha
+    return captcha.generate_batch(n)
+
+
+def get_executor(workers=None):
+    """
+    获取进程池，每个进程只创建一次
+    :param workers: 子进程数，默认为CPU核数
+    :return:
+    """
+    global _executor, _executor_workers
+    workers = workers or os.cpu_count() or 1
+    with _lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def render(n, workers=None):
+    """
+    用多个子进程并行生成验证码，生成速度随核数线性增加
+    # 结果通过进程池的管道传回来
+    :param n: 个数
+    :param workers: 子进程数，默认为CPU核数
+    :return: [(文本, 图片二进制), ...]
+    """
+    executor = get_executor(workers)
+    chunks = [min(CHUNK_SIZE, n - i) for i in range(0, n, CHUNK_SIZE)]
+    result = []
+    for batch in executor.map(_render_batch, chunks):
+        result.extend(batch)
+    return result
+
@@ -0,0 +1,181 @@
+import time
+import logging
+from functools import wraps
+
+from django.core.cache import caches
+from django_redis import get_redis_connection
+
+logger = logging.getLogger('django')
+
+# 片段缓存使用的redis库
+CACHE_ALIAS = 'page_cache'
+# 每类数据一个版本号，数据变了版本号加1，旧版本的缓存自然不会再被读到
+VERSION_KEY = 'cache_version:{}'
+# 片段缓存key，带上所依赖数据的版本号
+FRAGMENT_KEY = 'fragment:{}:{}'
+# 页面缓存key，由请求的完整路径和版本号组成
+PAGE_KEY = 'page:{}:{}'
+# 重新生成缓存时加的锁，同一时间只有一个进程在生成
+LOCK_KEY = 'lock:{}'
+
+# 缓存过期后旧数据还能再用多久，这段时间内只有拿到锁的进程重新生成，其他进程返回旧数据
+STALE_GRACE = 60
+# 锁的过期时间，生成数据的进程挂掉后锁也会自动释放
+LOCK_TIMEOUT = 30
+# 没有旧数据可用时，没拿到锁的进程等待别人生成的最长时间和轮询间隔
+WAIT_TIMEOUT = 5
+WAIT_INTERVAL = 0.05
+
+
+def get_versions(*names):
+    """
+    一次取出多类数据的版本号
+    :param names: 数据名称，如 'tag'、'hotnews'
+    :return: 版本号列表，没有设置过的为0
+    """
+    con = get_redis_connection(alias=CACHE_ALIAS)
+    values = con.mget([VERSION_KEY.format(name) for name in names])
+    return [int(value or 0) for value in values]
+
+
+def bump_version(name):
+    """
+    数据改变后版本号加1
+    :param name: 数据名称
+    :return: 新版本号
+    """
+    con = get_redis_connection(alias=CACHE_ALIAS)
+    return con.incr(VERSION_KEY.format(name))
+
+
+def get_or_build(key, builder, timeout, grace=STALE_GRACE):
+    """
+    防止缓存击穿：同一时间只有一个进程重新生成数据，其他进程返回过期的旧数据
+    # 缓存中存的是(数据, 过期时间)，redis中的实际过期时间多了grace秒，过期后的这段时间内旧数据还能用
+    # 过期后用redis锁控制，拿到锁的进程重新生成，没拿到的直接返回旧数据
+    # 完全没有旧数据时（第一次生成、版本号刚变），没拿到锁的进程等一会儿，等不到再自己生成
+    :param key: 缓存key
+    :param builder: 生成数据的函数
+    :param timeout: 数据新鲜的时间，单位秒
+    :param grace: 过期后旧数据还能使用的时间，单位秒
+    :return:
+    """
+    cache = caches[CACHE_ALIAS]
+    entry = cache.get(key)
+    if entry is not None and entry[1] > time.time():
+        return entry[0]
+
+    con = get_redis_connection(alias=CACHE_ALIAS)
+    lock = con.lock(LOCK_KEY.format(key), timeout=LOCK_TIMEOUT)
+    if lock.acquire(blocking=False):
+        try:
+            value = builder()
+            cache.set(key, (value, time.time() + timeout), timeout + grace)
+            return value
+        finally:
+            try:
+                lock.release()
+            except Exception as e:
+                # 生成时间超过了锁的过期时间，锁已经被释放
+                logger.info(f'释放缓存锁{key}失败：{e}')
+
+    if entry is not None:
+        return entry[0]
+
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    logger.info(f'等待缓存{key}生成超时，直接生成')
+    return builder()
+
+
+def cached_fragment(name, depends, builder, timeout):
+    """
+    缓存一段渲染好的html（或其他可pickle的数据）
+    # key由片段名称和所依赖数据的版本号组成，所有用户共用同一份缓存
+    # 过期时用get_or_build防止多个进程同时重新生成
+    # redis出错时直接调用builder，不影响页面显示
+    :param name: 片段名称
+    :param depends: 所依赖的数据名称列表
+    :param builder: 没有缓存时生成数据的函数
+    :param timeout: 缓存时间，单位秒
+    :return:
+    """
+    try:
+        versions = get_versions(*depends)
+        key = FRAGMENT_KEY.format(name, '.'.join(str(version) for version in versions))
+    except Exception as e:
+        logger.error(f'读取片段缓存{name}出错：{e}')
+        return builder()
+    return _get_or_build_safe(key, builder, timeout)
+
+
+def single_flight_cache_page(timeout, depends=(), grace=STALE_GRACE):
+    """
+    视图缓存装饰器，和cache_page一样缓存整个响应，多了防击穿和版本号失效
+    # 只缓存GET请求中状态码为200的响应，key为请求的完整路径和所依赖数据的版本号
+    # 响应内容不能和用户有关（登录状态、csrf_token），一般用于返回json的ajax接口
+    # 类视图用法：@method_decorator(single_flight_cache_page(600, ['news']), name='dispatch')
+    :param timeout: 缓存时间，单位秒
+    :param depends: 所依赖的数据名称列表
+    :param grace: 过期后旧数据还能使用的时间，单位秒
+    :return:
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+
+            def build():
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                return response
+
+            try:
+                versions = get_versions(*depends)
+            except Exception as e:
+                logger.error(f'读取页面缓存{request.path}出错：{e}')
+                return view_func(request, *args, **kwargs)
+            key = PAGE_KEY.format(request.get_full_path(), '.'.join(str(version) for version in versions))
+
+            response = _get_or_build_safe(key, build, timeout, grace, cacheable=lambda resp: resp.status_code == 200)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def _get_or_build_safe(key, builder, timeout, grace=STALE_GRACE, cacheable=None):
+    """
+    get_or_build中redis出错时直接调用builder，不能缓存的数据（如错误响应）不写入缓存
+    # builder自己抛出的异常原样抛出，不会再调用一次
+    """
+    started, built = [], []
+
+    def build():
+        started.append(True)
+        value = builder()
+        built.append(value)
+        if cacheable is not None and not cacheable(value):
+            raise _NotCacheable()
+        return value
+
+    try:
+        return get_or_build(key, build, timeout, grace)
+    except _NotCacheable:
+        return built[0]
+    except Exception as e:
+        if started and not built:
+            raise
+        logger.error(f'读取缓存{key}出错：{e}')
+        return built[0] if built else builder()
+
+
+class _NotCacheable(Exception):
+    """
+    生成的数据不需要缓存
+    """
@@ -0,0 +1,36 @@
+import os
+import threading
+
+import urllib3
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个进程、每种用途共用一个session，连接保持复用，不用每次请求都重新握手
+# uwsgi fork出的子进程不能用父进程的连接，按进程id区分
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_session(name, pool_size=10, verify=True):
+    """
+    获取当前进程中名为name的session，第一次调用时创建
+    :param name: session的用途，不同用途的连接池分开
+    :param pool_size: 每个host的连接池大小，同时请求数超过这个数时多出来的连接用完就关闭
+    :param verify: 是否校验https证书
+    :return: requests.Session
+    """
+    key = (os.getpid(), name)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.verify = verify
+                if not verify:
+                    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+                _sessions[key] = session
+    return session
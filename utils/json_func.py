@@ -1,22 +1,82 @@
-from django.http import JsonResponse
+import json
+import uuid
+import decimal
+import datetime
+
+from django.http import HttpResponse
+from django.db.models.query import QuerySet
+from django.utils.functional import Promise
 
 from .res_code import Code
 
+# 有orjson就用orjson序列化，没有就用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """
+    标准json不能序列化的类型，格式和DjangoJSONEncoder一致
+    :param obj:
+    :return:
+    """
+    if isinstance(obj, datetime.datetime):
+        r = obj.isoformat()
+        if obj.microsecond:
+            r = r[:23] + r[26:]
+        if r.endswith('+00:00'):
+            r = r[:-6] + 'Z'
+        return r
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if isinstance(obj, datetime.time):
+        r = obj.isoformat()
+        if obj.microsecond:
+            r = r[:12]
+        return r
+    if isinstance(obj, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(obj)
+    # values()查询集直接序列化成列表
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    raise TypeError(f'{type(obj).__name__}类型不能序列化为json')
+
+
+def dumps(obj):
+    """
+    序列化成json bytes
+    :param obj:
+    :return:
+    """
+    if orjson is not None:
+        # datetime交给_default处理，保持和DjangoJSONEncoder一样的格式
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf8')
+
 
 def to_json_data(errno=Code.OK, errmsg='', data=None, **kwargs):
     """
     构造json数据
     :param errno: 错误码
     :param errmsg:  错误信息
-    :param data:  数据
+    :param data:  数据，如果是bytes则当做已经序列化好的json，原样放进去
     :param kwargs:  其他数据
     :return:
     """
 
-    json_dict = {'errno': errno, 'errmsg': errmsg, 'data': data}
+    json_dict = {'errno': errno, 'errmsg': errmsg}
     # 判断kwargs有没有值 或者是不是一个字典
     if kwargs and isinstance(kwargs, dict) and kwargs.keys():
         # 如果验证成功，就更新到json_dict
         json_dict.update(kwargs)
 
-    return JsonResponse(json_dict)
+    if isinstance(data, (bytes, bytearray)):
+        # 去掉最后的}，拼上已经序列化好的data
+        content = dumps(json_dict)[:-1] + b',"data":' + bytes(data) + b'}'
+    else:
+        json_dict['data'] = data
+        content = dumps(json_dict)
+
+    return HttpResponse(content=content, content_type='application/json')
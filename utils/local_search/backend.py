@@ -0,0 +1,187 @@
+import logging
+import threading
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from haystack import connections
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery, SearchNode, log_query
+from haystack.constants import DJANGO_CT, DJANGO_ID
+from haystack.exceptions import NotHandled, SkipDocument
+from haystack.inputs import PythonData
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+
+from . import tokenizer
+from .index import LocalIndex
+from .segment import SegmentBuilder
+
+logger = logging.getLogger('django')
+
+# update(commit=False)时先在内存中积累，到这么多篇再写成一个段
+FLUSH_SIZE = 5000
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path):
+    """
+    同一个进程中同一个目录只打开一次，各线程共用已经mmap的段
+    """
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = LocalIndex(path)
+        return _indexes[path]
+
+
+class LocalSearchBackend(BaseSearchBackend):
+    """
+    不依赖elasticsearch的本地搜索引擎
+    # 只支持全文查询（中文按二元切分），按BM25得分排序，不支持按字段过滤、排序和分面
+    # settings中配置：
+    # 'ENGINE': 'utils.local_search.backend.LocalSearchEngine',
+    # 'PATH': 索引文件保存的目录,
+    # 'STORED_FIELDS': 搜索结果中要返回的字段，不写时返回索引中所有stored的字段
+    """
+    RESERVED_WORDS = ()
+    RESERVED_CHARACTERS = ()
+
+    def __init__(self, connection_alias, **connection_options):
+        super(LocalSearchBackend, self).__init__(connection_alias, **connection_options)
+        if not connection_options.get('PATH'):
+            raise ImproperlyConfigured(f"haystack连接'{connection_alias}'没有设置PATH")
+        self.index = get_index(connection_options['PATH'])
+        self.stored_fields = connection_options.get('STORED_FIELDS')
+        self.flush_size = connection_options.get('FLUSH_SIZE', FLUSH_SIZE)
+        self.builder = None
+
+    def get_stored_fields(self, index):
+        if self.stored_fields is not None:
+            return self.stored_fields
+        return [field.index_fieldname for field in index.fields.values() if field.stored and not field.document]
+
+    def update(self, index, iterable, commit=True):
+        """
+        :param commit: 为False时先积累在内存中，到flush_size篇或者下一次commit时再写入
+        """
+        if self.builder is None:
+            self.builder = SegmentBuilder()
+        content_field = index.get_content_field()
+        stored_fields = self.get_stored_fields(index)
+        for obj in iterable:
+            try:
+                doc = index.full_prepare(obj)
+            except SkipDocument:
+                continue
+            counts, length = tokenizer.tokenize(doc.get(content_field) or '')
+            stored = {name: doc.get(name) for name in stored_fields}
+            self.builder.add(get_identifier(obj), counts, length, stored)
+        if commit or len(self.builder) >= self.flush_size:
+            self.commit()
+
+    def commit(self):
+        builder, self.builder = self.builder, None
+        if builder is None:
+            return
+        try:
+            self.index.write(builder)
+        except Exception as e:
+            if not self.silently_fail:
+                raise
+            logger.error(f'写入搜索索引出错：{len(builder)}篇 {e}')
+
+    def remove(self, obj_or_string, commit=True):
+        self.commit()
+        try:
+            self.index.remove([get_identifier(obj_or_string)])
+        except Exception as e:
+            if not self.silently_fail:
+                raise
+            logger.error(f'从搜索索引中删除出错：{get_identifier(obj_or_string)} {e}')
+
+    def clear(self, models=None, commit=True):
+        self.builder = None
+        prefixes = None
+        if models is not None:
+            prefixes = [f'{get_model_ct(model)}.' for model in models]
+        self.index.clear(prefixes)
+
+    @staticmethod
+    def parse_query(query_string):
+        """
+        查询语句中以-开头的词是要排除的
+        :return: (查询的词, 排除的词)
+        """
+        words, excludes = [], []
+        for word in query_string.split():
+            if word.startswith('-') and len(word) > 1:
+                excludes.append(word[1:])
+            elif word != '*':
+                words.append(word)
+        return ' '.join(words), excludes
+
+    @log_query
+    def search(self, query_string, **kwargs):
+        query, excludes = self.parse_query(query_string)
+        if not query:
+            return {'results': [], 'hits': 0}
+
+        try:
+            hits, rows = self.index.search(query, excludes, kwargs.get('start_offset') or 0, kwargs.get('end_offset'))
+        except Exception as e:
+            if not self.silently_fail:
+                raise
+            logger.error(f'搜索出错：{query_string} {e}')
+            return {'results': [], 'hits': 0}
+
+        result_class = kwargs.get('result_class') or SearchResult
+        unified_index = connections[self.connection_alias].get_unified_index()
+        results = []
+        for key, score, stored in rows:
+            app_label, model_name, pk = key.split('.', 2)
+            try:
+                index = unified_index.get_index(apps.get_model(app_label, model_name))
+            except (LookupError, NotHandled):
+                # 模型已经没有索引了，等下次重建索引时删除
+                continue
+            fields = {}
+            for name, value in stored.items():
+                field = index.fields.get(name)
+                fields[name] = field.convert(value) if field is not None and hasattr(field, 'convert') else value
+            fields.pop(DJANGO_CT, None)
+            fields.pop(DJANGO_ID, None)
+            results.append(result_class(app_label, model_name, pk, score, **fields))
+        return {'results': results, 'hits': hits, 'facets': {}, 'spelling_suggestion': None}
+
+
+class LocalSearchQuery(BaseSearchQuery):
+    """
+    把查询条件拼成空格分隔的词，排除的词前面加-
+    """
+    def build_query(self):
+        if not self.query_filter:
+            return '*'
+        return self._build_sub_query(self.query_filter)
+
+    def _build_sub_query(self, search_node):
+        words = []
+        for child in search_node.children:
+            if isinstance(child, SearchNode):
+                words.append(self._build_sub_query(child))
+            else:
+                value = child[1]
+                if not hasattr(value, 'input_type_name'):
+                    value = PythonData(value)
+                words.append(str(value.prepare(self)))
+        query_string = ' '.join(word for word in words if word)
+        if search_node.negated:
+            query_string = self.build_not_query(query_string)
+        return query_string
+
+    def build_not_query(self, query_string):
+        return ' '.join(f'-{word}' for word in query_string.split() if not word.startswith('-'))
+
+
+class LocalSearchEngine(BaseEngine):
+    backend = LocalSearchBackend
+    query = LocalSearchQuery
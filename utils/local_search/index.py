@@ -0,0 +1,521 @@
+import os
+import math
+import json
+import uuid
+import fcntl
+import heapq
+import shutil
+import bisect
+import logging
+import threading
+from itertools import repeat
+from operator import add, mul, itemgetter
+from contextlib import contextmanager
+
+from . import tokenizer
+from .segment import Segment, SegmentBuilder, IMPACT_SCALE, merge_segments
+
+logger = logging.getLogger('django')
+
+# 记录当前有哪些段、每个段删除了哪些文档，写的进程整体替换这个文件
+MANIFEST_FILE = 'manifest.json'
+# 写锁，同一时间只有一个进程修改索引
+LOCK_FILE = 'write.lock'
+
+# 同一级别（文档数同一数量级）的段达到这个个数就合并成一个
+MERGE_FACTOR = 10
+# 段中删除的文档超过这个比例就重写这个段
+MAX_DELETED_RATIO = 0.3
+# 文档数达到COMMON_TERM_MIN_DOCS以后，出现在超过COMMON_TERM_RATIO比例的文档中的词算常见词
+COMMON_TERM_MIN_DOCS = 10000
+COMMON_TERM_RATIO = 0.05
+# 全是常见词时，命中数超过这个数就用抽样估计
+HITS_SAMPLE_SIZE = 1000
+# 提前结束算分时给上界留的余量，浮点数累加顺序不同可能差一点，不能因此漏掉得分相同的文档
+SCORE_EPSILON = 1e-9
+
+
+class Snapshot(object):
+    """
+    某个时刻的索引，查询时所有段的文档序号统一编号：段的起始编号 + 段内序号
+    """
+    def __init__(self, segments):
+        """
+        :param segments: [(Segment, 已删除的文档序号集合), ...]
+        """
+        self.segments = segments
+        self.bases = []
+        total = 0
+        for segment, deleted in segments:
+            self.bases.append(total)
+            total += segment.doc_count
+        # 已删除的文档在合并前还留在倒排列表中，算idf时文档总数也包含它们，和lucene一样
+        self.total_count = total
+        self.live_count = sum(segment.doc_count - len(deleted) for segment, deleted in segments)
+
+    def locate(self, number):
+        i = bisect.bisect_right(self.bases, number) - 1
+        return self.segments[i][0], number - self.bases[i]
+
+    def postings(self, term):
+        """
+        :return: [(段的起始编号, 段, start, end), ...]
+        """
+        term = term.encode('utf8')
+        result = []
+        for base, (segment, deleted) in zip(self.bases, self.segments):
+            found = segment.lookup(term)
+            if found is not None:
+                result.append((base, segment) + found)
+        return result
+
+    def doc_set(self, postings):
+        """
+        :return: 包含这个词的文档编号集合
+        """
+        result = set()
+        for base, segment, start, end in postings:
+            docs = segment.docs[start:end]
+            result.update(map(add, docs, repeat(base)) if base else docs)
+        return result
+
+    def impact_dict(self, postings):
+        """
+        :return: {文档编号: 得分}
+        """
+        result = {}
+        for base, segment, start, end in postings:
+            docs = segment.docs[start:end]
+            result.update(zip(map(add, docs, repeat(base)) if base else docs, segment.impacts[start:end]))
+        return result
+
+    @staticmethod
+    def impact_of(postings, number):
+        """
+        在倒排列表中二分查找一篇文档
+        :return: 得分，不包含这个词时返回0
+        """
+        for base, segment, start, end in postings:
+            if base <= number < base + segment.doc_count:
+                i = bisect.bisect_left(segment.docs, number - base, start, end)
+                if i < end and segment.docs[i] == number - base:
+                    return segment.impacts[i]
+                return 0
+        return 0
+
+    @staticmethod
+    def impact_levels(postings):
+        """
+        :return: (每个段的得分bytes, 出现过的得分从高到低)
+        """
+        blobs = [(base, segment, start, bytes(segment.impacts[start:end])) for base, segment, start, end in postings]
+        levels = sorted(set().union(*[set(blob) for base, segment, start, blob in blobs]), reverse=True)
+        return blobs, levels
+
+    @staticmethod
+    def iter_by_impact(blobs, levels):
+        """
+        按得分从高到低遍历倒排列表，得分是0-255的整数，用bytes.find找出每个得分的位置
+        :return: 生成器 (得分, 文档编号)
+        """
+        for level in levels:
+            needle = bytes((level,))
+            for base, segment, start, blob in blobs:
+                i = blob.find(needle)
+                while i >= 0:
+                    yield level, base + segment.docs[start + i]
+                    i = blob.find(needle, i + 1)
+
+    def top_all(self, terms, k, skip):
+        """
+        同时包含所有词的文档中得分最高的k篇
+        # 阈值算法（Fagin's Threshold Algorithm）：轮流按得分从高到低读每个词的倒排列表，读到的文档用二分查找算出总分
+        # 没读到的文档总分不会超过 各个词当前读到的得分之和，第k高的总分超过这个值就可以停止，不用读完整个倒排列表
+        # 算总分时先查文档少的词，加上剩下的词的最高分也进不了前k名就不再查
+        # 得分量化成了整数，相同得分很多，按 (得分, -文档编号) 排序，翻页时不同的k得到的顺序一致
+        :param terms: 按df从小到大排好序的 [(df, 权重, 倒排列表), ...]
+        :param k: 返回的个数
+        :param skip: 不参与排序的文档编号（已删除、排除的）
+        :return: [(文档编号, 得分), ...]
+        """
+        streams = []
+        maxima = []
+        for df, weight, postings in terms:
+            blobs, levels = self.impact_levels(postings)
+            streams.append(self.iter_by_impact(blobs, levels))
+            maxima.append(levels[0] * weight)
+        # 剩下的词最多还能加多少分
+        remains = [sum(maxima[i:]) + SCORE_EPSILON for i in range(len(terms))]
+        levels = [IMPACT_SCALE] * len(terms)
+        seen = set()
+        # 小顶堆 [(得分, -文档编号), ...]，堆顶是目前第k名
+        heap = []
+        while True:
+            for i, stream in enumerate(streams):
+                item = next(stream, None)
+                if item is None:
+                    # 某个词的倒排列表读完了，同时包含所有词的文档都已经读到过
+                    return [(-neg, score) for score, neg in sorted(heap, reverse=True)]
+                levels[i], number = item
+                if number in seen or number in skip:
+                    continue
+                seen.add(number)
+                full = len(heap) >= k
+                score = 0
+                for (df, weight, postings), remain in zip(terms, remains):
+                    if full and score + remain < heap[0][0]:
+                        break
+                    impact = self.impact_of(postings, number)
+                    if not impact:
+                        break
+                    score += impact * weight
+                else:
+                    if not full:
+                        heapq.heappush(heap, (score, -number))
+                    elif (score, -number) > heap[0]:
+                        heapq.heapreplace(heap, (score, -number))
+            threshold = sum(level * weight for level, (df, weight, postings) in zip(levels, terms))
+            # 没读到的文档可能和第k名得分相同、编号更小，得分严格大于阈值才能停止
+            if len(heap) >= k and heap[0][0] > threshold + SCORE_EPSILON:
+                return [(-neg, score) for score, neg in sorted(heap, reverse=True)]
+
+    def search(self, terms, excludes=(), start=0, end=None):
+        """
+        BM25打分
+        # 每个倒排项预先存好了不含idf的得分（0-255），查询时只需要乘上idf累加
+        # 参考elasticsearch的common terms查询，文档数多时把出现在大部分文档中的词（常见词）单独处理：
+        #   有非常见词时，只有包含非常见词的文档是结果，非常见词的倒排列表用map、zip和dict.update在C代码中累加
+        #   常见词只给这些文档加分，文档少时二分查找，不用读常见词的整个倒排列表
+        #   全是常见词时，结果是同时包含所有词的文档，用阈值算法只取前几名
+        :param terms: 查询的词
+        :param excludes: 要排除的词
+        :param start: 返回结果的起始位置
+        :param end: 返回结果的结束位置，为None时返回全部
+        :return: (命中的文档数, [(文档id, 得分, 返回字段), ...])
+        """
+        rare, common = [], []
+        for term in terms:
+            postings = self.postings(term)
+            df = sum(end_ - start_ for base, segment, start_, end_ in postings)
+            if not df:
+                continue
+            idf = math.log(1 + (self.total_count - df + 0.5) / (df + 0.5))
+            item = (df, idf / IMPACT_SCALE, postings)
+            if self.live_count >= COMMON_TERM_MIN_DOCS and df > self.live_count * COMMON_TERM_RATIO:
+                common.append(item)
+            else:
+                rare.append(item)
+        if not rare and not common:
+            return 0, []
+
+        skip = set()
+        for base, (segment, deleted) in zip(self.bases, self.segments):
+            skip.update(map(add, deleted, repeat(base)))
+        for term in excludes:
+            skip.update(self.doc_set(self.postings(term)))
+
+        if rare:
+            ranked, hits = self.rank_rare(rare, common, skip, end)
+        else:
+            ranked, hits = self.rank_common(common, skip, end)
+        results = []
+        for number, score in ranked[start:end]:
+            segment, ordinal = self.locate(number)
+            results.append((segment.keys[ordinal], score, segment.stored(ordinal)))
+        return hits, results
+
+    def rank_rare(self, rare, common, skip, end):
+        """
+        :return: (按得分排好序的 [(文档编号, 得分), ...]，命中数)
+        """
+        scores = {}
+        for df, weight, postings in rare:
+            for base, segment, start, end_ in postings:
+                docs = segment.docs[start:end_]
+                if base:
+                    docs = list(map(add, docs, repeat(base)))
+                impacts = map(mul, segment.impacts[start:end_], repeat(weight))
+                scores.update(zip(docs, map(add, map(scores.get, docs, repeat(0.0)), impacts)))
+        for number in skip:
+            scores.pop(number, None)
+
+        for df, weight, postings in common:
+            docs = list(scores)
+            if len(docs) * 16 < df:
+                impacts = [self.impact_of(postings, number) for number in docs]
+            else:
+                impacts = map(self.impact_dict(postings).get, docs, repeat(0))
+            scores.update(zip(docs, map(add, map(scores.__getitem__, docs), map(mul, impacts, repeat(weight)))))
+
+        hits = len(scores)
+        items = scores.items()
+        # 得分相同时编号小的在前，和top_all的顺序一致
+        ranked = sorted(items, key=rank_key, reverse=True) if end is None else heapq.nlargest(end, items, key=rank_key)
+        return ranked, hits
+
+    def count_all(self, terms, skip):
+        """
+        同时包含所有词的文档数
+        # 从文档最少的词的倒排列表中等间隔取不超过HITS_SAMPLE_SIZE篇，二分查找是否包含其他词
+        # 倒排列表不超过HITS_SAMPLE_SIZE时是准确值，超过时按抽样的比例估算（和elasticsearch的track_total_hits类似，
+        # 命中很多时只给出大概的数量），不用把几个很长的倒排列表都读一遍
+        # 估算值取比例的置信下限（约97.5%），宁可少给几页也不要多出空页，最少是抽样中命中的篇数
+        :param terms: 按df从小到大排好序的 [(df, 权重, 倒排列表), ...]
+        :return: (命中数, 是否是准确值)
+        """
+        df = terms[0][0]
+        step = max(1, df // HITS_SAMPLE_SIZE)
+        sampled = matched = 0
+        for base, segment, start, end in terms[0][2]:
+            for i in range(start, end, step):
+                number = base + segment.docs[i]
+                sampled += 1
+                if number in skip:
+                    continue
+                if all(self.impact_of(postings, number) for df_, weight, postings in terms[1:]):
+                    matched += 1
+        if step == 1:
+            return matched, True
+        ratio = matched / sampled
+        lower = ratio - 2 * math.sqrt(ratio * (1 - ratio) / sampled)
+        return max(matched, int(lower * df)), False
+
+    def rank_common(self, common, skip, end):
+        """
+        :return: (按得分排好序的 [(文档编号, 得分), ...]，命中数)
+        """
+        common.sort(key=itemgetter(0))
+        if len(common) == 1:
+            postings = common[0][2]
+            hits = common[0][0] - sum(1 for number in skip if self.impact_of(postings, number))
+            exact = True
+        else:
+            hits, exact = self.count_all(common, skip)
+        if not hits:
+            return [], 0
+        if end is None:
+            # 要全部结果时直接取出所有同时包含这些词的文档，命中数就是准确值
+            ranked = self.top_all(common, common[0][0], skip)
+            return ranked, len(ranked)
+        ranked = self.top_all(common, min(end, hits), skip)
+        if not exact and len(ranked) < min(end, hits):
+            # 估算多了，前end名都没取满，说明已经取出了全部命中的文档
+            hits = len(ranked)
+        return ranked, hits
+
+
+def rank_key(item):
+    """
+    (文档编号, 得分)的排序key，得分相同时编号小的在前
+    """
+    return item[1], -item[0]
+
+
+class LocalIndex(object):
+    """
+    保存在本地磁盘上的倒排索引
+    # 索引由多个只读的段组成，每次写入生成一个新段，同时在manifest中把旧段中的同一篇文档标记为删除
+    # 同一级别的段多了以后合并，合并时去掉已删除的文档
+    # 读的进程把段mmap到内存中，manifest变了才重新加载
+    """
+    def __init__(self, path, merge_factor=MERGE_FACTOR):
+        self.path = path
+        self.merge_factor = merge_factor
+        self._snapshot = None
+        self._snapshot_stamp = None
+        self._segments = {}
+        self._load_lock = threading.Lock()
+
+    # ---------- 读 ----------
+
+    def _manifest_path(self):
+        return os.path.join(self.path, MANIFEST_FILE)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'segments': []}
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(self._manifest_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _get_segment(self, name):
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = self._segments[name] = Segment(os.path.join(self.path, name))
+        return segment
+
+    def snapshot(self):
+        """
+        当前的索引，manifest没变就直接用已经加载的
+        """
+        stamp = self._manifest_stamp()
+        if self._snapshot is not None and stamp == self._snapshot_stamp:
+            return self._snapshot
+        with self._load_lock:
+            for _ in range(3):
+                stamp = self._manifest_stamp()
+                manifest = self._read_manifest()
+                try:
+                    segments = [(self._get_segment(item['name']), set(item['deleted'])) for item in manifest['segments']]
+                except FileNotFoundError:
+                    # 读manifest之后段被合并删除了，重新读一次
+                    continue
+                break
+            else:
+                raise RuntimeError(f'加载搜索索引失败：{self.path}')
+            names = {item['name'] for item in manifest['segments']}
+            self._segments = {name: segment for name, segment in self._segments.items() if name in names}
+            self._snapshot = Snapshot(segments)
+            self._snapshot_stamp = stamp
+        return self._snapshot
+
+    def search(self, query, excludes=(), start=0, end=None):
+        """
+        :param query: 查询语句
+        :param excludes: 要排除的查询语句
+        :return: (命中的文档数, [(文档id, 得分, 返回字段), ...])
+        """
+        exclude_terms = [term for text in excludes for term in tokenizer.query_terms(text)]
+        return self.snapshot().search(tokenizer.query_terms(query), exclude_terms, start, end)
+
+    def doc_count(self):
+        return self.snapshot().live_count
+
+    # ---------- 写 ----------
+
+    @contextmanager
+    def write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _delete_keys(self, manifest, keys):
+        """
+        在manifest中把旧段里的这些文档标记为删除
+        """
+        keys = set(keys)
+        if not keys:
+            return 0
+        count = 0
+        for item in manifest['segments']:
+            segment = self._get_segment(item['name'])
+            deleted = set(item['deleted'])
+            for ordinal, key in enumerate(segment.keys):
+                if key in keys and ordinal not in deleted:
+                    deleted.add(ordinal)
+                    count += 1
+            item['deleted'] = sorted(deleted)
+        return count
+
+    def write(self, builder):
+        """
+        把内存中建好的段写入索引，旧段中的同一篇文档标记为删除
+        :param builder: SegmentBuilder
+        """
+        if not len(builder):
+            return
+        with self.write_lock():
+            manifest = self._read_manifest()
+            self._delete_keys(manifest, builder.ordinals.keys())
+            name = f'seg_{uuid.uuid4().hex}'
+            builder.write(os.path.join(self.path, name))
+            manifest['segments'].append({'name': name, 'docs': len(builder), 'deleted': sorted(builder.deleted)})
+            self._merge(manifest)
+            self._write_manifest(manifest)
+
+    def add(self, docs):
+        """
+        :param docs: [(文档id, 文本, 返回字段), ...]
+        """
+        builder = SegmentBuilder()
+        for key, text, stored in docs:
+            counts, length = tokenizer.tokenize(text)
+            builder.add(key, counts, length, stored)
+        self.write(builder)
+
+    def remove(self, keys):
+        with self.write_lock():
+            manifest = self._read_manifest()
+            if self._delete_keys(manifest, keys):
+                self._merge(manifest)
+                self._write_manifest(manifest)
+
+    def clear(self, prefixes=None):
+        """
+        :param prefixes: 只删除id以这些前缀开头的文档，为None时删除全部
+        """
+        if prefixes is None:
+            with self.write_lock():
+                manifest = self._read_manifest()
+                self._write_manifest({'segments': []})
+                self._remove_segments(item['name'] for item in manifest['segments'])
+            return
+        prefixes = tuple(prefixes)
+        keys = [key for segment, deleted in self.snapshot().segments for key in segment.keys if key.startswith(prefixes)]
+        self.remove(keys)
+
+    def _remove_segments(self, names):
+        for name in names:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def _merge(self, manifest):
+        """
+        合并策略
+        # 按段中有效文档数的数量级分级，同一级的段达到merge_factor个就合并，每篇文档一共只会被合并几次
+        # 删除比例太高的段单独重写
+        # 合并后的段要等新manifest写入以后才能删除旧段，正在读旧段的进程不受影响（mmap的文件删除后仍然可以读）
+        """
+        removed = []
+        while True:
+            tiers = {}
+            candidates = None
+            for item in manifest['segments']:
+                live = item['docs'] - len(item['deleted'])
+                if item['docs'] and len(item['deleted']) / item['docs'] > MAX_DELETED_RATIO:
+                    candidates = [item]
+                    break
+                tier = int(math.log(max(live, 1), self.merge_factor))
+                tiers.setdefault(tier, []).append(item)
+                if len(tiers[tier]) >= self.merge_factor:
+                    candidates = tiers[tier]
+                    break
+            if candidates is None:
+                break
+
+            name = f'seg_{uuid.uuid4().hex}'
+            merge_segments([(self._get_segment(item['name']), set(item['deleted'])) for item in candidates],
+                           os.path.join(self.path, name))
+            docs = sum(item['docs'] - len(item['deleted']) for item in candidates)
+            position = manifest['segments'].index(candidates[0])
+            names = {item['name'] for item in candidates}
+            manifest['segments'] = [item for item in manifest['segments'] if item['name'] not in names]
+            if docs:
+                manifest['segments'].insert(position, {'name': name, 'docs': docs, 'deleted': []})
+            else:
+                removed.append(name)
+            removed.extend(names)
+            logger.info(f'合并搜索索引段：{len(candidates)}个段，{docs}篇文档')
+
+        if removed:
+            # 先写manifest再删除旧段
+            self._write_manifest(manifest)
+            self._remove_segments(removed)
+            for name in removed:
+                self._segments.pop(name, None)
@@ -0,0 +1,263 @@
+import os
+import json
+import mmap
+import heapq
+import shutil
+import itertools
+from array import array
+from operator import add
+from collections import defaultdict
+
+# BM25参数
+K1 = 1.2
+B = 0.75
+# 每个倒排项的得分（不含idf）量化成0-255保存，查询时只需要乘上idf
+IMPACT_SCALE = 255
+
+# 段目录中的文件
+# terms.dat：排好序的词（utf8）首尾相接  terms.idx：每个词在terms.dat中的起始位置
+# postings.idx：每个词的倒排列表在docs.dat中的起始位置
+# docs.dat：倒排列表中的文档序号  impacts.dat：对应的得分  tfs.dat：对应的词频，只在合并段时使用
+# lengths.dat：每篇文档的词数  keys.dat：每篇文档的id，换行分隔
+# stored.dat：每篇文档要返回的字段（json）  stored.idx：每篇文档在stored.dat中的起始位置
+META_FILE = 'meta.json'
+
+
+def _map_array(path, typecode):
+    """
+    用mmap把数组文件映射到内存，由操作系统按需读取、在进程间共享
+    :return: memoryview，可以像数组一样按下标读取
+    """
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return memoryview(array(typecode))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    return view if typecode == 'B' else view.cast(typecode)
+
+
+class Segment(object):
+    """
+    只读的索引段，写好以后不再修改，删除文档只记录在manifest中
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.doc_count = meta['docs']
+        self.term_count = meta['terms']
+        self.total_length = meta['total_length']
+
+        self.terms = _map_array(os.path.join(path, 'terms.dat'), 'B')
+        self.term_offsets = _map_array(os.path.join(path, 'terms.idx'), 'Q')
+        self.posting_offsets = _map_array(os.path.join(path, 'postings.idx'), 'Q')
+        self.docs = _map_array(os.path.join(path, 'docs.dat'), 'I')
+        self.impacts = _map_array(os.path.join(path, 'impacts.dat'), 'B')
+        self.stored_offsets = _map_array(os.path.join(path, 'stored.idx'), 'Q')
+        self.stored_data = _map_array(os.path.join(path, 'stored.dat'), 'B')
+        # 合并时才用到的文件也在这里映射好，段被合并删除后持有旧快照的进程仍然可以读
+        self.keys_data = _map_array(os.path.join(path, 'keys.dat'), 'B')
+        self.lengths_data = _map_array(os.path.join(path, 'lengths.dat'), 'I')
+        self.tfs_data = _map_array(os.path.join(path, 'tfs.dat'), 'H')
+        self._keys = None
+
+    def term(self, i):
+        return bytes(self.terms[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def lookup(self, term):
+        """
+        二分查找词
+        :param term: utf8编码的词
+        :return: 倒排列表在docs.dat中的范围 (start, end)，没有这个词返回None
+        """
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.term_count and self.term(lo) == term:
+            return self.posting_offsets[lo], self.posting_offsets[lo + 1]
+        return None
+
+    @property
+    def keys(self):
+        if self._keys is None:
+            data = bytes(self.keys_data).decode('utf8')
+            self._keys = data.split('\n') if data else []
+        return self._keys
+
+    def stored_raw(self, ordinal):
+        return bytes(self.stored_data[self.stored_offsets[ordinal]:self.stored_offsets[ordinal + 1]])
+
+    def stored(self, ordinal):
+        return json.loads(self.stored_raw(ordinal).decode('utf8'))
+
+    def lengths(self):
+        return self.lengths_data
+
+    def tfs(self):
+        return self.tfs_data
+
+
+class SegmentBuilder(object):
+    """
+    在内存中建立一个新段，write()写到磁盘
+    """
+    def __init__(self):
+        self.keys = []
+        self.lengths = array('I')
+        self.stored = []
+        self.postings = defaultdict(lambda: (array('I'), array('H')))
+        # 同一篇文档加了多次时，只有最后一次有效，前面的记为已删除
+        self.ordinals = {}
+        self.deleted = set()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, counts, length, stored):
+        """
+        :param key: 文档id
+        :param counts: {词: 出现次数}
+        :param length: 词的总数
+        :param stored: 搜索结果中要返回的字段
+        """
+        ordinal = len(self.keys)
+        if key in self.ordinals:
+            self.deleted.add(self.ordinals[key])
+        self.ordinals[key] = ordinal
+        self.keys.append(key)
+        self.lengths.append(length)
+        self.stored.append(json.dumps(stored, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf8'))
+        for term, tf in counts.items():
+            docs, tfs = self.postings[term]
+            docs.append(ordinal)
+            tfs.append(min(tf, 65535))
+
+    def write(self, path):
+        terms = sorted((term.encode('utf8'), docs, tfs) for term, (docs, tfs) in self.postings.items())
+        write_segment(path, terms, self.lengths, self.keys, self.stored)
+
+
+def write_segment(path, terms, lengths, keys, stored):
+    """
+    把段写到磁盘，先写到临时目录，写完再改名，读的进程不会看到写了一半的段
+    :param path: 段目录
+    :param terms: 按utf8排好序的 [(词, 文档序号数组, 词频数组), ...]，可以是生成器
+    :param lengths: 每篇文档的词数
+    :param keys: 每篇文档的id
+    :param stored: 每篇文档的返回字段（json bytes），可以是生成器
+    """
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    total_length = sum(lengths)
+    avg_length = total_length / len(lengths) if len(lengths) else 1
+    # 文档长度归一化部分只和文档有关，先算好
+    norms = [K1 * (1 - B + B * length / avg_length) for length in lengths]
+
+    def open_file(name):
+        return open(os.path.join(tmp_path, name), 'wb')
+
+    term_count = 0
+    term_offsets = array('Q', [0])
+    posting_offsets = array('Q', [0])
+    with open_file('terms.dat') as terms_f, open_file('docs.dat') as docs_f, \
+            open_file('impacts.dat') as impacts_f, open_file('tfs.dat') as tfs_f:
+        for term, docs, tfs in terms:
+            impacts = array('B', [max(1, round(IMPACT_SCALE * tf / (tf + norms[doc]))) for doc, tf in zip(docs, tfs)])
+            terms_f.write(term)
+            docs.tofile(docs_f)
+            impacts.tofile(impacts_f)
+            tfs.tofile(tfs_f)
+            term_count += 1
+            term_offsets.append(term_offsets[-1] + len(term))
+            posting_offsets.append(posting_offsets[-1] + len(docs))
+
+    with open_file('terms.idx') as f:
+        term_offsets.tofile(f)
+    with open_file('postings.idx') as f:
+        posting_offsets.tofile(f)
+    with open_file('lengths.dat') as f:
+        array('I', lengths).tofile(f)
+    with open_file('keys.dat') as f:
+        f.write('\n'.join(keys).encode('utf8'))
+
+    stored_offsets = array('Q', [0])
+    with open_file('stored.dat') as f:
+        for item in stored:
+            f.write(item)
+            stored_offsets.append(stored_offsets[-1] + len(item))
+    with open_file('stored.idx') as f:
+        stored_offsets.tofile(f)
+
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump({'docs': len(keys), 'terms': term_count, 'total_length': total_length}, f)
+    os.rename(tmp_path, path)
+
+
+def merge_segments(segments, path):
+    """
+    合并多个段，去掉已删除的文档，倒排列表按词做多路归并，不需要把所有段读进内存
+    :param segments: [(Segment, 已删除的文档序号集合), ...]
+    :param path: 新段的目录
+    """
+    # 旧段中的文档序号 -> 新段中的文档序号，已删除的为-1
+    remaps = []
+    bases = []
+    lengths = array('I')
+    keys = []
+    for segment, deleted in segments:
+        bases.append(len(keys))
+        if deleted:
+            remap = []
+            for ordinal, length in enumerate(segment.lengths()):
+                if ordinal in deleted:
+                    remap.append(-1)
+                else:
+                    remap.append(len(keys))
+                    keys.append(segment.keys[ordinal])
+                    lengths.append(length)
+            remaps.append(remap)
+        else:
+            keys.extend(segment.keys)
+            lengths.extend(segment.lengths())
+            remaps.append(None)
+
+    def iter_stored():
+        for segment, deleted in segments:
+            for ordinal in range(segment.doc_count):
+                if ordinal not in deleted:
+                    yield segment.stored_raw(ordinal)
+
+    def iter_terms(index):
+        segment = segments[index][0]
+        for i in range(segment.term_count):
+            yield segment.term(i), index, i
+
+    tfs_list = [segment.tfs() for segment, deleted in segments]
+
+    def iter_postings():
+        merged = heapq.merge(*[iter_terms(index) for index in range(len(segments))])
+        for term, items in itertools.groupby(merged, key=lambda item: item[0]):
+            docs = array('I')
+            tfs = array('H')
+            for _, index, i in items:
+                segment = segments[index][0]
+                start, end = segment.posting_offsets[i], segment.posting_offsets[i + 1]
+                remap = remaps[index]
+                if remap is None:
+                    docs.extend(map(add, segment.docs[start:end], itertools.repeat(bases[index])))
+                    tfs.extend(tfs_list[index][start:end])
+                    continue
+                for doc, tf in zip(segment.docs[start:end], tfs_list[index][start:end]):
+                    if remap[doc] >= 0:
+                        docs.append(remap[doc])
+                        tfs.append(tf)
+            if docs:
+                yield term, docs, tfs
+
+    write_segment(path, iter_postings(), lengths, keys, iter_stored())
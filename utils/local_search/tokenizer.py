@@ -0,0 +1,49 @@
+import re
+import unicodedata
+from collections import Counter
+
+# 连续的英文字母数字算一个词，连续的中日韩文字单独处理
+TOKEN_RE = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+# 英文单词超过这个长度的截断，避免把长串的链接、base64当成词
+MAX_WORD_LENGTH = 32
+
+
+def normalize(text):
+    """
+    全角转半角、统一大小写
+    """
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def iter_terms(text):
+    """
+    切词
+    # 英文、数字按单词切分
+    # 中文不依赖词典，按相邻两个字切分（二元切分），"人工智能" -> 人工 工智 智能
+    # 只有一个字的中文保留单字
+    """
+    for match in TOKEN_RE.finditer(normalize(text)):
+        token = match.group()
+        if token[0] < '\u0080':
+            yield token[:MAX_WORD_LENGTH]
+        elif len(token) == 1:
+            yield token
+        else:
+            for i in range(len(token) - 1):
+                yield token[i:i + 2]
+
+
+def tokenize(text):
+    """
+    :return: (Counter{词: 出现次数}, 词的总数)
+    """
+    counts = Counter(iter_terms(text))
+    return counts, sum(counts.values())
+
+
+def query_terms(text):
+    """
+    查询语句切词，重复的词只算一次
+    :return: 按出现顺序去重后的词列表
+    """
+    return list(dict.fromkeys(iter_terms(text)))
@@ -1,3 +1,10 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+# 游标中时间戳的起点
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 def get_paginator_data(paginator, current_page, around_count=3):
     """
     :param paginator: 分页对象
@@ -36,4 +43,39 @@ def get_paginator_data(paginator, current_page, around_count=3):
         "right_has_more_page": right_has_more_page,
         "left_pages": left_page_range,
         "right_pages": right_page_range,
-    }
\ No newline at end of file
+    }
+
+def to_micro_timestamp(update_time):
+    """
+    datetime转成微秒时间戳（整数，不经过浮点运算，不会有精度误差）
+    :param update_time: 带时区的datetime
+    :return:
+    """
+    return (update_time - EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(update_time, pk):
+    """
+    把最后一条数据的 (update_time, id) 编码成不透明的游标字符串，供游标分页使用
+    :param update_time: 最后一条数据的更新时间（带时区的datetime）
+    :param pk: 最后一条数据的id
+    :return: url安全的base64字符串
+    """
+    # 用微秒时间戳，避免同一秒内更新的数据丢失或者重复
+    raw = '{}:{}'.format(to_micro_timestamp(update_time), pk).encode('utf8')
+    return base64.urlsafe_b64encode(raw).decode('utf8').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解码游标字符串
+    :param cursor: encode_cursor生成的游标
+    :return: (update_time, id)，游标不合法时抛出ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        micro_ts, pk = base64.urlsafe_b64decode(padded.encode('utf8')).decode('utf8').split(':')
+        update_time = EPOCH + timedelta(microseconds=int(micro_ts))
+        return update_time, int(pk)
+    except Exception as e:
+        raise ValueError('游标不合法：{}'.format(e))
@@ -1,10 +1,11 @@
 # -*- coding: UTF-8 -*-
 from hashlib import md5
+import json
 import base64
 import datetime
-from urllib import request as urllib2
-import json
-from .xml_to_json import xmltojson
+
+from utils.http_session import get_session
+from .xml_to_json import xml_to_dict
 
 
 class REST:
@@ -15,20 +16,26 @@ class REST:
     SubAccountToken = ''
     ServerIP = ''
     ServerPort = ''
+    Protocol = 'https'  # 请求协议，本地测试桩服务器可以用http
     SoftVersion = ''
     Iflog = False  # 是否打印日志
-    Batch = ''  # 时间戳
-    BodyType = 'xml'  # 包体格式，可填值：json 、xml
+    BodyType = 'json'  # 包体格式，可填值：json 、xml
+    PoolSize = 10  # 每个进程的连接池大小
+    Timeout = (3, 10)  # 连接超时、读取超时，单位秒
+    # 云通讯测试环境是自签名证书，不校验证书
+    Verify = False
 
     # 初始化
     # @param serverIP       必选参数    服务器地址
     # @param serverPort     必选参数    服务器端口
     # @param softVersion    必选参数    REST版本号
-    def __init__(self, ServerIP, ServerPort, SoftVersion):
+    # @param protocol       可选参数    请求协议
+    def __init__(self, ServerIP, ServerPort, SoftVersion, Protocol='https'):
 
         self.ServerIP = ServerIP
         self.ServerPort = ServerPort
         self.SoftVersion = SoftVersion
+        self.Protocol = Protocol
 
     # 设置主帐号
     # @param AccountSid  必选参数    主帐号
@@ -39,7 +46,7 @@ class REST:
         self.AccountToken = AccountToken
 
     # 设置子帐号
-    # 
+    #
     # @param SubAccountSid  必选参数    子帐号
     # @param SubAccountToken  必选参数    子帐号Token
 
@@ -48,7 +55,7 @@ class REST:
         self.SubAccountToken = SubAccountToken
 
     # 设置应用ID
-    # 
+    #
     # @param AppId  必选参数    应用ID
 
     def setAppId(self, AppId):
@@ -63,47 +70,50 @@ class REST:
         print(data)
         print('********************************')
 
-    # 创建子账号
-    # @param friendlyName   必选参数      子帐号名称
-    def CreateSubAccount(self, friendlyName):
-
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
+    # 生成sig和auth，时间戳不保存到实例上，多个线程共用一个REST对象时互不影响
+    def sign(self):
+        batch = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
+        signature = self.AccountSid + self.AccountToken + batch
         sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SubAccounts?sig=" + sig
         # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        req.add_header("Authorization", auth)
-        # xml格式
-        body = '''<?xml version="1.0" encoding="utf-8"?><SubAccount><appId>%s</appId>\
-            <friendlyName>%s</friendlyName>\
-            </SubAccount>\
-            ''' % (self.AppId, friendlyName)
-
-        if self.BodyType == 'json':
-            # json格式
-            body = '''{"friendlyName": "%s", "appId": "%s"}''' % (friendlyName, self.AppId)
+        src = self.AccountSid + ":" + batch
+        auth = base64.b64encode(src.encode()).decode()
+        return sig, auth
+
+    # 发送请求并解析响应
+    # @param path           必选参数    Accounts/{AccountSid}后面的路径
+    # @param body           可选参数    包体，为None时发送GET请求
+    # @param query          可选参数    sig后面拼接的查询参数
+    # @param bodyType       可选参数    包体格式，默认为self.BodyType
+    # @param contentType    可选参数    Content-Type，默认和包体格式一致
+    # @param listTag        可选参数    xml响应中有totalCount时，解析成列表的节点名
+    def request(self, path, body=None, query='', bodyType=None, contentType=None, listTag='SubAccount'):
+        self.accAuth()
+        bodyType = bodyType or self.BodyType
+        sig, auth = self.sign()
+        # 拼接URL
+        url = self.Protocol + "://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + path + "?sig=" + sig + query
+        headers = {
+            "Accept": "application/" + bodyType,
+            "Content-Type": contentType or "application/" + bodyType + ";charset=utf-8",
+            "Authorization": auth,
+        }
         data = ''
-        req.data = body.encode()
         try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
+            session = get_session('ccp', self.PoolSize, self.Verify)
+            if body is None:
+                res = session.get(url, headers=headers, timeout=self.Timeout)
+            else:
+                res = session.post(url, data=body.encode() if isinstance(body, str) else body, headers=headers, timeout=self.Timeout)
+            data = res.content
 
-            if self.BodyType == 'json':
+            if bodyType == 'json':
                 # json格式
                 locations = json.loads(data)
             else:
                 # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
+                locations = xml_to_dict(data, listTag)
             if self.Iflog:
                 self.log(url, body, data)
             return locations
@@ -112,108 +122,51 @@ class REST:
                 self.log(url, body, data)
             return {'172001': '网络错误'}
 
+    # 创建子账号
+    # @param friendlyName   必选参数      子帐号名称
+    def CreateSubAccount(self, friendlyName):
+
+        if self.BodyType == 'json':
+            # json格式
+            body = json.dumps({"friendlyName": str(friendlyName), "appId": self.AppId})
+        else:
+            # xml格式
+            body = '''<?xml version="1.0" encoding="utf-8"?><SubAccount><appId>%s</appId>\
+            <friendlyName>%s</friendlyName>\
+            </SubAccount>\
+            ''' % (self.AppId, friendlyName)
+        return self.request("/SubAccounts", body)
+
     #  获取子帐号
     # @param startNo  可选参数    开始的序号，默认从0开始
     # @param offset 可选参数     一次查询的最大条数，最小是1条，最大是100条
     def getSubAccounts(self, startNo, offset):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/GetSubAccounts?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        # auth = base64.encodestring(src).strip()
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        req.add_header("Authorization", auth)
-        # xml格式
-        body = '''<?xml version="1.0" encoding="utf-8"?><SubAccount><appId>%s</appId>\
+        if self.BodyType == 'json':
+            # json格式
+            body = json.dumps({"appId": self.AppId, "startNo": str(startNo), "offset": str(offset)})
+        else:
+            # xml格式
+            body = '''<?xml version="1.0" encoding="utf-8"?><SubAccount><appId>%s</appId>\
             <startNo>%s</startNo><offset>%s</offset>\
             </SubAccount>\
             ''' % (self.AppId, startNo, offset)
-
-        if self.BodyType == 'json':
-            # json格式
-            body = '''{"appId": "%s", "startNo": "%s", "offset": "%s"}''' % (self.AppId, startNo, offset)
-        data = ''
-        req.data = body.encode()
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/GetSubAccounts", body)
 
     # 子帐号信息查询
     # @param friendlyName 必选参数   子帐号名称
 
     def querySubAccount(self, friendlyName):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/QuerySubAccountByName?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        # auth = base64.encodestring(src).strip()
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-
-        req.add_header("Authorization", auth)
-
         # 创建包体
-        body = '''<?xml version="1.0" encoding="utf-8"?><SubAccount><appId>%s</appId>\
+        if self.BodyType == 'json':
+            body = json.dumps({"friendlyName": str(friendlyName), "appId": self.AppId})
+        else:
+            body = '''<?xml version="1.0" encoding="utf-8"?><SubAccount><appId>%s</appId>\
             <friendlyName>%s</friendlyName>\
             </SubAccount>\
             ''' % (self.AppId, friendlyName)
-        if self.BodyType == 'json':
-            body = '''{"friendlyName": "%s", "appId": "%s"}''' % (friendlyName, self.AppId)
-        data = ''
-        req.data = body.encode()
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            print(error)
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/QuerySubAccountByName", body)
 
     # 发送模板短信
     # @param to  必选参数     短信接收彿手机号码集合,用英文逗号分开
@@ -221,62 +174,15 @@ class REST:
     # @param tempId 必选参数    模板Id
     def sendTemplateSMS(self, to, datas, tempId):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SMS/TemplateSMS?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        # auth = base64.encodestring(src).strip()
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        req.add_header("Authorization", auth)
         # 创建包体
-        b = ''
-        for a in datas:
-            b += '<data>%s</data>' % (a)
-
-        body = '<?xml version="1.0" encoding="utf-8"?><SubAccount><datas>' + b + '</datas><to>%s</to><templateId>%s</templateId><appId>%s</appId>\
+        if self.BodyType == 'json':
+            body = json.dumps({"to": str(to), "datas": [str(a) for a in datas], "templateId": str(tempId), "appId": self.AppId})
+        else:
+            b = ''.join(['<data>%s</data>' % a for a in datas])
+            body = '<?xml version="1.0" encoding="utf-8"?><SubAccount><datas>' + b + '</datas><to>%s</to><templateId>%s</templateId><appId>%s</appId>\
             </SubAccount>\
             ' % (to, tempId, self.AppId)
-        if self.BodyType == 'json':
-            # if this model is Json ..then do next code
-            b = '['
-            for a in datas:
-                b += '"%s",' % (a)
-            b += ']'
-            body = '''{"to": "%s", "datas": %s, "templateId": "%s", "appId": "%s"}''' % (to, b, tempId, self.AppId)
-        req.data = body.encode()
-        data = ''
-        try:
-            # 查找相关资料后确定为，Python 2.7.9 之后版本引入了一个新特性：
-            # 当你urllib.urlopen一个 https 的时候会验证一次 SSL 证书，
-            # 当目标使用的是自签名的证书时就会爆出该错误消息。
-            import ssl
-            ssl._create_default_https_context = ssl._create_unverified_context
-
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/SMS/TemplateSMS", body)
 
     # 外呼通知
     # @param to 必选参数    被叫号码
@@ -295,55 +201,23 @@ class REST:
     def landingCall(self, to, mediaName, mediaTxt, displayNum, playTimes, respUrl, userData, maxCallTime, speed, volume,
                     pitch, bgsound):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/LandingCalls?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        # auth = base64.encodestring(src).strip()
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        req.add_header("Authorization", auth)
-
         # 创建包体
-        body = '''<?xml version="1.0" encoding="utf-8"?><LandingCall>\
+        if self.BodyType == 'json':
+            body = json.dumps({
+                "to": str(to), "mediaName": str(mediaName), "mediaTxt": str(mediaTxt), "appId": self.AppId,
+                "displayNum": str(displayNum), "playTimes": str(playTimes), "respUrl": str(respUrl),
+                "userData": str(userData), "maxCallTime": str(maxCallTime), "speed": str(speed),
+                "volume": str(volume), "pitch": str(pitch), "bgsound": str(bgsound),
+            })
+        else:
+            body = '''<?xml version="1.0" encoding="utf-8"?><LandingCall>\
             <to>%s</to><mediaName>%s</mediaName><mediaTxt>%s</mediaTxt><appId>%s</appId><displayNum>%s</displayNum>\
             <playTimes>%s</playTimes><respUrl>%s</respUrl><userData>%s</userData><maxCallTime>%s</maxCallTime><speed>%s</speed>
             <volume>%s</volume><pitch>%s</pitch><bgsound>%s</bgsound></LandingCall>\
             ''' % (
-        to, mediaName, mediaTxt, self.AppId, displayNum, playTimes, respUrl, userData, maxCallTime, speed, volume,
-        pitch, bgsound)
-        if self.BodyType == 'json':
-            body = '''{"to": "%s", "mediaName": "%s","mediaTxt": "%s","appId": "%s","displayNum": "%s","playTimes": "%s","respUrl": "%s","userData": "%s","maxCallTime": "%s","speed": "%s","volume": "%s","pitch": "%s","bgsound": "%s"}''' % (
             to, mediaName, mediaTxt, self.AppId, displayNum, playTimes, respUrl, userData, maxCallTime, speed, volume,
             pitch, bgsound)
-        req.data = body.encode()
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/Calls/LandingCalls", body)
 
     # 语音验证码
     # @param verifyCode  必选参数   验证码内容，为数字和英文字母，不区分大小写，长度4-8位
@@ -356,53 +230,18 @@ class REST:
 
     def voiceVerify(self, verifyCode, playTimes, to, displayNum, respUrl, lang, userData):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/VoiceVerify?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        # auth = base64.encodestring(src).strip()
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-
-        req.add_header("Authorization", auth)
-
         # 创建包体
-        body = '''<?xml version="1.0" encoding="utf-8"?><VoiceVerify>\
+        if self.BodyType == 'json':
+            body = json.dumps({
+                "appId": self.AppId, "verifyCode": str(verifyCode), "playTimes": str(playTimes), "to": str(to),
+                "respUrl": str(respUrl), "displayNum": str(displayNum), "lang": str(lang), "userData": str(userData),
+            })
+        else:
+            body = '''<?xml version="1.0" encoding="utf-8"?><VoiceVerify>\
             <appId>%s</appId><verifyCode>%s</verifyCode><playTimes>%s</playTimes><to>%s</to><respUrl>%s</respUrl>\
             <displayNum>%s</displayNum><lang>%s</lang><userData>%s</userData></VoiceVerify>\
             ''' % (self.AppId, verifyCode, playTimes, to, respUrl, displayNum, lang, userData)
-        if self.BodyType == 'json':
-            # if this model is Json ..then do next code 
-            body = '''{"appId": "%s", "verifyCode": "%s","playTimes": "%s","to": "%s","respUrl": "%s","displayNum": "%s","lang": "%s","userData": "%s"}''' % (
-            self.AppId, verifyCode, playTimes, to, respUrl, displayNum, lang, userData)
-        req.data = body.encode()
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/Calls/VoiceVerify", body)
 
     # IVR外呼
     # @param number  必选参数     待呼叫号码，为Dial节点的属性
@@ -411,327 +250,79 @@ class REST:
 
     def ivrDial(self, number, userdata, record):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch;
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/ivr/dial?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        req.add_header("Accept", "application/xml")
-        req.add_header("Content-Type", "application/xml;charset=utf-8")
-        req.add_header("Authorization", auth)
-
-        # 创建包体
+        # 创建包体，这个接口只支持xml
         body = '''<?xml version="1.0" encoding="utf-8"?>
                 <Request>
                     <Appid>%s</Appid>
                     <Dial number="%s"  userdata="%s" record="%s"></Dial>
                 </Request>
             ''' % (self.AppId, number, userdata, record)
-        req.data = body.encode()
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-            xtj = xmltojson()
-            locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/ivr/dial", body, bodyType='xml')
 
     # 话单下载
     # @param date   必选参数    day 代表前一天的数据（从00:00 – 23:59），目前只支持按天查询
     # @param keywords  可选参数     客户的查询条件，由客户自行定义并提供给云通讯平台。默认不填忽略此参数
     def billRecords(self, date, keywords):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/BillRecords?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        req.add_header("Authorization", auth)
-
         # 创建包体
-        body = '''<?xml version="1.0" encoding="utf-8"?><BillRecords>\
+        if self.BodyType == 'json':
+            body = json.dumps({"appId": self.AppId, "date": str(date), "keywords": str(keywords)})
+        else:
+            body = '''<?xml version="1.0" encoding="utf-8"?><BillRecords>\
             <appId>%s</appId><date>%s</date><keywords>%s</keywords>\
             </BillRecords>\
             ''' % (self.AppId, date, keywords)
-        if self.BodyType == 'json':
-            # if this model is Json ..then do next code 
-            body = '''{"appId": "%s", "date": "%s","keywords": "%s"}''' % (self.AppId, date, keywords)
-        req.data = body.encode()
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/BillRecords", body)
 
     # 主帐号信息查询
 
     def queryAccountInfo(self):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/AccountInfo?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        body = ''
-        req.add_header("Authorization", auth)
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/AccountInfo")
 
     # 短信模板查询
-    # @param templateId  必选参数   模板Id，不带此参数查询全部可用模板 
+    # @param templateId  必选参数   模板Id，不带此参数查询全部可用模板
 
     def QuerySMSTemplate(self, templateId):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/SMS/QuerySMSTemplate?sig=" + sig
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-
-        req.add_header("Authorization", auth)
-
         # 创建包体
-        body = '''<?xml version="1.0" encoding="utf-8"?><Request>\
+        if self.BodyType == 'json':
+            body = json.dumps({"appId": self.AppId, "templateId": str(templateId)})
+        else:
+            body = '''<?xml version="1.0" encoding="utf-8"?><Request>\
             <appId>%s</appId><templateId>%s</templateId></Request>
             ''' % (self.AppId, templateId)
-        if self.BodyType == 'json':
-            # if this model is Json ..then do next code 
-            body = '''{"appId": "%s", "templateId": "%s"}''' % (self.AppId, templateId)
-        req.data = body.encode()
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main2(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/SMS/QuerySMSTemplate", body, listTag='TemplateSMS')
 
     # 呼叫结果查询
     # @param callsid   必选参数    呼叫ID
 
     def CallResult(self, callSid):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/CallResult?sig=" + sig + "&callsid=" + callSid
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        body = ''
-        req.add_header("Authorization", auth)
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/CallResult", query="&callsid=" + callSid)
 
     # 呼叫状态查询
     # @param callid   必选参数    一个由32个字符组成的电话唯一标识符
-    # @param action      可选参数     查询结果通知的回调url地址 
+    # @param action      可选参数     查询结果通知的回调url地址
     def QueryCallState(self, callid, action):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/ivr/call?sig=" + sig + "&callid=" + callid
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        self.setHttpHeader(req)
-        req.add_header("Authorization", auth)
-
         # 创建包体
-        body = '''<?xml version="1.0" encoding="utf-8"?><Request>\
+        if self.BodyType == 'json':
+            body = json.dumps({"Appid": self.AppId, "QueryCallState": {"callid": str(callid), "action": str(action)}})
+        else:
+            body = '''<?xml version="1.0" encoding="utf-8"?><Request>\
             <Appid>%s</Appid><QueryCallState callid="%s" action="%s"/>\
             </Request>\
             ''' % (self.AppId, callid, action)
-        if self.BodyType == 'json':
-            # if this model is Json ..then do next code 
-            body = '''{"Appid":"%s","QueryCallState":{"callid":"%s","action":"%s"}}''' % (self.AppId, callid, action)
-        req.data = body.encode()
-        data = ''
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/ivr/call", body, query="&callid=" + callid)
 
     # 语音文件上传
     # @param filename   必选参数    文件名
     # @param body      必选参数     二进制串
     def MediaFileUpload(self, filename, body):
 
-        self.accAuth()
-        nowdate = datetime.datetime.now()
-        self.Batch = nowdate.strftime("%Y%m%d%H%M%S")
-        # 生成sig
-        signature = self.AccountSid + self.AccountToken + self.Batch
-        sig = md5(signature.encode()).hexdigest().upper()
-        # 拼接URL
-        url = "https://" + self.ServerIP + ":" + self.ServerPort + "/" + self.SoftVersion + "/Accounts/" + self.AccountSid + "/Calls/MediaFileUpload?sig=" + sig + "&appid=" + self.AppId + "&filename=" + filename
-        # 生成auth
-        src = self.AccountSid + ":" + self.Batch
-        auth = base64.encodebytes(src.encode()).decode().strip()
-        req = urllib2.Request(url)
-        req.add_header("Authorization", auth)
-        if self.BodyType == 'json':
-            req.add_header("Accept", "application/json")
-            req.add_header("Content-Type", "application/octet-stream")
-
-        else:
-            req.add_header("Accept", "application/xml")
-            req.add_header("Content-Type", "application/octet-stream")
-
-        # 创建包体
-        req.data = body.encode()
-
-        try:
-            res = urllib2.urlopen(req)
-            data = res.read()
-
-            res.close()
-
-            if self.BodyType == 'json':
-                # json格式
-                locations = json.loads(data)
-            else:
-                # xml格式
-                xtj = xmltojson()
-                locations = xtj.main(data)
-            if self.Iflog:
-                self.log(url, body, data)
-            return locations
-        except Exception as error:
-            if self.Iflog:
-                self.log(url, body, data)
-            return {'172001': '网络错误'}
+        return self.request("/Calls/MediaFileUpload", body, query="&appid=" + self.AppId + "&filename=" + filename,
+                            contentType="application/octet-stream")
 
     # 子帐号鉴权
     def subAuth(self):
@@ -784,13 +375,3 @@ class REST:
         if self.AppId == "":
             print('172012')
             print('应用ID为空')
-
-    # 设置包头
-    def setHttpHeader(self, req):
-        if self.BodyType == 'json':
-            req.add_header("Accept", "application/json")
-            req.add_header("Content-Type", "application/json;charset=utf-8")
-
-        else:
-            req.add_header("Accept", "application/xml")
-            req.add_header("Content-Type", "application/xml;charset=utf-8")
@@ -1,4 +1,5 @@
 # -*- coding:utf-8 -*-
+from django.conf import settings
 
 # 说明：主账号，登陆云通讯网站后，可在"控制台-应用"中看到开发者主账号ACCOUNT SID
 from utils.yuntongxun.CCPRestSDK import REST
@@ -11,12 +12,15 @@ _accountToken = '1b4a0f10974b4940b3e270f3f99090b9'
 # 请使用管理控制台首页的APPID或自己创建应用的APPID
 _appId = '8aaf07086b54a56a016b5646fa9b02d0'
 
-# 说明：请求地址，生产环境配置成app.cloopen.com
+# 说明：请求地址，生产环境配置成app.cloopen.com，settings中配置了CCP_SERVER_IP就用配置的
 _serverIP = 'sandboxapp.cloopen.com'
 
 # 说明：请求端口 ，生产环境为8883
 _serverPort = "8883"
 
+# 说明：请求协议，连本地测试桩服务器时配置成http
+_serverProtocol = 'https'
+
 # 说明：REST API版本号保持不变
 _softVersion = '2013-12-26'
 
@@ -28,7 +32,10 @@ class CCP(object):
         # 判断是否存在类属性_instance，_instance是类CCP的唯一对象，即单例
         if not hasattr(CCP, "_instance"):
             cls._instance = super(CCP, cls).__new__(cls, *args, **kwargs)
-            cls._instance.rest = REST(_serverIP, _serverPort, _softVersion)
+            cls._instance.rest = REST(getattr(settings, 'CCP_SERVER_IP', _serverIP),
+                                      str(getattr(settings, 'CCP_SERVER_PORT', _serverPort)),
+                                      _softVersion,
+                                      getattr(settings, 'CCP_SERVER_PROTOCOL', _serverProtocol))
             cls._instance.rest.setAccount(_accountSid, _accountToken)
             cls._instance.rest.setAppId(_appId)
         return cls._instance
@@ -50,7 +57,7 @@ class CCP(object):
         except Exception as e:
             print(e)
         # 如果云通讯发送短信成功，返回的字典数据result中statuCode字段的值为"000000"
-        if res.get("statusCode") == "000000":
+        if res and res.get("statusCode") == "000000":
             # 返回0 表示发送短信成功
             return 0
         else:
@@ -59,11 +66,9 @@ class CCP(object):
 
 
 if __name__ == '__main__':
+    import os
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
     ccp = CCP()
-    # 注意： 测试的短信模板编号为1
-    result = None
-    while True:
-        result = ccp.send_template_sms('18866668888', ['6666', 5], "1")
-        if result == 0:
-            print('短信验证码发送成功！')
-            break
+    # 注意： 测试的短信模板编号为1，失败了不在这里重试，线上由短信发送队列重试
+    result = ccp.send_template_sms('18866668888', ['6666', 5], "1")
+    print('短信验证码发送成功！' if result == 0 else '短信验证码发送失败！')
@@ -1,9 +1,32 @@
 # -*- coding: utf-8 -*-
 # python xml.etree.ElementTree
 
-import os
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
+
+
+def xml_to_dict(xml, list_tag='SubAccount'):
+    """
+    把云通讯返回的xml解析成字典，结果和xmltojson.main一样
+    # 每次调用都用新的字典，多线程同时解析互不影响；只遍历一遍子节点，不生成中间列表
+    :param xml: 响应包体
+    :param list_tag: 有totalCount节点时，这个节点解析成列表（查询模板用TemplateSMS）
+    :return:
+    """
+    root = ET.fromstring(xml)
+    has_total = root.find('totalCount') is not None
+    result = {}
+    for child in root:
+        if len(child):
+            value = {c.tag: c.text for c in child}
+            if child.tag == list_tag and has_total:
+                result.setdefault(child.tag, []).append(value)
+            elif child.tag == 'TemplateSMS' and list_tag != 'TemplateSMS':
+                result['templateSMS'] = value
+            else:
+                result[child.tag] = value
+        else:
+            result[child.tag] = child.text
+    return result
 
 
 class xmltojson:
@@ -11,8 +34,11 @@ class xmltojson:
     SHOW_LOG = True
     # XML file
     XML_PATH = None
-    a = {}
-    m = []
+
+    def __init__(self):
+        # 放在实例上，多个实例不共用解析结果
+        self.a = {}
+        self.m = []
 
     def get_root(self, path):
         """